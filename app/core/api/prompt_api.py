@@ -2,7 +2,7 @@ from app.core.schema.db_info_schema import DBInfo
 from app.utils.logger import logger
 from app.core.schema.prompt_schema import PromptSchema, PromptUpdate
 from app.core.service.prompt_service import PromptService
-from app.core.helper.db_info import get_db_info
+from app.core.helper.db_info import tenant_resolver
 
 
 class PromptApi:
@@ -17,7 +17,7 @@ class PromptApi:
 
     async def get_db_name(self):
         try:
-            data: DBInfo | None = await get_db_info(self.org_id)
+            data: DBInfo | None = await tenant_resolver.resolve(self.org_id)
             if data is None:
                 raise Exception("OrgId not found, please login again")
             self.db_name = data.db_name
@@ -1,27 +1,35 @@
+from app.core.cache.search_result_cache import search_result_cache
+from app.core.langchain.embedding_provider import EmbeddingProvider
+from app.core.langchain.embedding_registry import TENANT_EMBEDDING_PROVIDER_KEY, embedding_provider_registry
 from app.core.schema.db_info_schema import DBInfo
-from app.core.schema.embedded_document_schema import SearchQuery
+from app.core.schema.embedded_document_schema import BatchSearchQuery, SearchQuery
 from app.core.schema.rag_schema import RagDocumentCreate
 from app.utils.logger import logger
 from app.core.service.rag.rag_service import RagService
-from app.core.helper.db_info import get_db_info
+from app.core.service.rag.ingestion_job_service import IngestionJob, IngestionJobService, ingestion_job_manager
+from app.core.helper.db_info import tenant_resolver
 
 
 class RagApi:
-    def __init__(self, org_id: str):
+    def __init__(self, org_id: str, embedder: EmbeddingProvider):
         self.logger = logger
         self.org_id = org_id
+        self.embedder = embedder
 
     async def initialize(self):
         await self.get_db_name()
-        self.service = RagService(org_id=self.org_id, db_name=self.db_name)
+        if (self.db_metadata or {}).get(TENANT_EMBEDDING_PROVIDER_KEY):
+            self.embedder = embedding_provider_registry.for_tenant(self.db_metadata)
+        self.service = RagService(org_id=self.org_id, db_name=self.db_name, embedder=self.embedder)
         return self
 
     async def get_db_name(self):
         try:
-            data: DBInfo | None = await get_db_info(self.org_id)
+            data: DBInfo | None = await tenant_resolver.resolve(self.org_id)
             if data is None:
                 raise Exception("OrgId not found, please login again")
             self.db_name = data.db_name
+            self.db_metadata = data.metadata
             return True
         except Exception as e:
             self.logger.error(f"Failed to get db name: {e}")
@@ -29,14 +37,60 @@ class RagApi:
 
     async def generate_embedding(self, body: RagDocumentCreate, file_data: bytes, filename: str, content_type: str):
         try:
-            await self.service.generate_embedding_service(body, file_data, filename, content_type)
+            return await self.service.generate_embedding_service(body, file_data, filename, content_type)
         except Exception as e:
             self.logger.error(f"Failed to generate embedding for {filename}: {e}")
             raise e
 
-    async def query_embedding(self, query: SearchQuery):
+    async def submit_embedding_job(self, body: RagDocumentCreate, file_data: bytes, filename: str, content_type: str):
         try:
-            return await self.service.query_embedding_service(query)
+            job_service = IngestionJobService(self.org_id)
+            job_id = await job_service.create_job(filename)
+            ingestion_job_manager.submit(IngestionJob(
+                job_id=job_id,
+                org_id=self.org_id,
+                db_name=self.db_name,
+                body=body,
+                file_data=file_data,
+                filename=filename,
+                content_type=content_type,
+                embedder=self.embedder,
+            ))
+            return job_id
+        except Exception as e:
+            self.logger.error(f"Failed to submit embedding job for {filename}: {e}")
+            raise e
+
+    async def get_embedding_job(self, job_id: str):
+        try:
+            return await IngestionJobService(self.org_id).get_job(job_id)
+        except Exception as e:
+            self.logger.error(f"Failed to get embedding job {job_id}: {e}")
+            raise e
+
+    async def query_embedding(self, query: SearchQuery, use_cache: bool = True):
+        try:
+            return await self.service.query_embedding_service(query, use_cache=use_cache)
         except Exception as e:
             self.logger.error(f"Failed to get query embedding: {e}")
             raise e
+
+    async def batch_query_embedding(self, batch: BatchSearchQuery, use_cache: bool = True):
+        try:
+            return await self.service.batch_query_embedding_service(batch, use_cache=use_cache)
+        except Exception as e:
+            self.logger.error(f"Failed to search batch of queries: {e}")
+            raise e
+
+    def stream_query_embedding(self, query: SearchQuery, use_cache: bool = True):
+        return self.service.stream_query_embedding_service(query, use_cache=use_cache)
+
+    def stream_batch_query_embedding(self, batch: BatchSearchQuery, use_cache: bool = True):
+        return self.service.stream_batch_query_embedding_service(batch, use_cache=use_cache)
+
+    async def get_search_cache_stats(self):
+        try:
+            return await search_result_cache.stats(self.org_id)
+        except Exception as e:
+            self.logger.error(f"Failed to get search cache stats: {e}")
+            raise e
@@ -2,7 +2,7 @@ from app.core.schema.db_info_schema import DBInfo
 from app.utils.logger import logger
 from app.core.schema.tool_schema import ToolSchema, ToolUpdate
 from app.core.service.tool_service import ToolService
-from app.core.helper.db_info import get_db_info
+from app.core.helper.db_info import tenant_resolver
 
 
 class ToolApi:
@@ -17,7 +17,7 @@ class ToolApi:
 
     async def get_db_name(self):
         try:
-            data: DBInfo | None = await get_db_info(self.org_id)
+            data: DBInfo | None = await tenant_resolver.resolve(self.org_id)
             if data is None:
                 raise Exception("OrgId not found, please login again")
             self.db_name = data.db_name
@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import os
+import re
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+from app.core.config.redis import redis_manager
+from app.utils.logger import logger
+
+load_dotenv()
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE") or 1024)
+QUERY_EMBEDDING_CACHE_TTL = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL") or 3600)
+QUERY_EMBEDDING_REDIS_TTL = int(os.getenv("QUERY_EMBEDDING_REDIS_TTL") or 86400)
+QUERY_EMBEDDING_PREFIX = "rag:query_embedding"
+VECTOR_DTYPE = np.dtype("<f4")
+
+
+class QueryEmbeddingCache:
+    """
+    Two-tier cache of query embeddings: an in-process LRU with TTL in front of a shared Redis tier.
+
+    Keys are (model, normalized query). Redis values are packed little-endian float32, 4 bytes per dimension.
+    Only the key is normalized: the query text is embedded as given, and queries that differ only in
+    case or whitespace share the embedding of whichever variant was embedded first.
+    """
+
+    def __init__(self, maxsize: int, ttl: int, redis_ttl: int):
+        self.logger = logger
+        self.redis_manager = redis_manager
+        self.local: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis_ttl = redis_ttl
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return re.sub(r"\s+", " ", query).strip().lower()
+
+    @staticmethod
+    def cache_key(model: str, normalized_query: str) -> str:
+        return f"{model}:{hashlib.sha256(normalized_query.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def pack(embedding: List[float]) -> bytes:
+        return np.asarray(embedding, dtype=VECTOR_DTYPE).tobytes()
+
+    @staticmethod
+    def unpack(data: bytes) -> List[float]:
+        return np.frombuffer(data, dtype=VECTOR_DTYPE).tolist()
+
+    async def get(self, model: str, query: str) -> Optional[List[float]]:
+        key = self.cache_key(model, self.normalize_query(query))
+        embedding = self.local.get(key)
+        if embedding is not None:
+            return embedding
+
+        try:
+            data = await self.redis_manager.get_bytes(QUERY_EMBEDDING_PREFIX, key)
+        except Exception as e:
+            self.logger.warning(f"Query embedding cache unavailable: {e}")
+            return None
+        if data is None:
+            return None
+
+        embedding = self.unpack(data)
+        self.local[key] = embedding
+        return embedding
+
+    async def set(self, model: str, query: str, embedding: List[float]):
+        key = self.cache_key(model, self.normalize_query(query))
+        self.local[key] = embedding
+        try:
+            await self.redis_manager.set_bytes(QUERY_EMBEDDING_PREFIX, key, self.pack(embedding), ttl=self.redis_ttl)
+        except Exception as e:
+            self.logger.warning(f"Failed to write query embedding cache: {e}")
+
+    async def get_or_embed(self, model: str, query: str, embed: Callable[[str], Awaitable[List[float]]]) -> List[float]:
+        embedding = await self.get(model, query)
+        if embedding is not None:
+            return embedding
+
+        embedding = await embed(query)
+        await self.set(model, query, embedding)
+        return embedding
+
+    async def get_or_embed_many(self, model: str, queries: List[str], embed_many: Callable[[List[str]], Awaitable[List[List[float]]]]) -> Dict[str, List[float]]:
+        """Embeddings by query; queries missing from both tiers are embedded together in one embed_many call"""
+        cached = await asyncio.gather(*(self.get(model, query) for query in queries))
+        embeddings = {query: embedding for query, embedding in zip(queries, cached) if embedding is not None}
+
+        # Queries that differ only in case or whitespace are embedded once
+        missing: Dict[str, List[str]] = {}
+        for query in queries:
+            if query not in embeddings:
+                missing.setdefault(self.normalize_query(query), []).append(query)
+        if not missing:
+            return embeddings
+
+        # Each group is embedded from the text of its first query, as get_or_embed would have
+        groups = list(missing.values())
+        for group, embedding in zip(groups, await embed_many([group[0] for group in groups])):
+            for query in group:
+                embeddings[query] = embedding
+            await self.set(model, group[0], embedding)
+        return embeddings
+
+
+# Singleton instance for app use
+query_embedding_cache = QueryEmbeddingCache(QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL, QUERY_EMBEDDING_REDIS_TTL)
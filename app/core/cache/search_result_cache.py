@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.core.cache.query_embedding_cache import QueryEmbeddingCache
+from app.core.config.redis import redis_manager
+from app.core.schema.embedded_document_schema import SearchHit, SearchQuery, SearchResult
+from app.utils.logger import logger
+
+load_dotenv()
+
+SEARCH_RESULT_CACHE_TTL = int(os.getenv("SEARCH_RESULT_CACHE_TTL") or 600)
+SEARCH_RESULT_PREFIX = "rag:search_result"
+SEARCH_GENERATION_PREFIX = "rag:search_generation"
+SEARCH_CACHE_STATS_PREFIX = "rag:search_cache_stats"
+
+
+class SearchResultCache:
+    """
+    Redis cache of search results with per-tenant generation-based invalidation.
+
+    Every key embeds the tenant's current generation number and the embedding model. Ingesting
+    documents bumps the generation, which orphans all of the tenant's cached results at once; they
+    expire by TTL. Results ranked with another model's query vectors are never served.
+    """
+
+    def __init__(self, ttl: int):
+        self.logger = logger
+        self.redis_manager = redis_manager
+        self.ttl = ttl
+
+    @staticmethod
+    def _tenant(org_id: str, db_name: str) -> str:
+        return f"{org_id}:{db_name}"
+
+    @staticmethod
+    def cache_key(generation: int, model: str, query: SearchQuery) -> str:
+        # Every SearchQuery field except the raw text is part of the key, so new search options are covered automatically
+        options = query.model_dump_json(exclude={"query"})
+        digest = hashlib.sha256(f"{QueryEmbeddingCache.normalize_query(query.query)}\n{options}".encode("utf-8")).hexdigest()
+        return f"{generation}:{model}:{digest}"
+
+    async def get_generation(self, org_id: str, db_name: str) -> int:
+        generation = await self.redis_manager.get_value(SEARCH_GENERATION_PREFIX, self._tenant(org_id, db_name))
+        return int(generation or 0)
+
+    async def bump_generation(self, org_id: str, db_name: str):
+        """Invalidate every cached result of the tenant"""
+        try:
+            await self.redis_manager.increment(SEARCH_GENERATION_PREFIX, self._tenant(org_id, db_name))
+        except Exception as e:
+            self.logger.error(f"Failed to invalidate search result cache for org_id {org_id}: {e}")
+
+    async def get(self, org_id: str, db_name: str, model: str, query: SearchQuery) -> Tuple[Optional[List[SearchResult]], Optional[int]]:
+        """Return (cached results or None, generation to store a fresh result under)"""
+        try:
+            generation = await self.get_generation(org_id, db_name)
+            data = await self.redis_manager.get_value(SEARCH_RESULT_PREFIX, f"{self._tenant(org_id, db_name)}:{self.cache_key(generation, model, query)}")
+            await self.redis_manager.increment_hash(SEARCH_CACHE_STATS_PREFIX, org_id, "hits" if data else "misses")
+        except Exception as e:
+            self.logger.warning(f"Search result cache unavailable: {e}")
+            return None, None
+        if not data:
+            return None, generation
+        result_model = SearchHit if query.projected else SearchResult
+        return [result_model(**result) for result in json.loads(data)], generation
+
+    async def set(self, org_id: str, db_name: str, model: str, generation: int, query: SearchQuery, results: List[SearchResult]):
+        try:
+            key = f"{self._tenant(org_id, db_name)}:{self.cache_key(generation, model, query)}"
+            await self.redis_manager.set_value(SEARCH_RESULT_PREFIX, key, json.dumps([result.model_dump() for result in results]), ttl=self.ttl)
+        except Exception as e:
+            self.logger.warning(f"Failed to write search result cache: {e}")
+
+    async def stats(self, org_id: str) -> Dict[str, float]:
+        data = await self.redis_manager.get_hash(SEARCH_CACHE_STATS_PREFIX, org_id)
+        hits, misses = int(data.get("hits", 0)), int(data.get("misses", 0))
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
+
+
+# Singleton instance for app use
+search_result_cache = SearchResultCache(SEARCH_RESULT_CACHE_TTL)
@@ -0,0 +1,60 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from dotenv import load_dotenv
+
+from app.utils.logger import logger
+
+load_dotenv()
+
+IO_THREAD_POOL_SIZE = int(os.getenv("IO_THREAD_POOL_SIZE") or 16)
+CPU_PROCESS_POOL_SIZE = int(os.getenv("CPU_PROCESS_POOL_SIZE") or (os.cpu_count() or 1))
+
+
+class ExecutorManager:
+    def __init__(self, io_workers: int, cpu_workers: int):
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers
+        self.io_executor: Optional[ThreadPoolExecutor] = None
+        self.cpu_executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        """Create the I/O thread pool and the CPU process pool"""
+        if not self.io_executor:
+            self.io_executor = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="rag-io")
+        if not self.cpu_executor:
+            # spawn rather than fork: the parent already runs the event loop and I/O threads
+            self.cpu_executor = ProcessPoolExecutor(max_workers=self.cpu_workers, mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"Started executors with {self.io_workers} I/O threads and {self.cpu_workers} CPU processes")
+
+    def shutdown(self):
+        """Shut down both pools, cancelling work that has not started"""
+        if self.io_executor:
+            self.io_executor.shutdown(wait=True, cancel_futures=True)
+            self.io_executor = None
+        if self.cpu_executor:
+            self.cpu_executor.shutdown(wait=True, cancel_futures=True)
+            self.cpu_executor = None
+        logger.info("Shut down executors")
+
+    async def run_io(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run blocking I/O (boto3, file system) on the I/O thread pool"""
+        return await self._run(self.io_executor, func, *args, **kwargs)
+
+    async def run_cpu(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run CPU-bound work (parsing, splitting) on the process pool. func and its arguments must be picklable."""
+        return await self._run(self.cpu_executor, func, *args, **kwargs)
+
+    async def _run(self, executor: Optional[Executor], func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if not executor:
+            raise RuntimeError("Executors are not started. Call start() first.")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+# Singleton instance for app use
+executor_manager = ExecutorManager(IO_THREAD_POOL_SIZE, CPU_PROCESS_POOL_SIZE)
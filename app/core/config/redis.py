@@ -20,6 +20,7 @@ class RedisManager:
     def __init__(self, redis_url: str):
         self.redis_url = redis_url
         self.redis_client: Optional[redis.Redis] = None
+        self.binary_client: Optional[redis.Redis] = None
 
     async def connect(self):
         """Initialize Redis connection (async client)"""
@@ -28,12 +29,18 @@ class RedisManager:
             if not isinstance(self.redis_client, redis.Redis):
                 raise RuntimeError("Invalid Redis client type (must be async Redis).")
             logger.info("Connected to Redis for general use")
+        if not self.binary_client:
+            # Separate client without response decoding for packed binary values
+            self.binary_client = redis.from_url(self.redis_url, decode_responses=False)
+            logger.info("Connected to Redis for binary values")
 
     async def disconnect(self):
         """Close Redis connection"""
         if self.redis_client:
             await self.redis_client.close()
             logger.info("Disconnected from Redis")
+        if self.binary_client:
+            await self.binary_client.close()
 
     async def add_to_list(self, prefix: str, key: str, value: Dict[str, Any], ttl: int = None):
         """Add a value to a Redis list and optionally set TTL"""
@@ -83,6 +90,104 @@ class RedisManager:
             logger.error(f"Failed to remove user {user_id} from list {new_key}: {e}")
             raise
 
+    async def set_hash(self, prefix: str, key: str, mapping: Dict[str, Any], ttl: int = None):
+        """Set fields of a Redis hash and optionally set TTL"""
+        if not self.redis_client:
+            raise RuntimeError("Redis client is not connected. Call connect() first.")
+
+        new_key = f"{prefix}:{key}"
+        try:
+            await self.redis_client.hset(new_key, mapping=mapping)
+            if ttl:
+                await self.redis_client.expire(new_key, ttl)
+        except RedisError as e:
+            logger.error(f"Failed to set hash {new_key}: {e}")
+            raise
+
+    async def increment_hash(self, prefix: str, key: str, field: str, amount: int = 1):
+        """Atomically increment a numeric field of a Redis hash"""
+        if not self.redis_client:
+            raise RuntimeError("Redis client is not connected. Call connect() first.")
+
+        new_key = f"{prefix}:{key}"
+        try:
+            return await self.redis_client.hincrby(new_key, field, amount)
+        except RedisError as e:
+            logger.error(f"Failed to increment {field} of hash {new_key}: {e}")
+            raise
+
+    async def get_hash(self, prefix: str, key: str) -> Dict[str, str]:
+        """Get all fields of a Redis hash"""
+        if not self.redis_client:
+            raise RuntimeError("Redis client is not connected. Call connect() first.")
+
+        new_key = f"{prefix}:{key}"
+        try:
+            return await self.redis_client.hgetall(new_key)
+        except RedisError as e:
+            logger.error(f"Failed to get hash {new_key}: {e}")
+            raise
+
+    async def set_value(self, prefix: str, key: str, value: str, ttl: int = None):
+        """Store a string value and optionally set TTL"""
+        if not self.redis_client:
+            raise RuntimeError("Redis client is not connected. Call connect() first.")
+
+        new_key = f"{prefix}:{key}"
+        try:
+            await self.redis_client.set(new_key, value, ex=ttl)
+        except RedisError as e:
+            logger.error(f"Failed to set {new_key}: {e}")
+            raise
+
+    async def get_value(self, prefix: str, key: str) -> Optional[str]:
+        """Get a string value"""
+        if not self.redis_client:
+            raise RuntimeError("Redis client is not connected. Call connect() first.")
+
+        new_key = f"{prefix}:{key}"
+        try:
+            return await self.redis_client.get(new_key)
+        except RedisError as e:
+            logger.error(f"Failed to get {new_key}: {e}")
+            raise
+
+    async def increment(self, prefix: str, key: str, amount: int = 1) -> int:
+        """Atomically increment a counter"""
+        if not self.redis_client:
+            raise RuntimeError("Redis client is not connected. Call connect() first.")
+
+        new_key = f"{prefix}:{key}"
+        try:
+            return await self.redis_client.incrby(new_key, amount)
+        except RedisError as e:
+            logger.error(f"Failed to increment {new_key}: {e}")
+            raise
+
+    async def set_bytes(self, prefix: str, key: str, value: bytes, ttl: int = None):
+        """Store a binary value and optionally set TTL"""
+        if not self.binary_client:
+            raise RuntimeError("Redis client is not connected. Call connect() first.")
+
+        new_key = f"{prefix}:{key}"
+        try:
+            await self.binary_client.set(new_key, value, ex=ttl)
+        except RedisError as e:
+            logger.error(f"Failed to set {new_key}: {e}")
+            raise
+
+    async def get_bytes(self, prefix: str, key: str) -> Optional[bytes]:
+        """Get a binary value"""
+        if not self.binary_client:
+            raise RuntimeError("Redis client is not connected. Call connect() first.")
+
+        new_key = f"{prefix}:{key}"
+        try:
+            return await self.binary_client.get(new_key)
+        except RedisError as e:
+            logger.error(f"Failed to get {new_key}: {e}")
+            raise
+
 
 # Singleton instance for app use
 redis_manager = RedisManager(REDIS_URL)
@@ -1,4 +1,7 @@
-from typing import Optional
+import asyncio
+import os
+from typing import Dict, Optional
+from cachetools import TTLCache
 from app.core.config.mongodb import mongo_client
 from app.core.schema.db_info_schema import DBInfo
 from app.utils.logger import logger
@@ -6,23 +9,112 @@ from app.utils.logger import logger
 HELPER_DB_NAME = "ASS_ORG_ID_DB_NAME"
 HELPER_COLL_NAME = "ASS_ORG_ID_DB_NAME_COLL"
 
+TENANT_CACHE_SIZE = int(os.getenv("TENANT_CACHE_SIZE") or 10000)
+TENANT_CACHE_TTL = int(os.getenv("TENANT_CACHE_TTL") or 300)
+TENANT_NEGATIVE_CACHE_TTL = int(os.getenv("TENANT_NEGATIVE_CACHE_TTL") or 30)
+
 
 async def get_db_info(org_id: str) -> DBInfo | None:
     try:
-        result = await mongo_client[HELPER_DB_NAME][HELPER_COLL_NAME].find_one({"orgId": org_id})
-        if not result:
-            logger.warning(f"No DB info found for org_id: {org_id}")
-            return None
-
-        data = DBInfo(
-            org_id=result.get("orgId"),
-            db_name=result.get("dbName"),
-            metadata=result.get("metadata")
-        )
-        if data.db_name is None or data.db_name == "":
-            logger.warning(f"No DB name found for org_id: {org_id}")
-            return None
-        return data or None
+        return await _fetch_db_info(org_id)
     except Exception as e:
         logger.error(f"Failed to get db info: {e}")
         return None
+
+
+async def _fetch_db_info(org_id: str) -> DBInfo | None:
+    """Like get_db_info, but lets database errors propagate so they are never cached as 'unknown org'"""
+    result = await mongo_client[HELPER_DB_NAME][HELPER_COLL_NAME].find_one({"orgId": org_id})
+    if not result:
+        logger.warning(f"No DB info found for org_id: {org_id}")
+        return None
+
+    data = DBInfo(
+        org_id=result.get("orgId"),
+        db_name=result.get("dbName"),
+        metadata=result.get("metadata")
+    )
+    if data.db_name is None or data.db_name == "":
+        logger.warning(f"No DB name found for org_id: {org_id}")
+        return None
+    return data or None
+
+
+async def save_db_info(org_id: str, db_name: str):
+    """
+    Map org_id to db_name and drop this process's cached resolution of it.
+    Other processes pick the change up once their entry expires, within TENANT_CACHE_TTL.
+    """
+    try:
+        await mongo_client[HELPER_DB_NAME][HELPER_COLL_NAME].update_one({"orgId": org_id}, {"$set": {"dbName": db_name}}, upsert=True)
+    except Exception as e:
+        logger.error(f"Failed to save db info for org_id {org_id}: {e}")
+        raise e
+    finally:
+        tenant_resolver.invalidate(org_id)
+
+
+async def delete_db_info(org_id: str):
+    """Remove the mapping of org_id and drop this process's cached resolution of it"""
+    try:
+        await mongo_client[HELPER_DB_NAME][HELPER_COLL_NAME].delete_one({"orgId": org_id})
+    except Exception as e:
+        logger.error(f"Failed to delete db info for org_id {org_id}: {e}")
+        raise e
+    finally:
+        tenant_resolver.invalidate(org_id)
+
+
+class TenantResolver:
+    """
+    Cached org_id -> DBInfo resolution shared by every *Api class.
+
+    Known orgs are cached for TENANT_CACHE_TTL seconds and unknown orgs for TENANT_NEGATIVE_CACHE_TTL.
+    Concurrent lookups of the same uncached org share a single Mongo query.
+    """
+
+    def __init__(self, maxsize: int, ttl: int, negative_ttl: int):
+        self.logger = logger
+        self.found: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.missing: TTLCache = TTLCache(maxsize=maxsize, ttl=negative_ttl)
+        self.in_flight: Dict[str, asyncio.Task] = {}
+
+    async def resolve(self, org_id: str) -> Optional[DBInfo]:
+        data = self.found.get(org_id)
+        if data is not None:
+            return data
+        if org_id in self.missing:
+            return None
+
+        task = self.in_flight.get(org_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(org_id))
+            self.in_flight[org_id] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(org_id, None))
+        # shield: one cancelled caller must not cancel the lookup the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _load(self, org_id: str) -> Optional[DBInfo]:
+        try:
+            data = await _fetch_db_info(org_id)
+        except Exception as e:
+            logger.error(f"Failed to get db info: {e}")
+            return None
+        if data is None:
+            self.missing[org_id] = True
+        else:
+            self.found[org_id] = data
+        return data
+
+    def invalidate(self, org_id: Optional[str] = None):
+        """Drop the cached resolution of org_id, or of every org if org_id is None"""
+        if org_id is None:
+            self.found.clear()
+            self.missing.clear()
+            return
+        self.found.pop(org_id, None)
+        self.missing.pop(org_id, None)
+
+
+# Singleton instance for app use
+tenant_resolver = TenantResolver(TENANT_CACHE_SIZE, TENANT_CACHE_TTL, TENANT_NEGATIVE_CACHE_TTL)
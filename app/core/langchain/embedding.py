@@ -1,28 +1,54 @@
 from langchain_core.documents import Document
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from pydantic import SecretStr
+from app.core.langchain.embedding_provider import EmbeddingProvider
+from app.core.langchain.embedding_governor import EmbeddingGovernor, embedding_governor, estimate_tokens, query_embedding_governor
 from app.utils.logger import logger
+import itertools
 import os
 from typing import List, Union
+from fastapi import Request
 from dotenv import load_dotenv
 load_dotenv()
 
+# Checked when the Gemini provider is created, so other providers run without them
 EMBEDDING_MODEL = os.getenv("GEMINI_EMBEDDING_MODEL") or ""
-if EMBEDDING_MODEL is None or EMBEDDING_MODEL == "":
-    raise Exception("GEMINI_EMBEDDING_MODEL is not set")
-
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or ""
-if GEMINI_API_KEY is None or GEMINI_API_KEY == "":
-    raise Exception("GEMINI_API_KEY is not set")
 
+EMBEDDING_CLIENT_POOL_SIZE = int(os.getenv("EMBEDDING_CLIENT_POOL_SIZE") or 1)
+
+
+class LangchainEmbeddingService(EmbeddingProvider):
+    """
+    Application-scoped embedding service. Create it once (see the app lifespan) and share it:
+    each GoogleGenerativeAIEmbeddings client keeps its own channel and credentials, and calls are
+    spread round-robin over EMBEDDING_CLIENT_POOL_SIZE clients. Document calls go through the
+    process-wide embedding governor (rate limits, adaptive concurrency, retries); query calls go
+    through the query governor, so searches never wait behind ingestion.
+    """
 
-class LangchainEmbeddingService():
-    def __init__(self):
-        self.embedder = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=SecretStr(GEMINI_API_KEY), task_type="retrieval_document")
+    def __init__(self, pool_size: int = EMBEDDING_CLIENT_POOL_SIZE, governor: EmbeddingGovernor = embedding_governor,
+                 query_governor: EmbeddingGovernor = query_embedding_governor):
+        if EMBEDDING_MODEL == "":
+            raise Exception("GEMINI_EMBEDDING_MODEL is not set")
+        if GEMINI_API_KEY == "":
+            raise Exception("GEMINI_API_KEY is not set")
+        self.task_type = "retrieval_document"
+        self.embedders = [
+            GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=SecretStr(GEMINI_API_KEY), task_type=self.task_type)
+            for _ in range(max(pool_size, 1))
+        ]
+        self._embedder_cycle = itertools.cycle(self.embedders)
         self.logger = logger
         self.model = EMBEDDING_MODEL
+        self.governor = governor
+        self.query_governor = query_governor
 
-    async def langchain_generate_embedding_by_gemini(self, document: Document) -> List[float]:
+    @property
+    def embedder(self) -> GoogleGenerativeAIEmbeddings:
+        return next(self._embedder_cycle)
+
+    async def embed_document(self, document: Document) -> List[float]:
         """
         Generate embedding for a single document.
 
@@ -33,13 +59,14 @@ class LangchainEmbeddingService():
             List of floats representing the embedding vector
         """
         try:
-            embeddings = await self.embedder.aembed_documents([document.page_content])
+            texts = [document.page_content]
+            embeddings = await self.governor.run(lambda: self.embedder.aembed_documents(texts), tokens=estimate_tokens(texts))
             return embeddings[0]
         except Exception as e:
             self.logger.error(f"Failed to generate embedding for document: {e}")
             raise e
 
-    async def langchain_generate_embedding_by_gemini_batch(self, documents: List[Document]) -> List[List[float]]:
+    async def embed_documents(self, documents: List[Document]) -> List[List[float]]:
         """
         Generate embeddings for multiple documents in batch.
 
@@ -51,14 +78,14 @@ class LangchainEmbeddingService():
         """
         try:
             texts = [doc.page_content for doc in documents]
-            embeddings = await self.embedder.aembed_documents(texts)
+            embeddings = await self.governor.run(lambda: self.embedder.aembed_documents(texts), tokens=estimate_tokens(texts))
             self.logger.info(f"Successfully generated embeddings for {len(documents)} documents")
             return embeddings
         except Exception as e:
             self.logger.error(f"Failed to generate batch embeddings: {e}")
             raise e
 
-    async def langchain_generate_query_embedding_by_gemini(self, query: str) -> List[float]:
+    async def embed_query(self, query: str) -> List[float]:
         """
         Generate embedding for a query string.
 
@@ -69,8 +96,34 @@ class LangchainEmbeddingService():
             Embedding vector for the query
         """
         try:
-            embedding = await self.embedder.aembed_query(query)
+            embedding = await self.query_governor.run(lambda: self.embedder.aembed_query(query), tokens=estimate_tokens([query]))
             return embedding
         except Exception as e:
             self.logger.error(f"Failed to generate query embedding: {e}")
             raise e
+
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for multiple query strings in one batched call.
+
+        The client's task_type takes precedence over the per-call one, so these are the same
+        vectors embed_query returns and can share its cache.
+
+        Args:
+            queries: List of query text strings
+
+        Returns:
+            List of embedding vectors, in the order of queries
+        """
+        try:
+            embeddings = await self.query_governor.run(lambda: self.embedder.aembed_documents(queries), tokens=estimate_tokens(queries))
+            self.logger.info(f"Successfully generated embeddings for {len(queries)} queries")
+            return embeddings
+        except Exception as e:
+            self.logger.error(f"Failed to generate batch query embeddings: {e}")
+            raise e
+
+
+def get_embedding_service(request: Request) -> EmbeddingProvider:
+    """FastAPI dependency returning the embedding service created in the app lifespan"""
+    return request.app.state.embedding_service
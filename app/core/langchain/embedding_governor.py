@@ -0,0 +1,187 @@
+import asyncio
+import os
+import random
+import re
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from google.api_core import exceptions as google_exceptions
+
+from app.utils.logger import logger
+
+# Provider quotas; 0 disables a limit
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE") or 1500)
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE") or 1000000)
+# Bounds of the adaptive number of embedding calls in flight across the process
+EMBEDDING_MIN_CONCURRENCY = int(os.getenv("EMBEDDING_MIN_CONCURRENCY") or 1)
+EMBEDDING_INITIAL_CONCURRENCY = int(os.getenv("EMBEDDING_INITIAL_CONCURRENCY") or 4)
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT") or 16)
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES") or 6)
+EMBEDDING_RETRY_BASE_SECONDS = float(os.getenv("EMBEDDING_RETRY_BASE_SECONDS") or 1.0)
+EMBEDDING_RETRY_MAX_SECONDS = float(os.getenv("EMBEDDING_RETRY_MAX_SECONDS") or 60.0)
+# Interactive query embeddings: their own concurrency lane and a short retry budget
+EMBEDDING_QUERY_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_QUERY_MAX_IN_FLIGHT") or 32)
+EMBEDDING_QUERY_MAX_RETRIES = int(os.getenv("EMBEDDING_QUERY_MAX_RETRIES") or 2)
+EMBEDDING_QUERY_RETRY_BASE_SECONDS = float(os.getenv("EMBEDDING_QUERY_RETRY_BASE_SECONDS") or 0.2)
+EMBEDDING_QUERY_RETRY_MAX_SECONDS = float(os.getenv("EMBEDDING_QUERY_RETRY_MAX_SECONDS") or 1.0)
+# Rough token estimate for the tokens-per-minute budget
+CHARS_PER_TOKEN = 4
+
+# Quota errors shrink the concurrency limit; transient server errors are only retried
+THROTTLE_STATUS_CODES = {429}
+TRANSIENT_STATUS_CODES = {500, 502, 503, 504}
+THROTTLE_MESSAGE = re.compile(r"\b429\b|RESOURCE_EXHAUSTED|[Qq]uota exceeded")
+UNAVAILABLE_MESSAGE = re.compile(r"\b503\b|UNAVAILABLE")
+
+T = TypeVar("T")
+
+
+def estimate_tokens(texts) -> int:
+    return sum(len(text) // CHARS_PER_TOKEN + 1 for text in texts)
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """HTTP status of an embedding error, looking through wrappers such as GoogleGenerativeAIError"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, google_exceptions.GoogleAPICallError) and error.code is not None:
+            return int(error.code)
+        message = str(error)
+        if THROTTLE_MESSAGE.search(message):
+            return 429
+        if UNAVAILABLE_MESSAGE.search(message):
+            return 503
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class TokenBucket:
+    """Refills rate_per_minute units per minute up to one minute's worth; acquire waits in FIFO order"""
+
+    def __init__(self, rate_per_minute: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.available = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount: float):
+        if self.rate <= 0:
+            return
+        # A request larger than the bucket waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                await asyncio.sleep((amount - self.available) / self.rate)
+
+    def spend(self, amount: float):
+        """Take amount without waiting; the balance may go negative, and waiting acquirers pay it back"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate) - amount
+        self.updated_at = now
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit adjusted by additive increase / multiplicative decrease: each success adds
+    1 / limit (about one more slot per limit successes), each throttled call halves the limit.
+    """
+
+    def __init__(self, minimum: int, initial: int, maximum: int):
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, succeeded: bool, throttled: bool):
+        async with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            elif succeeded:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class EmbeddingGovernor:
+    """
+    Gate for embedding provider calls: request and token buckets for the per-minute quotas, an AIMD
+    concurrency limit that backs off on 429 / RESOURCE_EXHAUSTED, and retries with full-jitter
+    exponential backoff on quota and transient server errors.
+
+    With wait_for_quota False, calls spend from the buckets without queueing on them, so they take
+    precedence over governors that share the buckets and wait.
+    """
+
+    def __init__(self, requests: TokenBucket, tokens: TokenBucket, limiter: AIMDLimiter, max_retries: int,
+                 retry_base_seconds: float, retry_max_seconds: float, wait_for_quota: bool = True):
+        self.logger = logger
+        self.requests = requests
+        self.tokens = tokens
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.wait_for_quota = wait_for_quota
+
+    async def _take_quota(self, tokens: int):
+        if self.wait_for_quota:
+            await self.requests.acquire(1)
+            await self.tokens.acquire(tokens)
+        else:
+            self.requests.spend(1)
+            self.tokens.spend(tokens)
+
+    async def run(self, call: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        attempt = 0
+        while True:
+            await self._take_quota(tokens)
+            await self.limiter.acquire()
+            succeeded, status = False, None
+            try:
+                result = await call()
+                succeeded = True
+                return result
+            except Exception as e:
+                status = error_status(e)
+                if status not in THROTTLE_STATUS_CODES | TRANSIENT_STATUS_CODES or attempt >= self.max_retries:
+                    raise
+                delay = random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt))
+                self.logger.warning(f"Embedding call failed with status {status}, retry {attempt + 1} of {self.max_retries} in {delay:.1f}s "
+                                    f"(concurrency limit {self.limiter.limit:.1f}): {e}")
+            finally:
+                await self.limiter.release(succeeded, throttled=status in THROTTLE_STATUS_CODES)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+# Singleton instance for app use
+# Document embedding (ingestion): waits for quota, adapts its concurrency, retries patiently
+embedding_governor = EmbeddingGovernor(
+    TokenBucket(EMBEDDING_REQUESTS_PER_MINUTE), TokenBucket(EMBEDDING_TOKENS_PER_MINUTE),
+    AIMDLimiter(EMBEDDING_MIN_CONCURRENCY, EMBEDDING_INITIAL_CONCURRENCY, EMBEDDING_MAX_IN_FLIGHT),
+    EMBEDDING_MAX_RETRIES, EMBEDDING_RETRY_BASE_SECONDS, EMBEDDING_RETRY_MAX_SECONDS,
+)
+# Query embedding: never queues behind ingestion for quota or concurrency slots, but its usage is
+# charged to the shared buckets so ingestion slows down instead; gives up after a short retry budget
+query_embedding_governor = EmbeddingGovernor(
+    embedding_governor.requests, embedding_governor.tokens,
+    AIMDLimiter(EMBEDDING_MIN_CONCURRENCY, EMBEDDING_QUERY_MAX_IN_FLIGHT, EMBEDDING_QUERY_MAX_IN_FLIGHT),
+    EMBEDDING_QUERY_MAX_RETRIES, EMBEDDING_QUERY_RETRY_BASE_SECONDS, EMBEDDING_QUERY_RETRY_MAX_SECONDS,
+    wait_for_quota=False,
+)
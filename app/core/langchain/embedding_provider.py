@@ -0,0 +1,26 @@
+from typing import List, Protocol
+
+from langchain_core.documents import Document
+
+
+class EmbeddingProvider(Protocol):
+    """
+    What ingestion and search need from an embedding provider. model names the vectors' space:
+    caches and stored chunks are keyed by it, so vectors of different models are never mixed.
+    """
+
+    model: str
+    task_type: str
+
+    async def embed_document(self, document: Document) -> List[float]:
+        ...
+
+    async def embed_documents(self, documents: List[Document]) -> List[List[float]]:
+        ...
+
+    async def embed_query(self, query: str) -> List[float]:
+        ...
+
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries in one call; the vectors equal embed_query's, so they share its cache"""
+        ...
@@ -0,0 +1,51 @@
+import os
+from typing import Callable, Dict, Mapping, Optional
+
+from app.core.langchain.embedding import LangchainEmbeddingService
+from app.core.langchain.embedding_provider import EmbeddingProvider
+from app.core.langchain.local_embedding import LocalEmbeddingService
+from app.utils.logger import logger
+
+EMBEDDING_PROVIDER_GEMINI = "gemini"
+EMBEDDING_PROVIDER_LOCAL = "local"
+EMBEDDING_PROVIDER = (os.getenv("EMBEDDING_PROVIDER") or EMBEDDING_PROVIDER_GEMINI).lower()
+# DBInfo.metadata key that overrides EMBEDDING_PROVIDER for a tenant
+TENANT_EMBEDDING_PROVIDER_KEY = "embedding_provider"
+
+
+class EmbeddingProviderRegistry:
+    """
+    Embedding providers by name, each created on first use and then shared by the whole process.
+    A provider whose configuration is missing (e.g. GEMINI_API_KEY) only fails when it is used.
+    """
+
+    def __init__(self, default_provider: str):
+        self.logger = logger
+        self.default_provider = default_provider
+        self.factories: Dict[str, Callable[[], EmbeddingProvider]] = {}
+        self.services: Dict[str, EmbeddingProvider] = {}
+
+    def register(self, name: str, factory: Callable[[], EmbeddingProvider]):
+        self.factories[name] = factory
+
+    def get(self, name: Optional[str] = None) -> EmbeddingProvider:
+        name = (name or self.default_provider).lower()
+        service = self.services.get(name)
+        if service is None:
+            factory = self.factories.get(name)
+            if factory is None:
+                raise Exception(f"Unknown embedding provider {name}, expected one of {sorted(self.factories)}")
+            service = factory()
+            self.services[name] = service
+            self.logger.info(f"Created {name} embedding provider with model {service.model}")
+        return service
+
+    def for_tenant(self, metadata: Optional[Mapping[str, str]]) -> EmbeddingProvider:
+        """The provider configured in a tenant's DBInfo.metadata, else the default one"""
+        return self.get((metadata or {}).get(TENANT_EMBEDDING_PROVIDER_KEY))
+
+
+# Singleton instance for app use
+embedding_provider_registry = EmbeddingProviderRegistry(EMBEDDING_PROVIDER)
+embedding_provider_registry.register(EMBEDDING_PROVIDER_GEMINI, LangchainEmbeddingService)
+embedding_provider_registry.register(EMBEDDING_PROVIDER_LOCAL, LocalEmbeddingService)
@@ -0,0 +1,84 @@
+import os
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config.executors import executor_manager
+from app.core.langchain.embedding_provider import EmbeddingProvider
+from app.core.utils.tokenizer import term_hash, tokenize
+from app.utils.logger import logger
+
+LOCAL_EMBEDDING_DIMENSIONS = int(os.getenv("LOCAL_EMBEDDING_DIMENSIONS") or 768)
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, so every bit of a combined hash depends on both inputs"""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def hashing_embeddings(texts: List[str], dimensions: int = LOCAL_EMBEDDING_DIMENSIONS) -> List[List[float]]:
+    """
+    Signed feature hashing of word unigrams and bigrams into dimensions buckets, with sublinear
+    term frequency and L2 normalization. Only the batch's distinct tokens are hashed in Python;
+    bigram hashes, bucketing, counting and normalization are array operations over the whole batch.
+    """
+    vocabulary: Dict[str, int] = {}
+    token_ids: List[int] = []
+    rows: List[int] = []
+    for row, text in enumerate(texts):
+        ids = [vocabulary.setdefault(token, len(vocabulary)) for token in tokenize(text)]
+        token_ids.extend(ids)
+        rows.extend([row] * len(ids))
+
+    token_hashes = np.array([term_hash(token) for token in vocabulary], dtype=np.int64).view(np.uint64)
+    unigrams = token_hashes[np.array(token_ids, dtype=np.int64)]
+    token_rows = np.array(rows, dtype=np.int64)
+    same_text = token_rows[1:] == token_rows[:-1]
+    bigrams = _mix(unigrams[:-1][same_text] * np.uint64(31) + unigrams[1:][same_text])
+    features = np.concatenate([unigrams, bigrams])
+    feature_rows = np.concatenate([token_rows, token_rows[1:][same_text]])
+
+    buckets = feature_rows * dimensions + (features % np.uint64(dimensions)).astype(np.int64)
+    signs = np.where(features >> np.uint64(63), -1.0, 1.0)
+    counts = np.bincount(buckets, weights=signs, minlength=len(texts) * dimensions).reshape(len(texts), dimensions)
+    vectors = np.sign(counts) * np.log1p(np.abs(counts))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1, norms)
+    return vectors.astype(np.float32).tolist()
+
+
+class LocalEmbeddingService(EmbeddingProvider):
+    """
+    Embedding provider that runs on the CPU without any network call, for low-value corpora, load
+    tests and CI. Vectors only capture shared words, not meaning. Document batches are hashed on the
+    CPU process pool; single queries are hashed inline.
+    """
+
+    def __init__(self, dimensions: int = LOCAL_EMBEDDING_DIMENSIONS):
+        self.logger = logger
+        self.dimensions = dimensions
+        self.task_type = "retrieval_document"
+        self.model = f"local-hashing-{dimensions}"
+
+    async def embed_document(self, document: Document) -> List[float]:
+        return hashing_embeddings([document.page_content], self.dimensions)[0]
+
+    async def embed_documents(self, documents: List[Document]) -> List[List[float]]:
+        try:
+            embeddings = await executor_manager.run_cpu(hashing_embeddings, [doc.page_content for doc in documents], self.dimensions)
+            self.logger.info(f"Successfully generated local embeddings for {len(documents)} documents")
+            return embeddings
+        except Exception as e:
+            self.logger.error(f"Failed to generate local batch embeddings: {e}")
+            raise e
+
+    async def embed_query(self, query: str) -> List[float]:
+        return hashing_embeddings([query], self.dimensions)[0]
+
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        return hashing_embeddings(queries, self.dimensions)
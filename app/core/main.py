@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
@@ -5,7 +6,26 @@ from dotenv import load_dotenv
 from app.core.routes.rag.rag_route import router as v1_rag_router
 from app.core.routes.prompt_route import router as v1_prompt_router
 from app.core.routes.tool_route import router as v1_tool_router
-app = FastAPI()
+from app.core.config.executors import executor_manager
+from app.core.config.redis import redis_manager
+from app.core.langchain.embedding_registry import embedding_provider_registry
+from app.core.service.rag.ingestion_job_service import ingestion_job_manager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor_manager.start()
+    await redis_manager.connect()
+    # Embedding clients are created once per process and shared by every request and job;
+    # this is the EMBEDDING_PROVIDER default, tenants may select another provider
+    app.state.embedding_service = embedding_provider_registry.get()
+    await ingestion_job_manager.start(app.state.embedding_service)
+    yield
+    await ingestion_job_manager.stop()
+    await redis_manager.disconnect()
+    executor_manager.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Rate limiting
 limiter = Limiter(key_func=get_remote_address)
@@ -1,10 +1,15 @@
+from typing import Optional
 from uuid import uuid4
 from fastapi import Body, Form, Path, APIRouter, Query, Depends, File, UploadFile
+from fastapi.responses import JSONResponse
 from pydantic import ValidationError
-from app.core.schema.embedded_document_schema import EmbeddedDocumentMetadata, SearchQuery
+from app.core.schema.embedded_document_schema import BatchSearchQuery, EmbeddedDocumentMetadata, SearchQuery
 from app.core.schema.rag_schema import RagDocumentCreate
 from app.utils.logger import logger, x_logger_response
 from app.core.api.rag.rag_api import RagApi
+from app.core.langchain.embedding import get_embedding_service
+from app.core.langchain.embedding_provider import EmbeddingProvider
+from app.core.utils.streaming import StreamFormat, stream_response
 router = APIRouter(
     tags=["RAG"],
     responses={404: {"description": "Not found"}},
@@ -15,7 +20,9 @@ router = APIRouter(
 async def generate_embedding(
     org_id: str,
     body: str = Form(...),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    background: bool = Query(False),
+    embedder: EmbeddingProvider = Depends(get_embedding_service)
 ):
     try:
         try:
@@ -24,26 +31,70 @@ async def generate_embedding(
             logger.error(f"Invalid body format: {e}")
             return {"error": f"Invalid body format: {e}"}
 
-        rag_api = await RagApi(org_id).initialize()
+        rag_api = await RagApi(org_id, embedder).initialize()
         content = await file.read()
         if file.filename is None:
             file.filename = f"{uuid4()}"
         if file.content_type is None:
             file.content_type = "application/octet-stream"
-        await rag_api.generate_embedding(rag_data, content, file.filename, file.content_type)
 
-        return {"message": "Embedding generated successfully"}
+        if background:
+            job_id = await rag_api.submit_embedding_job(rag_data, content, file.filename, file.content_type)
+            return JSONResponse(content={"message": "Embedding job queued", "job_id": job_id}, status_code=202)
+
+        # 200, or 207 with failed_chunk_numbers when some chunks could not be embedded or stored
+        return await rag_api.generate_embedding(rag_data, content, file.filename, file.content_type)
     except Exception as e:
         logger.error(f"Failed to generate embedding for org_id {org_id}: {e}")
         return {"error": f"Failed to generate embedding, {e}"}
 
 
+@router.get("/{org_id}/rag/jobs/{job_id}")
+async def get_embedding_job(org_id: str, job_id: str, embedder: EmbeddingProvider = Depends(get_embedding_service)):
+    try:
+        rag_api = await RagApi(org_id, embedder).initialize()
+        job = await rag_api.get_embedding_job(job_id)
+        if job is None:
+            return {"error": f"Job {job_id} not found"}
+        return job
+    except Exception as e:
+        logger.error(f"Failed to get embedding job {job_id} for org_id {org_id}: {e}")
+        return {"error": f"Failed to get embedding job, {e}"}
+
+
 @router.get("/{org_id}/rag/query")
-async def query_embedding(org_id: str, query: str = Query(...), limit: int = Query(3), category: str = Query(None)):
+async def query_embedding(org_id: str, query: str = Query(...), limit: int = Query(3), category: str = Query(None), no_cache: bool = Query(False), hybrid: bool = Query(False), num_candidates: int = Query(None), stream: Optional[StreamFormat] = Query(None), fields: Optional[str] = Query(None, description="Comma-separated result fields, e.g. title,chunk_number"), snippet_length: Optional[int] = Query(None), rerank: bool = Query(False), mmr_lambda: float = Query(0.7), embedder: EmbeddingProvider = Depends(get_embedding_service)):
     try:
-        rag_api = await RagApi(org_id).initialize()
-        data = SearchQuery(query=query, limit=limit, category=category, metadata=EmbeddedDocumentMetadata(org_id=org_id))
-        return await rag_api.query_embedding(data)
+        rag_api = await RagApi(org_id, embedder).initialize()
+        field_list = [field.strip() for field in fields.split(",") if field.strip()] if fields is not None else None
+        data = SearchQuery(query=query, limit=limit, category=category, metadata=EmbeddedDocumentMetadata(org_id=org_id), hybrid=hybrid, num_candidates=num_candidates,
+                           fields=field_list, snippet_length=snippet_length, rerank=rerank, mmr_lambda=mmr_lambda)
+        if stream:
+            return stream_response(rag_api.stream_query_embedding(data, use_cache=not no_cache), stream)
+        return await rag_api.query_embedding(data, use_cache=not no_cache)
     except Exception as e:
         logger.error(f"Failed to get query embedding for org_id {org_id}: {e}")
         return {"error": f"Failed to get query embedding, {e}"}
+
+
+@router.post("/{org_id}/rag/query/batch")
+async def batch_query_embedding(org_id: str, body: BatchSearchQuery = Body(...), no_cache: bool = Query(False), stream: Optional[StreamFormat] = Query(None), embedder: EmbeddingProvider = Depends(get_embedding_service)):
+    try:
+        rag_api = await RagApi(org_id, embedder).initialize()
+        body.metadata = EmbeddedDocumentMetadata(org_id=org_id)
+        if stream:
+            return stream_response(rag_api.stream_batch_query_embedding(body, use_cache=not no_cache), stream)
+        return await rag_api.batch_query_embedding(body, use_cache=not no_cache)
+    except Exception as e:
+        logger.error(f"Failed to search batch of queries for org_id {org_id}: {e}")
+        return {"error": f"Failed to search batch of queries, {e}"}
+
+
+@router.get("/{org_id}/rag/cache/stats")
+async def get_search_cache_stats(org_id: str, embedder: EmbeddingProvider = Depends(get_embedding_service)):
+    try:
+        rag_api = await RagApi(org_id, embedder).initialize()
+        return await rag_api.get_search_cache_stats()
+    except Exception as e:
+        logger.error(f"Failed to get search cache stats for org_id {org_id}: {e}")
+        return {"error": f"Failed to get search cache stats, {e}"}
@@ -1,11 +1,15 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict
+from pydantic import BaseModel, Field, model_serializer
+from typing import Annotated, Literal, Optional, List, Dict, Union
 
 
 class EmbeddedDocumentMetadata(BaseModel):
     org_id: Optional[str] = None
 
 
+# Result fields a query can project with SearchQuery.fields; id and score are always returned
+SearchResultField = Literal["title", "content", "category", "chunk_number", "metadata"]
+
+
 class EmbeddedDocumentCreate(BaseModel):
     title: str = Field(..., min_length=1, max_length=500)
     content: str = Field(..., min_length=1)
@@ -13,6 +17,12 @@ class EmbeddedDocumentCreate(BaseModel):
     chunk_number: Optional[int] = None
     metadata: Optional[EmbeddedDocumentMetadata] = None
     embeddings: Optional[List[float]]
+    # Identity of the source document, the chunk's content hash, the document version that stored it
+    # and the model that embedded it
+    document_id: Optional[str] = None
+    content_hash: Optional[str] = None
+    document_version: Optional[int] = None
+    embedding_model: Optional[str] = None
 
 
 class EmbeddedDocumentResponse(BaseModel):
@@ -23,11 +33,59 @@ class EmbeddedDocumentResponse(BaseModel):
     metadata: Optional[EmbeddedDocumentMetadata] = None
 
 
+class EmbeddedDocumentBulkWriteResult(BaseModel):
+    inserted_count: int = 0
+    batch_counts: List[int] = []
+    failed_chunk_numbers: List[int] = []
+
+    def merge(self, other: "EmbeddedDocumentBulkWriteResult"):
+        self.inserted_count += other.inserted_count
+        self.batch_counts.extend(other.batch_counts)
+        self.failed_chunk_numbers.extend(other.failed_chunk_numbers)
+        return self
+
+
 class SearchQuery(BaseModel):
     query: str = Field(..., min_length=1)
     limit: int = Field(default=3, ge=1, le=50)
     category: Optional[str] = None
     metadata: Optional[EmbeddedDocumentMetadata] = None
+    # Fuse BM25 and vector rankings; result scores are then reciprocal rank fusion scores
+    hybrid: bool = False
+    # Overrides the planned $vectorSearch numCandidates
+    num_candidates: Optional[int] = Field(default=None, ge=1, le=10000)
+    # Return only these fields (SearchHit results); an empty list returns ids and scores only
+    fields: Optional[List[SearchResultField]] = None
+    # Truncate content to this many characters in Mongo (SearchHit results)
+    snippet_length: Optional[int] = Field(default=None, ge=1, le=10000)
+    # Re-rank a larger vector search candidate set: collapse adjacent chunks, then diversify with MMR
+    rerank: bool = False
+    # MMR weight of relevance against redundancy; 1.0 keeps the relevance order
+    mmr_lambda: float = Field(default=0.7, ge=0, le=1)
+
+    @property
+    def projected(self) -> bool:
+        return self.fields is not None or self.snippet_length is not None
+
+
+class BatchSearchQuery(BaseModel):
+    queries: List[Annotated[str, Field(min_length=1)]] = Field(..., min_length=1, max_length=50)
+    limit: int = Field(default=3, ge=1, le=50)
+    category: Optional[str] = None
+    metadata: Optional[EmbeddedDocumentMetadata] = None
+    hybrid: bool = False
+    num_candidates: Optional[int] = Field(default=None, ge=1, le=10000)
+    fields: Optional[List[SearchResultField]] = None
+    snippet_length: Optional[int] = Field(default=None, ge=1, le=10000)
+    rerank: bool = False
+    mmr_lambda: float = Field(default=0.7, ge=0, le=1)
+    # Return each chunk once, under the query that scored it highest
+    dedupe: bool = False
+
+    def search_queries(self) -> List["SearchQuery"]:
+        """One SearchQuery per distinct query text, in request order"""
+        options = self.model_dump(exclude={"queries", "dedupe"})
+        return [SearchQuery(query=query, **options) for query in dict.fromkeys(self.queries)]
 
 
 class SearchResult(BaseModel):
@@ -38,3 +96,27 @@ class SearchResult(BaseModel):
     score: float
     chunk_number: Optional[int] = None
     metadata: Optional[EmbeddedDocumentMetadata] = None
+
+
+class SearchHit(BaseModel):
+    """Lightweight result of a projected query: id, score and only the requested fields"""
+    id: str
+    score: float
+    title: Optional[str] = None
+    content: Optional[str] = None
+    category: Optional[str] = None
+    chunk_number: Optional[int] = None
+    metadata: Optional[EmbeddedDocumentMetadata] = None
+
+    @model_serializer(mode="wrap")
+    def _drop_missing_fields(self, handler):
+        return {key: value for key, value in handler(self).items() if value is not None}
+
+
+class BatchSearchResponse(BaseModel):
+    results: Dict[str, List[Union[SearchResult, SearchHit]]]
+
+
+class BatchSearchResultItem(BaseModel):
+    query: str
+    result: Union[SearchResult, SearchHit]
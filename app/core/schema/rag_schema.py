@@ -1,5 +1,6 @@
-from typing import Optional
+from typing import Literal, Optional
 from pydantic import BaseModel, Field
+from app.core.schema.embedded_document_schema import EmbeddedDocumentBulkWriteResult
 
 
 class RagMetadata(BaseModel):
@@ -10,3 +11,32 @@ class RagDocumentCreate(BaseModel):
     title: str = Field(..., min_length=1, max_length=500)
     category: Optional[str] = None
     metadata: Optional[RagMetadata] = None
+    # Identifies the document across re-uploads; defaults to the title within its category
+    document_id: Optional[str] = Field(default=None, min_length=1, max_length=500)
+
+
+class IngestionResult(EmbeddedDocumentBulkWriteResult):
+    embedding_cache_hits: int = 0
+    embedding_cache_misses: int = 0
+    document_version: Optional[int] = None
+    # Chunks already stored by an earlier version, and stored chunks the new version no longer has
+    unchanged_count: int = 0
+    deleted_count: int = 0
+
+
+class IngestionJobStatus(BaseModel):
+    job_id: str
+    # partial: some chunks failed to embed or store; the previous version's chunks were kept
+    status: Literal["queued", "running", "completed", "partial", "failed"] = "queued"
+    filename: Optional[str] = None
+    chunks_split: int = 0
+    chunks_embedded: int = 0
+    chunks_stored: int = 0
+    chunks_failed: int = 0
+    chunks_unchanged: int = 0
+    chunks_deleted: int = 0
+    embedding_cache_hits: int = 0
+    embedding_cache_misses: int = 0
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
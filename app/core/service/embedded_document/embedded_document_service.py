@@ -1,14 +1,40 @@
-from typing import List
+import asyncio
+import hashlib
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
+from bson import ObjectId
 from numpy import ogrid
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 from app.utils.logger import logger
+from app.core.config.executors import executor_manager
 from app.core.config.mongodb import mongo_client
-from app.core.schema.embedded_document_schema import EmbeddedDocumentCreate, EmbeddedDocumentResponse, EmbeddedDocumentMetadata, SearchResult, SearchQuery
+from app.core.utils.vector_codec import encode_embedding
+from app.core.schema.embedded_document_schema import EmbeddedDocumentBulkWriteResult, EmbeddedDocumentCreate, EmbeddedDocumentResponse, EmbeddedDocumentMetadata, SearchResult, SearchQuery
+from app.core.service.embedded_document.lexical_index import encode_lexical_terms, encode_lexical_terms_batch, lexical_index_registry
+from app.core.service.embedded_document.search_tuning import candidate_planner
+from app.core.service.embedded_document.search_backend import EMBEDDED_DOCUMENT_COLLECTION, EMBEDDED_DOCUMENT_INDEX_NAME, EMBEDDING_PATH, NUM_CANDIDATES, candidate_projection, fetch_hits, search_backends, select_search_backend
 
-EMBEDDED_DOCUMENT_COLLECTION = "EmbeddedDocuments"
-EMBEDDED_DOCUMENT_INDEX_NAME = "VectorIndex"
-NUM_CANDIDATES = 150
-EMBEDDING_PATH = "embeddings"
+BULK_WRITE_FLUSH_SIZE = int(os.getenv("EMBEDDED_DOCUMENT_FLUSH_SIZE") or 500)
+# Documents serialized between two yields to the event loop, about 5 ms of work with 768-d embeddings
+SERIALIZE_SLICE_SIZE = int(os.getenv("EMBEDDED_DOCUMENT_SERIALIZE_SLICE_SIZE") or 50)
+# One record per ingested source document: its current version and chunk count
+DOCUMENT_COLLECTION = "Documents"
+DOCUMENT_CHUNK_PROJECTION = {"content_hash": 1, "chunk_number": 1, "category": 1, "embedding_model": 1}
+# Tenants whose document_id and legacy title lookups are known to be indexed by this process
+_document_indexed_databases = set()
+
+
+def content_hash(content: str) -> str:
+    """Identity of a chunk's text across versions of its document"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def default_document_id(title: str, category: Optional[str]) -> str:
+    """Identity of an upload without an explicit document_id: its title within its category"""
+    return title if category is None else f"{category}/{title}"
 
 
 class EmbeddedDocumentService:
@@ -21,7 +47,10 @@ class EmbeddedDocumentService:
     async def store_embedded_document(self, embedded_document: EmbeddedDocumentCreate):
         try:
             collection = self.mongo_client[self.db_name][EMBEDDED_DOCUMENT_COLLECTION]
-            result = await collection.insert_one(embedded_document.model_dump(exclude_unset=True))
+            document = self._to_document(embedded_document)
+            result = await collection.insert_one(document)
+            self._notify_search_backends([document])
+            await candidate_planner.record_documents(self.db_name, [document])
             return EmbeddedDocumentResponse(
                 id=str(result.inserted_id),
                 title=embedded_document.title,
@@ -33,67 +62,199 @@ class EmbeddedDocumentService:
             self.logger.error(f"Failed to store embedded document: {e}")
             raise e
 
-    async def search_embedded_documents(self, query_embedding: List[float], query: SearchQuery):
+    async def store_embedded_documents(self, embedded_documents: List[EmbeddedDocumentCreate], flush_size: int = BULK_WRITE_FLUSH_SIZE) -> EmbeddedDocumentBulkWriteResult:
+        """
+        Store embedded documents with unordered insert_many calls of at most flush_size documents.
+
+        A failing document does not stop the rest of its batch; its chunk_number is reported
+        in failed_chunk_numbers instead.
+        """
+        result = EmbeddedDocumentBulkWriteResult()
+        collection = self.mongo_client[self.db_name][EMBEDDED_DOCUMENT_COLLECTION]
+        for start in range(0, len(embedded_documents), flush_size):
+            batch = embedded_documents[start:start + flush_size]
+            documents: List[Dict[str, Any]] = []
+            failed_indexes = []
+            try:
+                # Counting terms is the CPU-bound part of serializing chunks; the process pool gets only their texts
+                lexical_terms = await executor_manager.run_cpu(encode_lexical_terms_batch, [doc.content for doc in batch])
+                for offset in range(0, len(batch), SERIALIZE_SLICE_SIZE):
+                    documents.extend(self._to_document(doc, terms) for doc, terms in zip(batch[offset:offset + SERIALIZE_SLICE_SIZE], lexical_terms[offset:offset + SERIALIZE_SLICE_SIZE]))
+                    # Yield between slices, so serializing a large batch never holds queries up for long
+                    await asyncio.sleep(0)
+                write_result = await collection.insert_many(documents, ordered=False)
+                inserted_count = len(write_result.inserted_ids)
+            except BulkWriteError as e:
+                failed_indexes = sorted({error["index"] for error in e.details.get("writeErrors", [])})
+                inserted_count = e.details.get("nInserted", len(batch) - len(failed_indexes))
+                result.failed_chunk_numbers.extend(self._chunk_number(batch, i, start) for i in failed_indexes)
+                self.logger.error(f"Failed to store {len(failed_indexes)} of {len(batch)} embedded documents: {e}")
+            except Exception as e:
+                inserted_count = 0
+                failed_indexes = list(range(len(batch)))
+                result.failed_chunk_numbers.extend(self._chunk_number(batch, i, start) for i in failed_indexes)
+                self.logger.error(f"Failed to store batch of {len(batch)} embedded documents: {e}")
+
+            if inserted_count:
+                # insert_many sets _id on each document, so search backends can index them right away
+                failed = set(failed_indexes)
+                stored = [document for i, document in enumerate(documents) if i not in failed]
+                self._notify_search_backends(stored)
+                await candidate_planner.record_documents(self.db_name, stored)
+
+            result.batch_counts.append(inserted_count)
+            result.inserted_count += inserted_count
+
+        self.logger.info(f"Stored {result.inserted_count} of {len(embedded_documents)} embedded documents in {len(result.batch_counts)} batches")
+        return result
+
+    async def start_document_version(self, document_id: str, title: str) -> int:
+        """Reserve the next version number of a document"""
+        try:
+            collection = self.mongo_client[self.db_name][DOCUMENT_COLLECTION]
+            document = await collection.find_one_and_update(
+                {"_id": document_id},
+                {"$inc": {"version": 1}, "$set": {"title": title, "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return document["version"]
+        except Exception as e:
+            self.logger.error(f"Failed to start version of document {document_id}: {e}")
+            raise e
+
+    async def finish_document_version(self, document_id: str, version: int, chunk_count: int):
+        try:
+            collection = self.mongo_client[self.db_name][DOCUMENT_COLLECTION]
+            await collection.update_one(
+                {"_id": document_id, "version": version},
+                {"$set": {"chunk_count": chunk_count, "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}},
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to finish version {version} of document {document_id}: {e}")
+            raise e
+
+    async def get_document_chunks(self, document_id: str, title: str, category: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        Stored chunks of a document with _id, content_hash, chunk_number, category and embedding_model.
+        Chunks stored before documents had ids are matched by title and category and hashed here; they
+        carry no embedding_model, so a re-upload replaces them.
+        """
+        try:
+            collection = self.mongo_client[self.db_name][EMBEDDED_DOCUMENT_COLLECTION]
+            await self._ensure_document_indexes(collection)
+            chunks = await collection.find({"document_id": document_id}, DOCUMENT_CHUNK_PROJECTION).to_list(length=None)
+            legacy = await collection.find({"document_id": {"$exists": False}, "title": title, "category": category}, {**DOCUMENT_CHUNK_PROJECTION, "content": 1}).to_list(length=None)
+            for chunk in legacy:
+                chunk["content_hash"] = content_hash(chunk.pop("content", ""))
+            return chunks + legacy
+        except Exception as e:
+            self.logger.error(f"Failed to get chunks of document {document_id}: {e}")
+            raise e
+
+    async def _ensure_document_indexes(self, collection):
+        """Index the chunk lookups of get_document_chunks once per tenant and process; create_index is a no-op if they exist"""
+        if self.db_name in _document_indexed_databases:
+            return
+        await collection.create_index([("document_id", 1)])
+        await collection.create_index([("title", 1), ("category", 1)])
+        _document_indexed_databases.add(self.db_name)
+
+    async def update_embedded_documents(self, updates: List[Tuple[ObjectId, Dict[str, Any]]]) -> int:
+        """Set fields of stored chunks, e.g. the chunk_number of a chunk that moved, in one unordered bulk write"""
+        if not updates:
+            return 0
         try:
-            self.logger.info("Searching embedded documents in DB")
-
-            # filter dictionary
-            filter_conditions = {}
-            if query.category:
-                self.logger.info(f"Filtering by category: {query.category}")
-                filter_conditions["category"] = {"$eq": query.category}
-
-            if query.metadata and query.metadata.org_id:
-                self.logger.info(f"Filtering by org_id: {query.metadata.org_id}")
-                filter_conditions["metadata.org_id"] = {"$eq": query.metadata.org_id}
-
-            vector_search_stage = {
-                "$vectorSearch": {
-                    "index": EMBEDDED_DOCUMENT_INDEX_NAME,
-                    "path": EMBEDDING_PATH,
-                    "queryVector": query_embedding,
-                    "numCandidates": NUM_CANDIDATES,
-                    "limit": query.limit
-                }
-            }
-
-            # Add filter only if there are conditions
-            if filter_conditions:
-                vector_search_stage["$vectorSearch"]["filter"] = filter_conditions
-
-            pipeline = [
-                vector_search_stage,
-                {
-                    "$project": {
-                        "_id": 1,
-                        "title": 1,
-                        "content": 1,
-                        "category": 1,
-                        "metadata": 1,
-                        "chunk_number": 1,
-                        "score": {"$meta": "vectorSearchScore"}
-                    }
-                }
-            ]
+            collection = self.mongo_client[self.db_name][EMBEDDED_DOCUMENT_COLLECTION]
+            result = await collection.bulk_write([UpdateOne({"_id": oid}, {"$set": fields}) for oid, fields in updates], ordered=False)
+            return result.modified_count
+        except Exception as e:
+            self.logger.error(f"Failed to update {len(updates)} embedded documents: {e}")
+            raise e
 
+    async def delete_embedded_documents(self, documents: List[Dict[str, Any]]) -> int:
+        """Delete stored chunks (with _id and category) in one delete_many and drop them from the search indexes"""
+        if not documents:
+            return 0
+        try:
+            ids = [document["_id"] for document in documents]
             collection = self.mongo_client[self.db_name][EMBEDDED_DOCUMENT_COLLECTION]
-            cursor = collection.aggregate(pipeline)
-            results = await cursor.to_list(length=query.limit)
-
-            search_results = [
-                SearchResult(
-                    id=str(doc["_id"]),
-                    title=doc["title"],
-                    content=doc["content"],
-                    category=doc.get("category"),
-                    score=doc["score"],
-                    chunk_number=doc["chunk_number"],
-                    metadata=doc.get("metadata")
-                )
-                for doc in results
-            ]
-
-            return search_results
+            result = await collection.delete_many({"_id": {"$in": ids}})
+            self._notify_search_backends_removed(ids)
+            await candidate_planner.record_documents(self.db_name, documents, increment=-1)
+            self.logger.info(f"Deleted {result.deleted_count} of {len(ids)} embedded documents")
+            return result.deleted_count
+        except Exception as e:
+            self.logger.error(f"Failed to delete {len(documents)} embedded documents: {e}")
+            raise e
+
+    def _notify_search_backends(self, documents: List[Dict[str, Any]]):
+        for backend in search_backends.values():
+            backend.on_documents_stored(self.db_name, documents)
+        try:
+            lexical_index_registry.add_documents(self.db_name, documents)
+        except Exception as e:
+            self.logger.error(f"Failed to update lexical index for {self.db_name}: {e}")
+
+    def _notify_search_backends_removed(self, ids: List[ObjectId]):
+        for backend in search_backends.values():
+            backend.on_documents_removed(self.db_name, ids)
+        try:
+            lexical_index_registry.remove_documents(self.db_name, ids)
+        except Exception as e:
+            self.logger.error(f"Failed to remove documents from lexical index for {self.db_name}: {e}")
+
+    @staticmethod
+    def _to_document(embedded_document: EmbeddedDocumentCreate, lexical_terms: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Serialize for Mongo, packing embeddings according to EMBEDDING_STORAGE_MODE and adding term frequencies for BM25"""
+        document = embedded_document.model_dump(exclude_unset=True)
+        if embedded_document.embeddings is not None:
+            document.update(encode_embedding(embedded_document.embeddings))
+        document.update(lexical_terms if lexical_terms is not None else encode_lexical_terms(embedded_document.content))
+        return document
+
+    @staticmethod
+    def _chunk_number(batch: List[EmbeddedDocumentCreate], index: int, start: int) -> int:
+        chunk_number = batch[index].chunk_number
+        return chunk_number if chunk_number is not None else start + index
+
+    async def search_embedded_documents(self, query_embedding: List[float], query: SearchQuery):
+        try:
+            backend = await select_search_backend(self.db_name)
+            self.logger.info(f"Searching embedded documents with {backend.name} backend")
+            return await backend.search(self.db_name, query_embedding, query)
+        except Exception as e:
+            self.logger.error(f"Failed to search embedded documents: {e}")
+            raise e
+
+    async def search_candidate_documents(self, query_embedding: List[float], query: SearchQuery) -> List[Dict[str, Any]]:
+        """Raw top query.limit documents with score, stored embedding, title and chunk_number, for re-ranking"""
+        try:
+            backend = await select_search_backend(self.db_name)
+            self.logger.info(f"Searching {query.limit} candidate documents with {backend.name} backend")
+            return await backend.search_documents(self.db_name, query_embedding, query, candidate_projection(query))
+        except Exception as e:
+            self.logger.error(f"Failed to search candidate documents: {e}")
+            raise e
+
+    async def iter_search_embedded_documents(self, query_embedding: List[float], query: SearchQuery) -> AsyncIterator[SearchResult]:
+        """Like search_embedded_documents, but yields each result as soon as it is read"""
+        try:
+            backend = await select_search_backend(self.db_name)
+            self.logger.info(f"Streaming embedded documents with {backend.name} backend")
+            async for result in backend.iter_search(self.db_name, query_embedding, query):
+                yield result
         except Exception as e:
             self.logger.error(f"Failed to search embedded documents: {e}")
             raise e
+
+    async def lexical_search_embedded_documents(self, query: SearchQuery) -> List[SearchResult]:
+        """BM25 search over chunk content, scores being raw BM25 scores"""
+        try:
+            index = await lexical_index_registry.get(self.db_name, EMBEDDED_DOCUMENT_COLLECTION)
+            org_id = query.metadata.org_id if query.metadata else None
+            hits = index.search(query.query, query.limit, category=query.category, org_id=org_id)
+            return await fetch_hits(self.db_name, hits, query)
+        except Exception as e:
+            self.logger.error(f"Failed to search embedded documents lexically: {e}")
+            raise e
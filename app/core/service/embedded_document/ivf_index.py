@@ -0,0 +1,592 @@
+import asyncio
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from cachetools import LRUCache
+
+from app.core.config.executors import executor_manager
+from app.core.config.mongodb import mongo_client
+from app.core.service.embedded_document.local_vector_index import INDEX_PROJECTION, LOCAL_INDEX_LOAD_BATCH_SIZE, NO_VALUE, FilterCodes
+from app.core.utils.vector_codec import EMBEDDING_FIELD, decode_embedding
+from app.utils.logger import logger
+
+IVF_INDEX_DIR = os.getenv("IVF_INDEX_DIR") or os.path.join(tempfile.gettempdir(), "rag_ivf_index")
+IVF_INDEX_MAX_TENANTS = int(os.getenv("IVF_INDEX_MAX_TENANTS") or 8)
+# Inverted lists scanned per query; the IVF counterpart of $vectorSearch numCandidates
+IVF_NUM_PROBES = int(os.getenv("IVF_NUM_PROBES") or 16)
+IVF_KMEANS_ITERATIONS = int(os.getenv("IVF_KMEANS_ITERATIONS") or 20)
+IVF_TRAIN_POINTS_PER_LIST = 256
+# Inserts go to an unsorted delta segment that is merged into the base once it exceeds this share of it
+IVF_COMPACT_RATIO = float(os.getenv("IVF_COMPACT_RATIO") or 0.1)
+# Centroids are retrained on compaction once the index has grown this much since training
+IVF_RETRAIN_GROWTH = 4.0
+IVF_SAVE_DELAY_SECONDS = float(os.getenv("IVF_SAVE_DELAY_SECONDS") or 5)
+
+STATE_FILE = "state.npz"
+LOCK_FILE = ".lock"
+# Names this process's base directories, so it only ever removes its own; unique even across containers sharing a pid
+BASE_DIR_PREFIX = f"base-{os.getpid()}-{uuid.uuid4().hex[:8]}-"
+ID_BYTES = 12
+# One 12-byte ObjectId per element, so id rows can be matched with np.isin
+ID_KEY_DTYPE = np.dtype((np.void, ID_BYTES))
+
+
+@contextmanager
+def directory_lock(directory: str, operation: int):
+    """flock a tenant directory, shared by every process using IVF_INDEX_DIR"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), "a") as lock_file:
+        fcntl.flock(lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ids_to_array(ids: List[ObjectId]) -> np.ndarray:
+    return np.frombuffer(b"".join(oid.binary for oid in ids), dtype=np.uint8).reshape(-1, ID_BYTES)
+
+
+def id_keys(ids: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(ids).view(ID_KEY_DTYPE).ravel()
+
+
+def default_num_lists(size: int) -> int:
+    return int(np.clip(round(4 * np.sqrt(size)), 1, 65536))
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms == 0, 1, norms)).astype(np.float32, copy=False)
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+    """Nearest centroid (by cosine) of every row, computed in batches to bound memory"""
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch_size):
+        lists[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+    return lists
+
+
+def train_centroids(vectors: np.ndarray, num_lists: int, iterations: int = IVF_KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of at most IVF_TRAIN_POINTS_PER_LIST points per list"""
+    rng = np.random.default_rng(seed)
+    num_lists = min(num_lists, len(vectors))
+    sample_size = min(len(vectors), num_lists * IVF_TRAIN_POINTS_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, num_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        lists = assign_lists(sample, centroids)
+        order = np.argsort(lists, kind="stable")
+        sorted_lists = lists[order]
+        starts = np.flatnonzero(np.r_[True, sorted_lists[1:] != sorted_lists[:-1]])
+        sums = np.add.reduceat(sample[order], starts, axis=0)
+        updated = centroids.copy()
+        updated[sorted_lists[starts]] = sums
+        # Lists that lost all their points restart from random sample points
+        empty = np.setdiff1d(np.arange(num_lists), sorted_lists[starts])
+        if empty.size:
+            updated[empty] = sample[rng.choice(sample_size, empty.size, replace=False)]
+        centroids = normalize_rows(updated)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate cosine index over one tenant's embedded documents.
+
+    The base segment keeps L2-normalized vectors sorted by their nearest k-means centroid, so each
+    inverted list is a contiguous slice that can be memory-mapped from disk. A query scores the
+    centroids, then only the rows of the num_probes closest lists. Inserts are assigned to a list
+    and appended to an in-memory delta segment until the next compaction; deletes are tombstoned
+    until then.
+    """
+
+    def __init__(self, centroids: np.ndarray, vectors: np.ndarray, offsets: np.ndarray, category_codes: np.ndarray,
+                 org_codes: np.ndarray, ids: np.ndarray, categories: FilterCodes, org_ids: FilterCodes, trained_size: int):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.offsets = offsets
+        self.category_codes = category_codes
+        self.org_codes = org_codes
+        self.ids = ids
+        self.categories = categories
+        self.org_ids = org_ids
+        self.trained_size = trained_size
+        self.base_dir: Optional[str] = None
+        self.deleted = np.zeros(len(ids), dtype=bool)
+        self.deleted_count = 0
+        # Ids removed while a compaction is running, replayed on the compacted index
+        self.removal_log: Optional[List[ObjectId]] = None
+
+        dimensions = centroids.shape[1]
+        self.delta_size = 0
+        self.delta_vectors = np.empty((0, dimensions), dtype=np.float32)
+        self.delta_lists = np.empty(0, dtype=np.int32)
+        self.delta_category_codes = np.empty(0, dtype=np.int32)
+        self.delta_org_codes = np.empty(0, dtype=np.int32)
+        self.delta_deleted = np.empty(0, dtype=bool)
+        self.delta_ids: List[ObjectId] = []
+
+    def __len__(self) -> int:
+        return len(self.vectors) + self.delta_size - self.deleted_count
+
+    @property
+    def num_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, category_codes: np.ndarray, org_codes: np.ndarray, ids: np.ndarray,
+              categories: FilterCodes, org_ids: FilterCodes, num_lists: Optional[int] = None) -> "IVFIndex":
+        """Train centroids on normalized vectors and lay the rows out list by list; ids is an (n, 12) uint8 array"""
+        num_lists = num_lists or default_num_lists(len(vectors))
+        centroids = train_centroids(vectors, num_lists)
+        lists = assign_lists(vectors, centroids)
+        order = np.argsort(lists, kind="stable")
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(lists, minlength=len(centroids)))
+        return cls(centroids, np.ascontiguousarray(vectors[order]), offsets, category_codes[order], org_codes[order], ids[order],
+                   categories, org_ids, trained_size=len(vectors))
+
+    @staticmethod
+    def read_documents(documents: List[Mapping[str, Any]], categories: FilterCodes, org_ids: FilterCodes) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[ObjectId]]:
+        """Normalized vectors, filter codes and ids of stored documents"""
+        vectors = normalize_rows(np.stack([decode_embedding(document) for document in documents]))
+        category_codes = np.array([categories.encode(document.get("category")) for document in documents], dtype=np.int32)
+        org_codes = np.array([org_ids.encode((document.get("metadata") or {}).get("org_id")) for document in documents], dtype=np.int32)
+        return vectors, category_codes, org_codes, [document["_id"] for document in documents]
+
+    def _reserve_delta(self, extra: int):
+        needed = self.delta_size + extra
+        if needed <= len(self.delta_vectors):
+            return
+        capacity = max(needed, 2 * len(self.delta_vectors), 1024)
+        for name, fill in (("delta_vectors", None), ("delta_lists", 0), ("delta_category_codes", NO_VALUE), ("delta_org_codes", NO_VALUE), ("delta_deleted", False)):
+            current = getattr(self, name)
+            grown = np.empty((capacity,) + current.shape[1:], dtype=current.dtype)
+            if fill is not None:
+                grown.fill(fill)
+            grown[:self.delta_size] = current[:self.delta_size]
+            setattr(self, name, grown)
+
+    def add_documents(self, documents: List[Mapping[str, Any]]):
+        """Assign newly stored documents (with _id and embeddings) to their nearest list"""
+        documents = [document for document in documents if document.get("_id") is not None]
+        if not documents:
+            return
+        vectors, category_codes, org_codes, ids = self.read_documents(documents, self.categories, self.org_ids)
+        if vectors.shape[1] != self.centroids.shape[1]:
+            raise ValueError(f"Embedding has {vectors.shape[1]} dimensions, index has {self.centroids.shape[1]}")
+
+        self._reserve_delta(len(documents))
+        end = self.delta_size + len(documents)
+        self.delta_vectors[self.delta_size:end] = vectors
+        self.delta_lists[self.delta_size:end] = assign_lists(vectors, self.centroids)
+        self.delta_category_codes[self.delta_size:end] = category_codes
+        self.delta_org_codes[self.delta_size:end] = org_codes
+        self.delta_ids.extend(ids)
+        self.delta_size = end
+
+    def remove_documents(self, ids: Iterable[ObjectId]):
+        """Tombstone documents; compaction drops their rows"""
+        ids = list(ids)
+        if not ids:
+            return
+        if self.removal_log is not None:
+            self.removal_log.extend(ids)
+        if len(self.ids):
+            rows = np.flatnonzero(np.isin(id_keys(self.ids), id_keys(ids_to_array(ids))) & ~self.deleted)
+            self.deleted[rows] = True
+            self.deleted_count += len(rows)
+        removed = set(ids)
+        for row, oid in enumerate(self.delta_ids[:self.delta_size]):
+            if oid in removed and not self.delta_deleted[row]:
+                self.delta_deleted[row] = True
+                self.deleted_count += 1
+
+    def max_id(self) -> Optional[ObjectId]:
+        """Newest indexed _id; ObjectIds compare as 12 big-endian bytes, split here into 8 + 4 for lexsort"""
+        candidates = list(self.delta_ids[:self.delta_size])
+        if len(self.ids):
+            ids = np.ascontiguousarray(self.ids)
+            high = ids[:, :8].copy().view(">u8").ravel()
+            low = ids[:, 8:].copy().view(">u4").ravel()
+            candidates.append(ObjectId(ids[np.lexsort((low, high))[-1]].tobytes()))
+        return max(candidates) if candidates else None
+
+    def _filter_mask(self, category_codes: np.ndarray, org_codes: np.ndarray, deleted: np.ndarray, category_code: Optional[int], org_code: Optional[int]) -> Optional[np.ndarray]:
+        mask = ~deleted if self.deleted_count else None
+        for codes, code in ((category_codes, category_code), (org_codes, org_code)):
+            if code is None:
+                continue
+            value_mask = codes == code
+            mask = value_mask if mask is None else mask & value_mask
+        return mask
+
+    def _score_lists(self, query: np.ndarray, probes: np.ndarray, category_code: Optional[int], org_code: Optional[int]) -> Tuple[np.ndarray, List[Any]]:
+        scores: List[np.ndarray] = []
+        keys: List[Any] = []
+        for probe in probes:
+            start, end = int(self.offsets[probe]), int(self.offsets[probe + 1])
+            if start == end:
+                continue
+            rows = np.arange(start, end)
+            mask = self._filter_mask(self.category_codes[start:end], self.org_codes[start:end], self.deleted[start:end], category_code, org_code)
+            if mask is not None:
+                rows = rows[mask]
+                list_scores = np.asarray(self.vectors[rows]) @ query
+            else:
+                list_scores = np.asarray(self.vectors[start:end]) @ query
+            scores.append(list_scores)
+            keys.append(rows)
+
+        if self.delta_size:
+            rows = np.flatnonzero(np.isin(self.delta_lists[:self.delta_size], probes))
+            mask = self._filter_mask(self.delta_category_codes[rows], self.delta_org_codes[rows], self.delta_deleted[rows], category_code, org_code)
+            if mask is not None:
+                rows = rows[mask]
+            scores.append(self.delta_vectors[rows] @ query)
+            # Delta rows are numbered after the base rows
+            keys.append(rows + len(self.vectors))
+
+        if not scores:
+            return np.empty(0, dtype=np.float32), []
+        return np.concatenate(scores), np.concatenate(keys)
+
+    def _row_id(self, row: int) -> ObjectId:
+        if row < len(self.vectors):
+            return ObjectId(self.ids[row].tobytes())
+        return self.delta_ids[row - len(self.vectors)]
+
+    def search(self, query_embedding: List[float], limit: int, category: Optional[str] = None, org_id: Optional[str] = None,
+               num_probes: int = IVF_NUM_PROBES) -> List[Tuple[ObjectId, float]]:
+        """
+        Return up to limit (id, score) pairs, score being Atlas' cosine vectorSearchScore (1 + cos) / 2.
+        When filters leave fewer than limit matches in the probed lists, the probe count is doubled until they do.
+        """
+        if not len(self):
+            return []
+        codes = []
+        for value, lookup in ((category, self.categories), (org_id, self.org_ids)):
+            code = lookup.lookup(value) if value is not None else None
+            if value is not None and code is None:
+                return []
+            codes.append(code)
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        centroid_order = np.argsort(-(self.centroids @ query))
+        num_probes = max(1, min(num_probes, self.num_lists))
+        while True:
+            scores, rows = self._score_lists(query, centroid_order[:num_probes], *codes)
+            if len(scores) >= limit or num_probes >= self.num_lists:
+                break
+            num_probes = min(2 * num_probes, self.num_lists)
+
+        if not len(scores):
+            return []
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._row_id(int(rows[position])), float((1.0 + scores[position]) / 2.0)) for position in top]
+
+    def needs_compaction(self) -> bool:
+        return self.delta_size + self.deleted_count > IVF_COMPACT_RATIO * max(len(self.vectors), 1)
+
+    def compacted(self, delta_size: int) -> "IVFIndex":
+        """
+        A new base holding the live base rows and first delta_size delta rows. Centroids are retrained
+        when the index has grown IVF_RETRAIN_GROWTH times since training, otherwise delta rows keep
+        their assigned lists. Runs off the event loop, so it only reads rows that already exist.
+        """
+        delta_ids = ids_to_array(self.delta_ids[:delta_size])
+        vectors = np.concatenate([np.asarray(self.vectors), self.delta_vectors[:delta_size]])
+        category_codes = np.concatenate([self.category_codes, self.delta_category_codes[:delta_size]])
+        org_codes = np.concatenate([self.org_codes, self.delta_org_codes[:delta_size]])
+        ids = np.concatenate([np.asarray(self.ids), delta_ids])
+        base_lists = np.repeat(np.arange(self.num_lists, dtype=np.int32), np.diff(self.offsets))
+        lists = np.concatenate([base_lists, self.delta_lists[:delta_size]])
+        live = ~np.concatenate([self.deleted, self.delta_deleted[:delta_size]])
+        vectors, category_codes, org_codes, ids, lists = vectors[live], category_codes[live], org_codes[live], ids[live], lists[live]
+
+        if len(vectors) >= IVF_RETRAIN_GROWTH * self.trained_size:
+            return IVFIndex.build(vectors, category_codes, org_codes, ids, self.categories, self.org_ids)
+
+        order = np.argsort(lists, kind="stable")
+        offsets = np.zeros(self.num_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(lists, minlength=self.num_lists))
+        return IVFIndex(self.centroids, vectors[order], offsets, category_codes[order], org_codes[order], ids[order],
+                        self.categories, self.org_ids, self.trained_size)
+
+    def take_delta(self, other: "IVFIndex", start: int):
+        """Carry over delta rows other received from position start on, e.g. while this index was being compacted"""
+        end = other.delta_size
+        if end <= start:
+            return
+        count = end - start
+        self._reserve_delta(count)
+        vectors = other.delta_vectors[start:end]
+        self.delta_vectors[self.delta_size:self.delta_size + count] = vectors
+        self.delta_lists[self.delta_size:self.delta_size + count] = assign_lists(vectors, self.centroids)
+        self.delta_category_codes[self.delta_size:self.delta_size + count] = other.delta_category_codes[start:end]
+        self.delta_org_codes[self.delta_size:self.delta_size + count] = other.delta_org_codes[start:end]
+        self.delta_deleted[self.delta_size:self.delta_size + count] = other.delta_deleted[start:end]
+        self.deleted_count += int(other.delta_deleted[start:end].sum())
+        self.delta_ids.extend(other.delta_ids[start:end])
+        self.delta_size += count
+
+    def save_base(self, directory: str) -> str:
+        """Write the immutable base segment to a new directory under directory and return its name"""
+        os.makedirs(directory, exist_ok=True)
+        name = f"{BASE_DIR_PREFIX}{time.time_ns()}"
+        path = os.path.join(directory, name)
+        os.makedirs(path)
+        for field in ("centroids", "vectors", "offsets", "category_codes", "org_codes", "ids"):
+            np.save(os.path.join(path, f"{field}.npy"), np.asarray(getattr(self, field)))
+        self.base_dir = name
+        return name
+
+    def state(self) -> Dict[str, Any]:
+        """Snapshot of the mutable state (delta segment, filter codes), taken on the event loop"""
+        size = self.delta_size
+        return {
+            "base_dir": np.array(self.base_dir),
+            "trained_size": np.array(self.trained_size),
+            "codes": np.array(json.dumps({"categories": self.categories.codes, "org_ids": self.org_ids.codes})),
+            "delta_vectors": self.delta_vectors[:size].copy(),
+            "delta_lists": self.delta_lists[:size].copy(),
+            "delta_category_codes": self.delta_category_codes[:size].copy(),
+            "delta_org_codes": self.delta_org_codes[:size].copy(),
+            "delta_ids": ids_to_array(self.delta_ids[:size]),
+            "deleted": self.deleted.copy(),
+            "delta_deleted": self.delta_deleted[:size].copy(),
+        }
+
+    def save_state(self, directory: str, state: Dict[str, Any]):
+        """
+        Atomically replace the state file, then drop the base directories of this process it no longer
+        references. Other processes' bases are never removed: they may still be about to publish them.
+        """
+        with directory_lock(directory, fcntl.LOCK_EX):
+            if not os.path.isdir(os.path.join(directory, str(state["base_dir"]))):
+                # Loaded from another process, which has since compacted and removed it; the base is
+                # immutable and still memory-mapped here, so publish a copy of our own instead
+                state["base_dir"] = np.array(self.save_base(directory))
+            path = os.path.join(directory, STATE_FILE)
+            temporary_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(temporary_path, **state)
+            os.replace(temporary_path, path)
+            for name in os.listdir(directory):
+                if name.startswith(BASE_DIR_PREFIX) and name != str(state["base_dir"]):
+                    shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["IVFIndex"]:
+        """Open a saved index, memory-mapping the base vectors; None if nothing was saved"""
+        path = os.path.join(directory, STATE_FILE)
+        if not os.path.exists(path):
+            return None
+        # Shared lock: the base cannot be removed between reading the state and mapping its files
+        with directory_lock(directory, fcntl.LOCK_SH):
+            with np.load(path) as state:
+                state = {key: state[key] for key in state.files}
+            base_path = os.path.join(directory, str(state["base_dir"]))
+            base = {field: np.load(os.path.join(base_path, f"{field}.npy"), mmap_mode="r" if field == "vectors" else None)
+                    for field in ("centroids", "vectors", "offsets", "category_codes", "org_codes", "ids")}
+        codes = json.loads(str(state["codes"]))
+        categories, org_ids = FilterCodes(), FilterCodes()
+        categories.codes, org_ids.codes = codes["categories"], codes["org_ids"]
+
+        index = cls(categories=categories, org_ids=org_ids, trained_size=int(state["trained_size"]), **base)
+        index.base_dir = str(state["base_dir"])
+        index.delta_size = len(state["delta_lists"])
+        index.delta_vectors = state["delta_vectors"]
+        index.delta_lists = state["delta_lists"]
+        index.delta_category_codes = state["delta_category_codes"]
+        index.delta_org_codes = state["delta_org_codes"]
+        index.delta_ids = [ObjectId(row.tobytes()) for row in state["delta_ids"]]
+        # State files written before deletes were supported have no tombstones
+        if "deleted" in state:
+            index.deleted = state["deleted"]
+            index.delta_deleted = state["delta_deleted"]
+        else:
+            index.delta_deleted = np.zeros(index.delta_size, dtype=bool)
+        index.deleted_count = int(index.deleted.sum() + index.delta_deleted.sum())
+        return index
+
+
+class IVFIndexRegistry:
+    """
+    Per-tenant IVF indexes persisted under IVF_INDEX_DIR/<db_name>. A missing index is built in the
+    background from Mongo (callers fall back to another backend until it is ready); a saved one is
+    memory-mapped and caught up with documents inserted after its newest _id. Inserts and deletes
+    are saved after IVF_SAVE_DELAY_SECONDS, compacting the delta segment and tombstones into a new
+    base when they grow large. Deletes made by other processes are not seen, but their hits are
+    dropped when the documents are fetched from Mongo. Processes sharing IVF_INDEX_DIR serialize
+    state writes and loads with a file lock, and each removes only the base directories it wrote.
+    """
+
+    def __init__(self, directory: str, max_tenants: int):
+        self.logger = logger
+        self.mongo_client = mongo_client
+        self.directory = directory
+        self.indexes: LRUCache = LRUCache(maxsize=max_tenants)
+        self.opening: Dict[str, asyncio.Task] = {}
+        self.saving: Dict[str, asyncio.Task] = {}
+        # Documents stored and ids deleted while a tenant's index is opening, applied once it is ready
+        self.pending: Dict[str, List[Mapping[str, Any]]] = {}
+        self.pending_removals: Dict[str, List[ObjectId]] = {}
+
+    def _tenant_dir(self, db_name: str) -> str:
+        return os.path.join(self.directory, db_name)
+
+    def get_if_ready(self, db_name: str, collection_name: str) -> Optional[IVFIndex]:
+        """The tenant's index if it is open, otherwise start opening it in the background and return None"""
+        index = self.indexes.get(db_name)
+        if index is None and db_name not in self.opening:
+            self.opening[db_name] = asyncio.create_task(self._open(db_name, collection_name))
+        return index
+
+    async def get(self, db_name: str, collection_name: str) -> IVFIndex:
+        index = self.get_if_ready(db_name, collection_name)
+        if index is not None:
+            return index
+        return await asyncio.shield(self.opening[db_name])
+
+    def loaded_size(self, db_name: str) -> Optional[int]:
+        index = self.indexes.get(db_name)
+        return len(index) if index is not None else None
+
+    async def _open(self, db_name: str, collection_name: str) -> IVFIndex:
+        started_at = time.monotonic()
+        self.pending[db_name] = []
+        self.pending_removals[db_name] = []
+        try:
+            collection = self.mongo_client[db_name][collection_name]
+            index = await executor_manager.run_io(IVFIndex.load, self._tenant_dir(db_name))
+            if index is None:
+                index = await self._build(db_name, collection)
+            else:
+                await self._catch_up(index, collection)
+            index.add_documents(self._unindexed(index, self.pending[db_name]))
+            index.remove_documents(self.pending_removals[db_name])
+            self.indexes[db_name] = index
+            self.logger.info(f"Opened IVF index for {db_name} with {len(index)} documents in {index.num_lists} lists in {time.monotonic() - started_at:.2f}s")
+            self._schedule_save(db_name)
+            return index
+        except Exception as e:
+            self.logger.error(f"Failed to open IVF index for {db_name}: {e}")
+            raise
+        finally:
+            self.pending.pop(db_name, None)
+            self.pending_removals.pop(db_name, None)
+            self.opening.pop(db_name, None)
+
+    async def _build(self, db_name: str, collection) -> IVFIndex:
+        categories, org_ids = FilterCodes(), FilterCodes()
+        parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray, List[ObjectId]]] = []
+        batch: List[Mapping[str, Any]] = []
+        async for document in collection.find({EMBEDDING_FIELD: {"$exists": True}}, INDEX_PROJECTION).batch_size(LOCAL_INDEX_LOAD_BATCH_SIZE):
+            batch.append(document)
+            if len(batch) >= LOCAL_INDEX_LOAD_BATCH_SIZE:
+                parts.append(IVFIndex.read_documents(batch, categories, org_ids))
+                batch = []
+        if batch:
+            parts.append(IVFIndex.read_documents(batch, categories, org_ids))
+        if not parts:
+            raise ValueError(f"No embedded documents to build an IVF index for {db_name}")
+
+        vectors = np.concatenate([part[0] for part in parts])
+        category_codes = np.concatenate([part[1] for part in parts])
+        org_codes = np.concatenate([part[2] for part in parts])
+        ids = ids_to_array([oid for part in parts for oid in part[3]])
+        # k-means is NumPy matrix work that releases the GIL, so a thread keeps the event loop responsive
+        index = await executor_manager.run_io(IVFIndex.build, vectors, category_codes, org_codes, ids, categories, org_ids)
+        await executor_manager.run_io(index.save_base, self._tenant_dir(db_name))
+        return index
+
+    async def _catch_up(self, index: IVFIndex, collection):
+        max_id = index.max_id()
+        query = {EMBEDDING_FIELD: {"$exists": True}}
+        if max_id is not None:
+            query["_id"] = {"$gt": max_id}
+        batch: List[Mapping[str, Any]] = []
+        async for document in collection.find(query, INDEX_PROJECTION).batch_size(LOCAL_INDEX_LOAD_BATCH_SIZE):
+            batch.append(document)
+            if len(batch) >= LOCAL_INDEX_LOAD_BATCH_SIZE:
+                index.add_documents(batch)
+                batch = []
+        index.add_documents(batch)
+
+    def _unindexed(self, index: IVFIndex, documents: List[Mapping[str, Any]]) -> List[Mapping[str, Any]]:
+        # Documents stored during the open may also have been read from Mongo; only these few are checked
+        if not documents:
+            return []
+        indexed = {row.tobytes() for row in np.asarray(index.ids)}
+        indexed.update(oid.binary for oid in index.delta_ids[:index.delta_size])
+        return [document for document in documents if document.get("_id") is not None and document["_id"].binary not in indexed]
+
+    def add_documents(self, db_name: str, documents: List[Mapping[str, Any]]):
+        """Incrementally index newly stored documents of a tenant whose index is open or opening"""
+        if db_name in self.pending:
+            self.pending[db_name].extend(documents)
+        index = self.indexes.get(db_name)
+        if index is not None:
+            index.add_documents(documents)
+            self._schedule_save(db_name)
+
+    def remove_documents(self, db_name: str, ids: List[ObjectId]):
+        """Tombstone deleted documents of a tenant whose index is open or opening"""
+        if db_name in self.pending_removals:
+            self.pending_removals[db_name].extend(ids)
+        index = self.indexes.get(db_name)
+        if index is not None:
+            index.remove_documents(ids)
+            self._schedule_save(db_name)
+
+    def _schedule_save(self, db_name: str):
+        if db_name not in self.saving:
+            self.saving[db_name] = asyncio.create_task(self._save(db_name))
+
+    async def _save(self, db_name: str):
+        try:
+            await asyncio.sleep(IVF_SAVE_DELAY_SECONDS)
+            index = self.indexes.get(db_name)
+            if index is None:
+                return
+            directory = self._tenant_dir(db_name)
+            if index.needs_compaction():
+                delta_size = index.delta_size
+                index.removal_log = []
+                try:
+                    compacted = await executor_manager.run_io(index.compacted, delta_size)
+                    await executor_manager.run_io(compacted.save_base, directory)
+                    compacted.take_delta(index, delta_size)
+                    compacted.remove_documents(index.removal_log)
+                finally:
+                    index.removal_log = None
+                if self.indexes.get(db_name) is index:
+                    self.indexes[db_name] = compacted
+                index = compacted
+                self.logger.info(f"Compacted IVF index for {db_name} to {len(index.vectors)} base documents")
+            await executor_manager.run_io(index.save_state, directory, index.state())
+        except Exception as e:
+            self.logger.error(f"Failed to save IVF index for {db_name}: {e}")
+        finally:
+            self.saving.pop(db_name, None)
+
+
+# Singleton instance for app use
+ivf_index_registry = IVFIndexRegistry(IVF_INDEX_DIR, IVF_INDEX_MAX_TENANTS)
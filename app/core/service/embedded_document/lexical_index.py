@@ -0,0 +1,262 @@
+import asyncio
+import math
+import os
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from app.core.config.executors import executor_manager
+from app.core.service.embedded_document.local_vector_index import FilterCodes, LocalVectorIndexRegistry
+from app.core.utils.tokenizer import term_frequencies, term_hash, tokenize
+
+LEXICAL_INDEX_MAX_TENANTS = int(os.getenv("LEXICAL_INDEX_MAX_TENANTS") or 16)
+LEXICAL_INDEX_REFRESH_SECONDS = int(os.getenv("LEXICAL_INDEX_REFRESH_SECONDS") or 300)
+BM25_K1 = float(os.getenv("BM25_K1") or 1.2)
+BM25_B = float(os.getenv("BM25_B") or 0.75)
+BM25_DELTA_MAX_POSTINGS = int(os.getenv("BM25_DELTA_MAX_POSTINGS") or 1000000)
+
+# Per-chunk term hashes and frequencies written at ingest time, so loading a tenant's index needs no tokenizing
+LEXICAL_TERMS_FIELD = "lexical_terms"
+LEXICAL_COUNTS_FIELD = "lexical_counts"
+LEXICAL_PROJECTION = {LEXICAL_TERMS_FIELD: 1, LEXICAL_COUNTS_FIELD: 1, "content": 1, "category": 1, "metadata.org_id": 1}
+
+
+def encode_lexical_terms(content: str) -> Dict[str, Any]:
+    """Return the document fields that store the term frequencies of content, terms as 64-bit hashes"""
+    frequencies = term_frequencies(content)
+    return {LEXICAL_TERMS_FIELD: [term_hash(term) for term in frequencies], LEXICAL_COUNTS_FIELD: list(frequencies.values())}
+
+
+def encode_lexical_terms_batch(contents: List[str]) -> List[Dict[str, Any]]:
+    """encode_lexical_terms of each content, one call for a whole write batch on the process pool"""
+    return [encode_lexical_terms(content) for content in contents]
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over one tenant's chunk contents.
+
+    Postings live in a CSR layout: sorted unique term hashes, with per-term slices of row and
+    frequency arrays, built in one sort. Documents added afterwards go to a flat delta segment that
+    queries scan, and are merged into the CSR layout in the background once the delta holds more
+    than BM25_DELTA_MAX_POSTINGS postings. Removed documents are tombstoned until the next reload.
+    """
+
+    def __init__(self):
+        self.ids: List[ObjectId] = []
+        self.id_set = set()
+        self.rows: Dict[ObjectId, int] = {}
+        self.deleted_rows: List[int] = []
+        self.lengths: List[int] = []
+        self.category_codes: List[int] = []
+        self.org_codes: List[int] = []
+        self.categories = FilterCodes()
+        self.org_ids = FilterCodes()
+        self.total_length = 0
+        # (sorted term hashes, offsets, rows, frequencies), replaced as a whole on compaction
+        self.postings = (np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+        self.delta_chunks: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self.delta: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self.columns: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.ids) - len(self.deleted_rows)
+
+    def add_documents(self, documents: List[Mapping[str, Any]]):
+        """Add stored documents (with _id and content or lexical terms); documents already indexed are skipped"""
+        terms: List[int] = []
+        counts: List[int] = []
+        rows: List[int] = []
+        for document in documents:
+            document_id = document.get("_id")
+            if document_id is None or document_id in self.id_set:
+                continue
+            document_terms, document_counts = document.get(LEXICAL_TERMS_FIELD), document.get(LEXICAL_COUNTS_FIELD)
+            if document_terms is None or document_counts is None:
+                # Chunks stored before term statistics were written at ingest time
+                frequencies = term_frequencies(document.get("content") or "")
+                document_terms, document_counts = [term_hash(term) for term in frequencies], list(frequencies.values())
+
+            terms.extend(document_terms)
+            counts.extend(document_counts)
+            rows.append(len(document_terms))
+            length = sum(document_counts)
+            self.rows[document_id] = len(self.ids)
+            self.ids.append(document_id)
+            self.id_set.add(document_id)
+            self.lengths.append(length)
+            self.total_length += length
+            self.category_codes.append(self.categories.encode(document.get("category")))
+            self.org_codes.append(self.org_ids.encode((document.get("metadata") or {}).get("org_id")))
+        if rows:
+            first_row = len(self.ids) - len(rows)
+            self.delta_chunks.append((
+                np.array(terms, dtype=np.int64),
+                np.repeat(np.arange(first_row, len(self.ids), dtype=np.int32), rows),
+                np.array(counts, dtype=np.float32),
+            ))
+            self.delta = None
+            self.columns = None
+
+    def remove_documents(self, ids: Iterable[ObjectId]):
+        """Tombstone documents: their postings stay, but searches skip them and they leave the length statistics"""
+        for document_id in ids:
+            row = self.rows.pop(document_id, None)
+            if row is None:
+                continue
+            self.deleted_rows.append(row)
+            self.total_length -= self.lengths[row]
+            self.columns = None
+
+    def _delta(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self.delta is None:
+            if self.delta_chunks:
+                self.delta = tuple(np.concatenate(parts) for parts in zip(*self.delta_chunks))
+            else:
+                self.delta = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+        return self.delta
+
+    def needs_compaction(self) -> bool:
+        return len(self._delta()[0]) > BM25_DELTA_MAX_POSTINGS
+
+    def merged_postings(self, chunk_count: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        CSR postings of the base plus the first chunk_count delta chunks. Only reads arrays that are
+        never modified in place, so it can run off the event loop while documents are being added.
+        """
+        terms, offsets, rows, frequencies = self.postings
+        chunks = self.delta_chunks[:chunk_count]
+        if not chunks:
+            return self.postings
+        delta_terms, delta_rows, delta_frequencies = (np.concatenate(parts) for parts in zip(*chunks))
+        all_terms = np.concatenate([np.repeat(terms, np.diff(offsets)), delta_terms])
+        order = np.argsort(all_terms, kind="stable")
+        merged_terms, counts = np.unique(all_terms[order], return_counts=True)
+        merged_offsets = np.zeros(len(merged_terms) + 1, dtype=np.int64)
+        merged_offsets[1:] = np.cumsum(counts)
+        return merged_terms, merged_offsets, np.concatenate([rows, delta_rows])[order], np.concatenate([frequencies, delta_frequencies])[order]
+
+    def apply_postings(self, postings: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray], chunk_count: int):
+        """Swap in postings returned by merged_postings(chunk_count) and drop the delta chunks they include"""
+        self.postings = postings
+        self.delta_chunks = self.delta_chunks[chunk_count:]
+        self.delta = None
+
+    def compact(self):
+        """Merge the whole delta segment into the CSR postings"""
+        chunk_count = len(self.delta_chunks)
+        self.apply_postings(self.merged_postings(chunk_count), chunk_count)
+
+    def _columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        if self.columns is None:
+            live = np.ones(len(self.ids), dtype=bool)
+            live[self.deleted_rows] = False
+            self.columns = (
+                np.array(self.lengths, dtype=np.float32),
+                np.array(self.category_codes, dtype=np.int32),
+                np.array(self.org_codes, dtype=np.int32),
+                live,
+            )
+        return self.columns
+
+    def _posting(self, term: int, delta_terms: np.ndarray, delta_rows: np.ndarray, delta_frequencies: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        terms, offsets, base_rows, base_frequencies = self.postings
+        rows, frequencies = np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        position = int(np.searchsorted(terms, term))
+        if position < len(terms) and terms[position] == term:
+            start, end = offsets[position], offsets[position + 1]
+            rows, frequencies = base_rows[start:end], base_frequencies[start:end]
+        if len(delta_terms):
+            in_delta = delta_terms == term
+            if in_delta.any():
+                rows = np.concatenate([rows, delta_rows[in_delta]])
+                frequencies = np.concatenate([frequencies, delta_frequencies[in_delta]])
+        return rows, frequencies
+
+    def search(self, query_text: str, limit: int, category: Optional[str] = None, org_id: Optional[str] = None) -> List[Tuple[ObjectId, float]]:
+        """Return up to limit (id, BM25 score) pairs of documents sharing at least one term with query_text"""
+        if not len(self):
+            return []
+        lengths, category_codes, org_codes, live = self._columns()
+        # Corpus statistics count live rows only; postings still address every row, tombstoned or not
+        size = len(self)
+        average_length = self.total_length / size or 1.0
+        delta = self._delta()
+
+        # Dense accumulator: a posting holds each row at most once, so fancy-index += is exact
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query_text)):
+            rows, frequencies = self._posting(term_hash(term), *delta)
+            if not len(rows):
+                continue
+            document_frequency = int(live[rows].sum()) if self.deleted_rows else len(rows)
+            idf = math.log(1.0 + (size - document_frequency + 0.5) / (document_frequency + 0.5))
+            saturation = frequencies + BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[rows] / average_length)
+            scores[rows] += idf * frequencies * (BM25_K1 + 1.0) / saturation
+            matched = True
+        if not matched:
+            return []
+
+        candidates = np.flatnonzero(scores)
+        if self.deleted_rows:
+            candidates = candidates[live[candidates]]
+        scores = scores[candidates]
+        for codes, value, lookup in ((category_codes, category, self.categories), (org_codes, org_id, self.org_ids)):
+            if value is None:
+                continue
+            code = lookup.lookup(value)
+            if code is None:
+                return []
+            keep = codes[candidates] == code
+            candidates, scores = candidates[keep], scores[keep]
+        if not scores.size:
+            return []
+
+        k = min(limit, scores.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[candidates[position]], float(scores[position])) for position in top]
+
+
+class LexicalIndexRegistry(LocalVectorIndexRegistry):
+    """Per-tenant BM25 indexes, loaded, refreshed and evicted like the local vector indexes"""
+    index_name = "lexical"
+    projection = LEXICAL_PROJECTION
+
+    def create_index(self) -> BM25Index:
+        return BM25Index()
+
+    def __init__(self, max_tenants: int, refresh_seconds: int):
+        super().__init__(max_tenants, refresh_seconds)
+        self.compacting = set()
+
+    async def _load(self, db_name: str, collection_name: str) -> BM25Index:
+        index = await super()._load(db_name, collection_name)
+        await self._compact(db_name, index)
+        return index
+
+    def add_documents(self, db_name: str, documents: List[Mapping[str, Any]]):
+        super().add_documents(db_name, documents)
+        index = self.indexes.get(db_name)
+        if index is not None and index.needs_compaction() and db_name not in self.compacting:
+            asyncio.create_task(self._compact(db_name, index))
+
+    async def _compact(self, db_name: str, index: BM25Index):
+        # Sorting the postings takes seconds for large tenants; NumPy releases the GIL while it runs
+        self.compacting.add(db_name)
+        try:
+            chunk_count = len(index.delta_chunks)
+            postings = await executor_manager.run_io(index.merged_postings, chunk_count)
+            index.apply_postings(postings, chunk_count)
+        except Exception as e:
+            self.logger.error(f"Failed to compact lexical index for {db_name}: {e}")
+        finally:
+            self.compacting.discard(db_name)
+
+
+# Singleton instance for app use
+lexical_index_registry = LexicalIndexRegistry(LEXICAL_INDEX_MAX_TENANTS, LEXICAL_INDEX_REFRESH_SECONDS)
@@ -0,0 +1,239 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from cachetools import LRUCache
+
+from app.core.config.mongodb import mongo_client
+from app.core.utils.vector_codec import EMBEDDING_FIELD, EMBEDDING_OFFSET_FIELD, EMBEDDING_SCALE_FIELD, decode_embedding
+from app.utils.logger import logger
+
+LOCAL_INDEX_MAX_TENANTS = int(os.getenv("LOCAL_INDEX_MAX_TENANTS") or 64)
+LOCAL_INDEX_REFRESH_SECONDS = int(os.getenv("LOCAL_INDEX_REFRESH_SECONDS") or 300)
+LOCAL_INDEX_LOAD_BATCH_SIZE = 1000
+
+INDEX_PROJECTION = {EMBEDDING_FIELD: 1, EMBEDDING_SCALE_FIELD: 1, EMBEDDING_OFFSET_FIELD: 1, "category": 1, "metadata.org_id": 1}
+NO_VALUE = -1
+
+
+class FilterCodes:
+    """Maps filter values (category, org_id) to small ints so filters become vectorized comparisons"""
+
+    def __init__(self):
+        self.codes: Dict[Optional[str], int] = {}
+
+    def encode(self, value: Optional[str]) -> int:
+        if value is None:
+            return NO_VALUE
+        return self.codes.setdefault(value, len(self.codes))
+
+    def lookup(self, value: str) -> Optional[int]:
+        return self.codes.get(value)
+
+
+class LocalVectorIndex:
+    """
+    In-memory exact cosine index over one tenant's embedded documents.
+
+    Vectors are L2-normalized rows of a contiguous float32 matrix that grows by doubling, so
+    incremental inserts are amortized O(1) and a query is one matrix-vector product plus argpartition.
+    """
+
+    def __init__(self, dimensions: int = 0):
+        self.size = 0
+        self.vectors = np.empty((0, dimensions), dtype=np.float32)
+        self.category_codes = np.empty(0, dtype=np.int32)
+        self.org_codes = np.empty(0, dtype=np.int32)
+        self.ids: List[ObjectId] = []
+        self.id_set = set()
+        self.categories = FilterCodes()
+        self.org_ids = FilterCodes()
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _reserve(self, extra: int, dimensions: int):
+        needed = self.size + extra
+        if self.vectors.shape[1] != dimensions:
+            if self.size:
+                raise ValueError(f"Embedding has {dimensions} dimensions, index has {self.vectors.shape[1]}")
+            self.vectors = np.empty((0, dimensions), dtype=np.float32)
+        if needed <= self.vectors.shape[0]:
+            return
+        capacity = max(needed, 2 * self.vectors.shape[0], 1024)
+        vectors = np.empty((capacity, dimensions), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        category_codes = np.full(capacity, NO_VALUE, dtype=np.int32)
+        category_codes[:self.size] = self.category_codes[:self.size]
+        org_codes = np.full(capacity, NO_VALUE, dtype=np.int32)
+        org_codes[:self.size] = self.org_codes[:self.size]
+        self.vectors, self.category_codes, self.org_codes = vectors, category_codes, org_codes
+
+    def add_documents(self, documents: List[Mapping[str, Any]]):
+        """Add stored documents (with _id and embeddings); documents already indexed are skipped"""
+        documents = [document for document in documents if document.get("_id") is not None and document["_id"] not in self.id_set]
+        if not documents:
+            return
+        vectors = np.stack([decode_embedding(document) for document in documents])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+
+        self._reserve(len(documents), vectors.shape[1])
+        end = self.size + len(documents)
+        self.vectors[self.size:end] = vectors
+        self.category_codes[self.size:end] = [self.categories.encode(document.get("category")) for document in documents]
+        self.org_codes[self.size:end] = [self.org_ids.encode((document.get("metadata") or {}).get("org_id")) for document in documents]
+        for document in documents:
+            self.ids.append(document["_id"])
+            self.id_set.add(document["_id"])
+        self.size = end
+
+    def remove_documents(self, ids: Iterable[ObjectId]):
+        """Drop documents from the index, shifting the remaining rows down"""
+        removed = self.id_set.intersection(ids)
+        if not removed:
+            return
+        keep = np.array([oid not in removed for oid in self.ids], dtype=bool)
+        size = int(keep.sum())
+        self.vectors[:size] = self.vectors[:self.size][keep]
+        self.category_codes[:size] = self.category_codes[:self.size][keep]
+        self.org_codes[:size] = self.org_codes[:self.size][keep]
+        self.ids = [oid for oid in self.ids if oid not in removed]
+        self.id_set -= removed
+        self.size = size
+
+    def search(self, query_embedding: List[float], limit: int, category: Optional[str] = None, org_id: Optional[str] = None) -> List[Tuple[ObjectId, float]]:
+        """Return up to limit (id, score) pairs, score being Atlas' cosine vectorSearchScore (1 + cos) / 2"""
+        if not self.size:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        scores = self.vectors[:self.size] @ query
+        mask = None
+        for codes, value, lookup in ((self.category_codes, category, self.categories), (self.org_codes, org_id, self.org_ids)):
+            if value is None:
+                continue
+            code = lookup.lookup(value)
+            if code is None:
+                return []
+            value_mask = codes[:self.size] == code
+            mask = value_mask if mask is None else mask & value_mask
+        if mask is not None:
+            candidates = np.flatnonzero(mask)
+            scores = scores[candidates]
+        else:
+            candidates = None
+
+        if not scores.size:
+            return []
+        k = min(limit, scores.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = candidates[top] if candidates is not None else top
+        return [(self.ids[row], float((1.0 + score) / 2.0)) for row, score in zip(rows, scores[top])]
+
+
+class LocalVectorIndexRegistry:
+    """
+    Per-tenant LocalVectorIndex instances, loaded lazily from Mongo and kept for at most
+    LOCAL_INDEX_MAX_TENANTS tenants. Indexes older than LOCAL_INDEX_REFRESH_SECONDS are reloaded
+    in the background to pick up documents written by other processes; queries keep using the
+    current index meanwhile, so only a tenant's first query waits for a load.
+    """
+
+    index_name = "local vector"
+    projection = INDEX_PROJECTION
+
+    def __init__(self, max_tenants: int, refresh_seconds: int):
+        self.logger = logger
+        self.mongo_client = mongo_client
+        self.indexes: LRUCache = LRUCache(maxsize=max_tenants)
+        self.refresh_seconds = refresh_seconds
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.refreshing: Dict[str, asyncio.Task] = {}
+        # Documents stored and ids deleted while a tenant's index is loading, applied once the load completes
+        self.pending: Dict[str, List[Mapping[str, Any]]] = {}
+        self.pending_removals: Dict[str, List[ObjectId]] = {}
+
+    def create_index(self) -> LocalVectorIndex:
+        return LocalVectorIndex()
+
+    async def get(self, db_name: str, collection_name: str) -> LocalVectorIndex:
+        index = self.indexes.get(db_name)
+        if index is None:
+            return await self._reload(db_name, collection_name)
+        if time.monotonic() - index.loaded_at >= self.refresh_seconds and db_name not in self.refreshing:
+            task = asyncio.create_task(self._refresh(db_name, collection_name))
+            self.refreshing[db_name] = task
+            task.add_done_callback(lambda _: self.refreshing.pop(db_name, None))
+        return index
+
+    async def _refresh(self, db_name: str, collection_name: str):
+        try:
+            await self._reload(db_name, collection_name)
+        except Exception as e:
+            # The current index keeps serving; the next query past the refresh interval retries
+            self.logger.error(f"Failed to refresh {self.index_name} index for {db_name}: {e}")
+
+    async def _reload(self, db_name: str, collection_name: str) -> LocalVectorIndex:
+        lock = self.locks.setdefault(db_name, asyncio.Lock())
+        async with lock:
+            index = self.indexes.get(db_name)
+            if index is not None and time.monotonic() - index.loaded_at < self.refresh_seconds:
+                return index
+            self.pending[db_name] = []
+            self.pending_removals[db_name] = []
+            try:
+                index = await self._load(db_name, collection_name)
+                index.add_documents(self.pending[db_name])
+                index.remove_documents(self.pending_removals[db_name])
+            finally:
+                self.pending.pop(db_name, None)
+                self.pending_removals.pop(db_name, None)
+            self.indexes[db_name] = index
+            return index
+
+    async def _load(self, db_name: str, collection_name: str) -> LocalVectorIndex:
+        started_at = time.monotonic()
+        index = self.create_index()
+        collection = self.mongo_client[db_name][collection_name]
+        batch: List[Mapping[str, Any]] = []
+        async for document in collection.find({EMBEDDING_FIELD: {"$exists": True}}, self.projection).batch_size(LOCAL_INDEX_LOAD_BATCH_SIZE):
+            batch.append(document)
+            if len(batch) >= LOCAL_INDEX_LOAD_BATCH_SIZE:
+                index.add_documents(batch)
+                batch = []
+        index.add_documents(batch)
+        self.logger.info(f"Loaded {self.index_name} index for {db_name} with {len(index)} documents in {time.monotonic() - started_at:.2f}s")
+        return index
+
+    def loaded_size(self, db_name: str) -> Optional[int]:
+        index = self.indexes.get(db_name)
+        return len(index) if index is not None else None
+
+    def add_documents(self, db_name: str, documents: List[Mapping[str, Any]]):
+        """Incrementally index newly stored documents of a tenant whose index is loaded or loading"""
+        if db_name in self.pending:
+            self.pending[db_name].extend(documents)
+        index = self.indexes.get(db_name)
+        if index is not None:
+            index.add_documents(documents)
+
+    def remove_documents(self, db_name: str, ids: List[ObjectId]):
+        """Drop deleted documents from a tenant's index if it is loaded or loading"""
+        if db_name in self.pending_removals:
+            self.pending_removals[db_name].extend(ids)
+        index = self.indexes.get(db_name)
+        if index is not None:
+            index.remove_documents(ids)
+
+
+# Singleton instance for app use
+local_vector_index_registry = LocalVectorIndexRegistry(LOCAL_INDEX_MAX_TENANTS, LOCAL_INDEX_REFRESH_SECONDS)
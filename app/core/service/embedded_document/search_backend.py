@@ -0,0 +1,297 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from cachetools import TTLCache
+
+from app.core.config.mongodb import mongo_client
+from app.core.schema.embedded_document_schema import SearchHit, SearchQuery, SearchResult
+from app.core.service.embedded_document.ivf_index import IVF_NUM_PROBES, ivf_index_registry
+from app.core.service.embedded_document.local_vector_index import local_vector_index_registry
+from app.core.service.embedded_document.search_tuning import candidate_planner
+from app.core.utils.vector_codec import EMBEDDING_FIELD, EMBEDDING_OFFSET_FIELD, EMBEDDING_SCALE_FIELD, encode_query_vector
+from app.utils.logger import logger
+
+EMBEDDED_DOCUMENT_COLLECTION = "EmbeddedDocuments"
+EMBEDDED_DOCUMENT_INDEX_NAME = "VectorIndex"
+# Historical fixed numCandidates; candidate_planner now sizes it per query
+NUM_CANDIDATES = 150
+EMBEDDING_PATH = "embeddings"
+
+SEARCH_BACKEND_ATLAS = "atlas"
+SEARCH_BACKEND_LOCAL = "local"
+SEARCH_BACKEND_IVF = "ivf"
+SEARCH_BACKEND_AUTO = "auto"
+# local, ivf and auto are opt-in: they search per-process indexes that see other processes' writes
+# only after a refresh
+SEARCH_BACKEND = (os.getenv("SEARCH_BACKEND") or SEARCH_BACKEND_ATLAS).lower()
+# In auto mode, tenants with at most this many chunks are searched in process
+LOCAL_SEARCH_MAX_DOCUMENTS = int(os.getenv("LOCAL_SEARCH_MAX_DOCUMENTS") or 20000)
+# In auto mode, tenants with at least this many chunks are searched with the IVF index (0 disables)
+IVF_SEARCH_MIN_DOCUMENTS = int(os.getenv("IVF_SEARCH_MIN_DOCUMENTS") or 1000000)
+CORPUS_SIZE_CACHE_TTL = 300
+
+# Documents fetched per round trip when streaming results
+STREAM_BATCH_SIZE = int(os.getenv("SEARCH_STREAM_BATCH_SIZE") or 10)
+
+RESULT_PROJECTION = {"_id": 1, "title": 1, "content": 1, "category": 1, "metadata": 1, "chunk_number": 1}
+
+
+SEARCH_RESULT_FIELDS = ("title", "content", "category", "chunk_number", "metadata")
+
+
+def result_projection(query: Optional[SearchQuery] = None) -> Dict[str, Any]:
+    """$project of a query's results: its fields, with content cut to snippet_length by $substrCP inside Mongo"""
+    if query is None or not query.projected:
+        return RESULT_PROJECTION
+    fields = SEARCH_RESULT_FIELDS if query.fields is None else query.fields
+    projection: Dict[str, Any] = {"_id": 1, **{field: 1 for field in fields}}
+    if query.snippet_length and "content" in fields:
+        projection["content"] = {"$substrCP": ["$content", 0, query.snippet_length]}
+    return projection
+
+
+def candidate_projection(query: SearchQuery) -> Dict[str, Any]:
+    """result_projection plus the stored embedding, title and chunk_number that re-ranking needs"""
+    return {**result_projection(query), "title": 1, "chunk_number": 1, EMBEDDING_FIELD: 1, EMBEDDING_SCALE_FIELD: 1, EMBEDDING_OFFSET_FIELD: 1}
+
+
+def to_search_result(doc: Dict[str, Any], query: Optional[SearchQuery] = None) -> SearchResult:
+    if query is not None and query.projected:
+        fields = SEARCH_RESULT_FIELDS if query.fields is None else query.fields
+        return SearchHit(id=str(doc["_id"]), score=doc["score"], **{field: doc[field] for field in fields if field in doc})
+    return SearchResult(
+        id=str(doc["_id"]),
+        title=doc["title"],
+        content=doc["content"],
+        category=doc.get("category"),
+        score=doc["score"],
+        chunk_number=doc["chunk_number"],
+        metadata=doc.get("metadata")
+    )
+
+
+async def fetch_hit_documents(db_name: str, hits: List[Tuple[ObjectId, float]], projection: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Load the documents of in-process index hits with their score, best score first"""
+    if not hits:
+        return []
+    scores = dict(hits)
+    collection = mongo_client[db_name][EMBEDDED_DOCUMENT_COLLECTION]
+    docs = await collection.find({"_id": {"$in": list(scores)}}, projection).to_list(length=len(scores))
+    for doc in docs:
+        doc["score"] = scores[doc["_id"]]
+    docs.sort(key=lambda doc: doc["score"], reverse=True)
+    return docs
+
+
+async def fetch_hits(db_name: str, hits: List[Tuple[ObjectId, float]], query: Optional[SearchQuery] = None) -> List[SearchResult]:
+    """Load the documents of in-process index hits, best score first"""
+    return [to_search_result(doc, query) for doc in await fetch_hit_documents(db_name, hits, result_projection(query))]
+
+
+async def iter_hits(db_name: str, hits: List[Tuple[ObjectId, float]], query: Optional[SearchQuery] = None) -> AsyncIterator[SearchResult]:
+    """Stream the documents of in-process index hits in score order, STREAM_BATCH_SIZE per round trip"""
+    collection = mongo_client[db_name][EMBEDDED_DOCUMENT_COLLECTION]
+    projection = result_projection(query)
+    for start in range(0, len(hits), STREAM_BATCH_SIZE):
+        batch = hits[start:start + STREAM_BATCH_SIZE]
+        docs = {doc["_id"]: doc async for doc in collection.find({"_id": {"$in": [oid for oid, _ in batch]}}, projection)}
+        for oid, score in batch:
+            doc = docs.get(oid)
+            if doc is not None:
+                doc["score"] = score
+                yield to_search_result(doc, query)
+
+
+class SearchBackend(ABC):
+    name: str
+
+    def __init__(self):
+        self.logger = logger
+        self.mongo_client = mongo_client
+
+    @abstractmethod
+    async def search_documents(self, db_name: str, query_embedding: List[float], query: SearchQuery, projection: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Return the top query.limit documents for query_embedding with projection and a score field, best first"""
+
+    async def search(self, db_name: str, query_embedding: List[float], query: SearchQuery) -> List[SearchResult]:
+        """Return the top query.limit results for query_embedding, best first"""
+        return [to_search_result(doc, query) for doc in await self.search_documents(db_name, query_embedding, query, result_projection(query))]
+
+    async def iter_search(self, db_name: str, query_embedding: List[float], query: SearchQuery) -> AsyncIterator[SearchResult]:
+        """Stream the results of search, best first; backends override this to yield before all results are loaded"""
+        for result in await self.search(db_name, query_embedding, query):
+            yield result
+
+    def on_documents_stored(self, db_name: str, documents: List[Dict[str, Any]]):
+        """Called with the stored documents (including _id) after every successful insert"""
+
+    def on_documents_removed(self, db_name: str, ids: List[ObjectId]):
+        """Called with the _ids of deleted documents after every successful delete"""
+
+
+class AtlasVectorSearchBackend(SearchBackend):
+    name = SEARCH_BACKEND_ATLAS
+
+    async def search_documents(self, db_name: str, query_embedding: List[float], query: SearchQuery, projection: Dict[str, Any]) -> List[Dict[str, Any]]:
+        pipeline = await self._pipeline(db_name, query_embedding, query, projection)
+        collection = self.mongo_client[db_name][EMBEDDED_DOCUMENT_COLLECTION]
+        cursor = collection.aggregate(pipeline)
+        return await cursor.to_list(length=query.limit)
+
+    async def iter_search(self, db_name: str, query_embedding: List[float], query: SearchQuery) -> AsyncIterator[SearchResult]:
+        pipeline = await self._pipeline(db_name, query_embedding, query, result_projection(query))
+        collection = self.mongo_client[db_name][EMBEDDED_DOCUMENT_COLLECTION]
+        async for doc in collection.aggregate(pipeline).batch_size(STREAM_BATCH_SIZE):
+            yield to_search_result(doc, query)
+
+    async def _pipeline(self, db_name: str, query_embedding: List[float], query: SearchQuery, projection: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # filter dictionary
+        filter_conditions = {}
+        if query.category:
+            self.logger.info(f"Filtering by category: {query.category}")
+            filter_conditions["category"] = {"$eq": query.category}
+
+        if query.metadata and query.metadata.org_id:
+            self.logger.info(f"Filtering by org_id: {query.metadata.org_id}")
+            filter_conditions["metadata.org_id"] = {"$eq": query.metadata.org_id}
+
+        num_candidates = await candidate_planner.num_candidates(db_name, query)
+        self.logger.info(f"Searching with numCandidates {num_candidates} for limit {query.limit}")
+
+        vector_search_stage = {
+            "$vectorSearch": {
+                "index": EMBEDDED_DOCUMENT_INDEX_NAME,
+                "path": EMBEDDING_PATH,
+                "queryVector": encode_query_vector(query_embedding),
+                "numCandidates": num_candidates,
+                "limit": query.limit
+            }
+        }
+
+        # Add filter only if there are conditions
+        if filter_conditions:
+            vector_search_stage["$vectorSearch"]["filter"] = filter_conditions
+
+        return [
+            vector_search_stage,
+            {
+                "$project": {
+                    **projection,
+                    "score": {"$meta": "vectorSearchScore"}
+                }
+            }
+        ]
+
+
+class LocalVectorSearchBackend(SearchBackend):
+    """Exact cosine search over an in-process per-tenant index; scores match Atlas' cosine vectorSearchScore"""
+    name = SEARCH_BACKEND_LOCAL
+
+    async def search_documents(self, db_name: str, query_embedding: List[float], query: SearchQuery, projection: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return await fetch_hit_documents(db_name, await self._hits(db_name, query_embedding, query), projection)
+
+    async def iter_search(self, db_name: str, query_embedding: List[float], query: SearchQuery) -> AsyncIterator[SearchResult]:
+        async for result in iter_hits(db_name, await self._hits(db_name, query_embedding, query), query):
+            yield result
+
+    async def _hits(self, db_name: str, query_embedding: List[float], query: SearchQuery) -> List[Tuple[ObjectId, float]]:
+        index = await local_vector_index_registry.get(db_name, EMBEDDED_DOCUMENT_COLLECTION)
+        org_id = query.metadata.org_id if query.metadata else None
+        return index.search(query_embedding, query.limit, category=query.category, org_id=org_id)
+
+    def on_documents_stored(self, db_name: str, documents: List[Dict[str, Any]]):
+        try:
+            local_vector_index_registry.add_documents(db_name, documents)
+        except Exception as e:
+            self.logger.error(f"Failed to update local vector index for {db_name}: {e}")
+
+    def on_documents_removed(self, db_name: str, ids: List[ObjectId]):
+        try:
+            local_vector_index_registry.remove_documents(db_name, ids)
+        except Exception as e:
+            self.logger.error(f"Failed to remove documents from local vector index for {db_name}: {e}")
+
+
+class IVFVectorSearchBackend(SearchBackend):
+    """
+    Approximate cosine search over a persisted per-tenant IVF index. While a tenant's index is
+    being opened or built, queries are answered by the fallback backend.
+    """
+    name = SEARCH_BACKEND_IVF
+
+    def __init__(self, fallback: SearchBackend):
+        super().__init__()
+        self.fallback = fallback
+
+    async def search_documents(self, db_name: str, query_embedding: List[float], query: SearchQuery, projection: Dict[str, Any]) -> List[Dict[str, Any]]:
+        hits = self._hits(db_name, query_embedding, query)
+        if hits is None:
+            return await self.fallback.search_documents(db_name, query_embedding, query, projection)
+        return await fetch_hit_documents(db_name, hits, projection)
+
+    async def iter_search(self, db_name: str, query_embedding: List[float], query: SearchQuery) -> AsyncIterator[SearchResult]:
+        hits = self._hits(db_name, query_embedding, query)
+        results = self.fallback.iter_search(db_name, query_embedding, query) if hits is None else iter_hits(db_name, hits, query)
+        async for result in results:
+            yield result
+
+    def _hits(self, db_name: str, query_embedding: List[float], query: SearchQuery) -> Optional[List[Tuple[ObjectId, float]]]:
+        """IVF hits, or None while the tenant's index is not ready"""
+        index = ivf_index_registry.get_if_ready(db_name, EMBEDDED_DOCUMENT_COLLECTION)
+        if index is None:
+            self.logger.info(f"IVF index for {db_name} is not ready, searching with {self.fallback.name}")
+            return None
+        org_id = query.metadata.org_id if query.metadata else None
+        return index.search(query_embedding, query.limit, category=query.category, org_id=org_id, num_probes=IVF_NUM_PROBES)
+
+    def on_documents_stored(self, db_name: str, documents: List[Dict[str, Any]]):
+        try:
+            ivf_index_registry.add_documents(db_name, documents)
+        except Exception as e:
+            self.logger.error(f"Failed to update IVF index for {db_name}: {e}")
+
+    def on_documents_removed(self, db_name: str, ids: List[ObjectId]):
+        try:
+            ivf_index_registry.remove_documents(db_name, ids)
+        except Exception as e:
+            self.logger.error(f"Failed to remove documents from IVF index for {db_name}: {e}")
+
+
+atlas_search_backend = AtlasVectorSearchBackend()
+local_search_backend = LocalVectorSearchBackend()
+ivf_search_backend = IVFVectorSearchBackend(fallback=atlas_search_backend)
+search_backends: Dict[str, SearchBackend] = {backend.name: backend for backend in (atlas_search_backend, local_search_backend, ivf_search_backend)}
+_corpus_sizes: TTLCache = TTLCache(maxsize=10000, ttl=CORPUS_SIZE_CACHE_TTL)
+
+
+async def select_search_backend(db_name: str) -> SearchBackend:
+    """Pick the backend for a tenant: SEARCH_BACKEND, or in auto mode by the tenant's corpus size"""
+    if SEARCH_BACKEND != SEARCH_BACKEND_AUTO:
+        return search_backends[SEARCH_BACKEND]
+
+    corpus_size: Optional[int] = local_vector_index_registry.loaded_size(db_name)
+    if corpus_size is None:
+        corpus_size = ivf_index_registry.loaded_size(db_name)
+    if corpus_size is None:
+        corpus_size = _corpus_sizes.get(db_name)
+    if corpus_size is None:
+        corpus_size = await mongo_client[db_name][EMBEDDED_DOCUMENT_COLLECTION].estimated_document_count()
+        _corpus_sizes[db_name] = corpus_size
+    if corpus_size <= LOCAL_SEARCH_MAX_DOCUMENTS:
+        return local_search_backend
+    if IVF_SEARCH_MIN_DOCUMENTS and corpus_size >= IVF_SEARCH_MIN_DOCUMENTS:
+        return ivf_search_backend
+    return atlas_search_backend
+
+
+async def serves_current_results(db_name: str, query: SearchQuery) -> bool:
+    """
+    Whether query is answered by Mongo itself. Per-process indexes (local, IVF, and the BM25 index
+    of hybrid queries) can lag writes made by other processes, so their results must not be cached
+    under a generation those writes already bumped.
+    """
+    if query.hybrid:
+        return False
+    return (await select_search_backend(db_name)).name == SEARCH_BACKEND_ATLAS
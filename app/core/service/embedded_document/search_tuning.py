@@ -0,0 +1,128 @@
+import math
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from cachetools import TTLCache
+from pymongo import UpdateOne
+
+from app.core.config.mongodb import mongo_client
+from app.core.schema.embedded_document_schema import SearchQuery
+from app.utils.logger import logger
+
+CATEGORY_STATS_COLLECTION = "CategoryStats"
+SEARCH_SETTINGS_COLLECTION = "SearchSettings"
+VECTOR_SEARCH_SETTINGS_ID = "vector_search"
+# Stats document _id for chunks stored without a category
+NO_CATEGORY = "__none__"
+
+# Defaults until a tenant has been tuned with app/scripts/tune_num_candidates.py
+NUM_CANDIDATES_PER_RESULT = float(os.getenv("NUM_CANDIDATES_PER_RESULT") or 20)
+MIN_NUM_CANDIDATES = int(os.getenv("MIN_NUM_CANDIDATES") or 100)
+# $vectorSearch rejects numCandidates above 10000
+MAX_NUM_CANDIDATES = 10000
+TARGET_RECALL = float(os.getenv("VECTOR_SEARCH_TARGET_RECALL") or 0.95)
+# A filter matching fewer chunks than this share is treated as matching exactly this share
+MIN_FILTER_SELECTIVITY = 0.01
+SEARCH_TUNING_CACHE_TTL = int(os.getenv("SEARCH_TUNING_CACHE_TTL") or 300)
+
+
+class CandidatePlanner:
+    """
+    Chooses $vectorSearch numCandidates per query.
+
+    The base is limit * candidates-per-result, where candidates-per-result is the smallest tuned
+    multiplier that reached TARGET_RECALL for the tenant. A category filter divides that by the
+    category's share of the tenant's chunks, since HNSW candidates are drawn before filtering
+    narrows them down. Per-tenant category counts and tuned settings live in the tenant database
+    and are cached for SEARCH_TUNING_CACHE_TTL seconds.
+    """
+
+    def __init__(self, cache_ttl: int):
+        self.logger = logger
+        self.mongo_client = mongo_client
+        self.category_counts: TTLCache = TTLCache(maxsize=10000, ttl=cache_ttl)
+        self.settings: TTLCache = TTLCache(maxsize=10000, ttl=cache_ttl)
+
+    async def get_category_counts(self, db_name: str) -> Dict[str, int]:
+        counts = self.category_counts.get(db_name)
+        if counts is None:
+            collection = self.mongo_client[db_name][CATEGORY_STATS_COLLECTION]
+            counts = {doc["_id"]: doc.get("count", 0) async for doc in collection.find({})}
+            self.category_counts[db_name] = counts
+        return counts
+
+    async def get_settings(self, db_name: str) -> Dict[str, Any]:
+        settings = self.settings.get(db_name)
+        if settings is None:
+            collection = self.mongo_client[db_name][SEARCH_SETTINGS_COLLECTION]
+            settings = await collection.find_one({"_id": VECTOR_SEARCH_SETTINGS_ID}) or {}
+            self.settings[db_name] = settings
+        return settings
+
+    @staticmethod
+    def candidates_per_result(settings: Dict[str, Any], target_recall: float = TARGET_RECALL) -> float:
+        """Smallest tuned multiplier whose measured recall reaches target_recall, else the default"""
+        curve = settings.get("recall_curve") or []
+        for point in sorted(curve, key=lambda point: point["candidates_per_result"]):
+            if point["recall"] >= target_recall:
+                return point["candidates_per_result"]
+        return settings.get("candidates_per_result") or NUM_CANDIDATES_PER_RESULT
+
+    @staticmethod
+    def filter_selectivity(counts: Dict[str, int], category: str) -> Optional[float]:
+        """Share of the tenant's chunks in category, at least MIN_FILTER_SELECTIVITY; None without stats"""
+        total = sum(counts.values())
+        if not total:
+            return None
+        return max(counts.get(category, 0) / total, MIN_FILTER_SELECTIVITY)
+
+    async def num_candidates(self, db_name: str, query: SearchQuery) -> int:
+        if query.num_candidates:
+            return max(query.num_candidates, query.limit)
+        try:
+            settings = await self.get_settings(db_name)
+            candidates = max(query.limit * self.candidates_per_result(settings), settings.get("min_num_candidates") or MIN_NUM_CANDIDATES)
+            if query.category:
+                selectivity = self.filter_selectivity(await self.get_category_counts(db_name), query.category)
+                if selectivity is not None:
+                    candidates /= selectivity
+        except Exception as e:
+            self.logger.error(f"Failed to plan numCandidates for {db_name}, using defaults: {e}")
+            candidates = max(query.limit * NUM_CANDIDATES_PER_RESULT, MIN_NUM_CANDIDATES)
+        return int(min(max(math.ceil(candidates), query.limit), MAX_NUM_CANDIDATES))
+
+    async def record_documents(self, db_name: str, documents: List[Dict[str, Any]], increment: int = 1):
+        """Count newly stored chunks per category; increment -1 uncounts deleted chunks"""
+        if not documents:
+            return
+        try:
+            counts = Counter(document.get("category") or NO_CATEGORY for document in documents)
+            collection = self.mongo_client[db_name][CATEGORY_STATS_COLLECTION]
+            await collection.bulk_write([UpdateOne({"_id": category}, {"$inc": {"count": increment * count}}, upsert=True) for category, count in counts.items()], ordered=False)
+            self.category_counts.pop(db_name, None)
+        except Exception as e:
+            self.logger.error(f"Failed to update category stats for {db_name}: {e}")
+
+    async def rebuild_category_counts(self, db_name: str, collection_name: str) -> Dict[str, int]:
+        """Recount chunks per category from scratch, e.g. for tenants ingested before stats were kept"""
+        source = self.mongo_client[db_name][collection_name]
+        cursor = source.aggregate([{"$group": {"_id": {"$ifNull": ["$category", NO_CATEGORY]}, "count": {"$sum": 1}}}])
+        counts = {doc["_id"]: doc["count"] async for doc in cursor}
+        collection = self.mongo_client[db_name][CATEGORY_STATS_COLLECTION]
+        await collection.delete_many({})
+        if counts:
+            await collection.insert_many([{"_id": category, "count": count} for category, count in counts.items()])
+        self.category_counts.pop(db_name, None)
+        return counts
+
+    async def save_settings(self, db_name: str, settings: Dict[str, Any]):
+        settings = {**settings, "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        collection = self.mongo_client[db_name][SEARCH_SETTINGS_COLLECTION]
+        await collection.replace_one({"_id": VECTOR_SEARCH_SETTINGS_ID}, settings, upsert=True)
+        self.settings.pop(db_name, None)
+
+
+# Singleton instance for app use
+candidate_planner = CandidatePlanner(SEARCH_TUNING_CACHE_TTL)
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import re
+from datetime import datetime
+from typing import Dict, List
+
+from pymongo.errors import BulkWriteError
+from app.utils.logger import logger
+from app.core.config.mongodb import mongo_client
+from app.core.utils.vector_codec import EMBEDDING_FIELD, STORAGE_MODE_FLOAT32, decode_embedding, encode_embedding
+
+EMBEDDING_CACHE_COLLECTION = "EmbeddingCache"
+EMBEDDING_CACHE_ENABLED = (os.getenv("EMBEDDING_CACHE_ENABLED") or "true").lower() == "true"
+DUPLICATE_KEY_ERROR = 11000
+
+
+class EmbeddingCacheService:
+    """
+    Content-addressed cache of document embeddings, stored per tenant.
+
+    Entries are keyed by (model, task_type, sha256 of the normalized chunk text), so an
+    identical chunk re-uploaded later is never sent to the embedding API again. Vectors are
+    stored as float32 BSON binary vectors, the codec's float32 storage mode.
+    """
+
+    def __init__(self, org_id: str, db_name: str):
+        self.logger = logger
+        self.mongo_client = mongo_client
+        self.org_id = org_id
+        self.db_name = db_name
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip().lower()
+
+    @staticmethod
+    def cache_key(model: str, task_type: str, text: str) -> str:
+        digest = hashlib.sha256(EmbeddingCacheService.normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{model}:{task_type}:{digest}"
+
+    async def get_embeddings(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return the cached embeddings found for keys; lookup failures count as misses."""
+        if not keys:
+            return {}
+        try:
+            collection = self.mongo_client[self.db_name][EMBEDDING_CACHE_COLLECTION]
+            cursor = collection.find({"_id": {"$in": list(set(keys))}}, {EMBEDDING_FIELD: 1})
+            # decode_embedding also reads entries cached as float64 arrays before the binary format
+            return {doc["_id"]: decode_embedding(doc).tolist() async for doc in cursor}
+        except Exception as e:
+            self.logger.error(f"Failed to read embedding cache: {e}")
+            return {}
+
+    async def put_embeddings(self, embeddings: Dict[str, List[float]]):
+        """Store embeddings by key. Keys that are already cached are left as they are."""
+        if not embeddings:
+            return
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            collection = self.mongo_client[self.db_name][EMBEDDING_CACHE_COLLECTION]
+            await collection.insert_many(
+                [{"_id": key, **encode_embedding(vector, STORAGE_MODE_FLOAT32), "created_at": now} for key, vector in embeddings.items()],
+                ordered=False,
+            )
+        except BulkWriteError as e:
+            # Another ingestion cached the same chunk first
+            errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY_ERROR]
+            if errors:
+                self.logger.error(f"Failed to write {len(errors)} embedding cache entries: {errors[0].get('errmsg')}")
+        except Exception as e:
+            self.logger.error(f"Failed to write embedding cache: {e}")
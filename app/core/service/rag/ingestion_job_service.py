@@ -0,0 +1,139 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+from uuid import uuid4
+from app.core.config.redis import redis_manager
+from app.core.langchain.embedding_provider import EmbeddingProvider
+from app.core.schema.rag_schema import IngestionJobStatus, RagDocumentCreate
+from app.core.service.rag.rag_service import RagService
+from app.utils.logger import logger
+
+INGESTION_JOB_PREFIX = "rag:ingestion_job"
+INGESTION_JOB_TTL = int(os.getenv("INGESTION_JOB_TTL") or 86400)
+INGESTION_JOB_WORKERS = int(os.getenv("INGESTION_JOB_WORKERS") or 2)
+INGESTION_JOB_QUEUE_SIZE = int(os.getenv("INGESTION_JOB_QUEUE_SIZE") or 100)
+
+
+@dataclass
+class IngestionJob:
+    job_id: str
+    org_id: str
+    db_name: str
+    body: RagDocumentCreate
+    file_data: bytes
+    filename: str
+    content_type: str
+    # The tenant's embedding provider; None uses the manager's default
+    embedder: Optional[EmbeddingProvider] = None
+
+
+class IngestionJobService:
+    """Ingestion job status kept in a Redis hash per job, scoped by org_id."""
+
+    def __init__(self, org_id: str):
+        self.logger = logger
+        self.redis_manager = redis_manager
+        self.org_id = org_id
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.org_id}:{job_id}"
+
+    async def create_job(self, filename: str) -> str:
+        job_id = str(uuid4())
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        status = IngestionJobStatus(job_id=job_id, filename=filename, created_at=now, updated_at=now)
+        await self.redis_manager.set_hash(INGESTION_JOB_PREFIX, self._key(job_id), status.model_dump(exclude_none=True), ttl=INGESTION_JOB_TTL)
+        return job_id
+
+    async def get_job(self, job_id: str) -> Optional[IngestionJobStatus]:
+        data = await self.redis_manager.get_hash(INGESTION_JOB_PREFIX, self._key(job_id))
+        if not data:
+            return None
+        return IngestionJobStatus(**data)
+
+    async def update_status(self, job_id: str, status: str, error: Optional[str] = None):
+        mapping = {"status": status, "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        if error:
+            mapping["error"] = error
+        await self.redis_manager.set_hash(INGESTION_JOB_PREFIX, self._key(job_id), mapping, ttl=INGESTION_JOB_TTL)
+
+    async def increment(self, job_id: str, counter: str, amount: int):
+        await self.redis_manager.increment_hash(INGESTION_JOB_PREFIX, self._key(job_id), counter, amount)
+
+
+class IngestionJobManager:
+    """
+    In-process worker pool that runs queued ingestion jobs in the background.
+    Jobs live in memory until a worker picks them up, so queued jobs do not survive a restart.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.logger = logger
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+        self.embedder: Optional[EmbeddingProvider] = None
+
+    async def start(self, embedder: EmbeddingProvider):
+        """Start the background workers, sharing the application's embedding service"""
+        if self.tasks:
+            return
+        self.embedder = embedder
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self.logger.info(f"Started {self.workers} ingestion job workers")
+
+    async def stop(self):
+        """Cancel the background workers"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.logger.info("Stopped ingestion job workers")
+
+    def submit(self, job: IngestionJob):
+        if self.queue is None:
+            raise RuntimeError("Ingestion job workers are not started. Call start() first.")
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise Exception("Too many ingestion jobs queued, please retry later")
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job: IngestionJob = await self.queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job: IngestionJob):
+        job_service = IngestionJobService(job.org_id)
+
+        async def report_progress(counter: str, amount: int):
+            await job_service.increment(job.job_id, counter, amount)
+
+        try:
+            self.logger.info(f"Running ingestion job {job.job_id} for {job.filename}")
+            await job_service.update_status(job.job_id, "running")
+            service = RagService(org_id=job.org_id, db_name=job.db_name, embedder=job.embedder or self.embedder)
+            response = await service.generate_embedding_service(job.body, job.file_data, job.filename, job.content_type, progress_callback=report_progress)
+            if response.status_code == 207:
+                await job_service.update_status(job.job_id, "partial", error="Some chunks failed to embed or store, the previous version's chunks were kept")
+                self.logger.warning(f"Ingestion job {job.job_id} for {job.filename} completed with failed chunks")
+                return
+            await job_service.update_status(job.job_id, "completed")
+            self.logger.info(f"Completed ingestion job {job.job_id} for {job.filename}")
+        except Exception as e:
+            self.logger.error(f"Ingestion job {job.job_id} for {job.filename} failed: {e}")
+            try:
+                await job_service.update_status(job.job_id, "failed", error=str(e))
+            except Exception as status_error:
+                self.logger.error(f"Failed to mark ingestion job {job.job_id} as failed: {status_error}")
+
+
+# Singleton instance for app use
+ingestion_job_manager = IngestionJobManager(INGESTION_JOB_WORKERS, INGESTION_JOB_QUEUE_SIZE)
@@ -0,0 +1,263 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from bson import ObjectId
+from langchain_core.documents import Document
+from app.core.langchain.embedding_provider import EmbeddingProvider
+from app.core.schema.embedded_document_schema import EmbeddedDocumentCreate, EmbeddedDocumentMetadata
+from app.core.schema.rag_schema import IngestionResult, RagDocumentCreate
+from app.core.service.embedded_document.embedded_document_service import BULK_WRITE_FLUSH_SIZE, EmbeddedDocumentService, content_hash, default_document_id
+from app.core.service.embedding_cache.embedding_cache_service import EMBEDDING_CACHE_ENABLED, EmbeddingCacheService
+from app.utils.logger import logger
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE") or 50)
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY") or 4)
+INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE") or 8)
+
+ChunkBatch = Tuple[int, List[Document]]
+# Called with a counter name (chunks_split, chunks_embedded, chunks_stored, chunks_failed,
+# chunks_unchanged, chunks_deleted, embedding_cache_hits, embedding_cache_misses) and an increment
+ProgressCallback = Callable[[str, int], Awaitable[None]]
+
+
+def first_error(group: BaseExceptionGroup) -> BaseException:
+    """The first exception of a task group failure, unwrapping nested groups"""
+    error = group.exceptions[0]
+    return first_error(error) if isinstance(error, BaseExceptionGroup) else error
+
+
+@dataclass
+class DocumentDiff:
+    """
+    Stored chunks of a document's previous version, keyed by (content_hash, category, embedding_model).
+    Chunks of the new version claim a matching stored chunk instead of being embedded; whatever is
+    left unclaimed was removed from the document. Chunks embedded by another model, or stored before
+    chunks recorded their model, never match, so a provider change re-embeds the whole document.
+    """
+    document_id: str
+    version: int
+    model: str
+    stored: Dict[Tuple[str, Optional[str], Optional[str]], List[Dict[str, Any]]]
+    # Field changes of claimed chunks: their moved chunk_numbers
+    updates: List[Tuple[ObjectId, Dict[str, Any]]] = field(default_factory=list)
+
+    @classmethod
+    def from_chunks(cls, document_id: str, version: int, model: str, chunks: List[Dict[str, Any]]) -> "DocumentDiff":
+        stored: Dict[Tuple[str, Optional[str], Optional[str]], List[Dict[str, Any]]] = {}
+        for chunk in chunks:
+            stored.setdefault((chunk["content_hash"], chunk.get("category"), chunk.get("embedding_model")), []).append(chunk)
+        return cls(document_id, version, model, stored)
+
+    def claim(self, chunk_hash: str, category: Optional[str], chunk_number: int) -> bool:
+        """Claim a stored chunk with this content and category embedded by this model, preferring one already at chunk_number"""
+        candidates = self.stored.get((chunk_hash, category, self.model))
+        if not candidates:
+            return False
+        position = next((i for i, chunk in enumerate(candidates) if chunk.get("chunk_number") == chunk_number), len(candidates) - 1)
+        chunk = candidates.pop(position)
+        if chunk.get("chunk_number") != chunk_number:
+            self.updates.append((chunk["_id"], {"chunk_number": chunk_number}))
+        return True
+
+    def removed(self) -> List[Dict[str, Any]]:
+        return [chunk for chunks in self.stored.values() for chunk in chunks]
+
+
+class IngestionPipeline:
+    """
+    Split -> embed -> store pipeline connected by bounded queues.
+
+    The split stage regroups chunks from an async iterator into batches of EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_CONCURRENCY embed workers turn them into EmbeddedDocumentCreate batches and
+    a single store stage bulk-inserts them. A full queue blocks the stage feeding it, so at most
+    INGESTION_QUEUE_SIZE batches are buffered between any two stages regardless of document size.
+
+    Re-ingesting a document (same document_id, defaulting to the title) is incremental: chunks whose
+    content hash, category and embedding model match a stored chunk are kept without embedding, and
+    stored chunks the new version no longer has are deleted in one operation once the run completes.
+    """
+
+    def __init__(self, embedder: EmbeddingProvider, embedded_document_service: EmbeddedDocumentService, embedding_cache_service: Optional[EmbeddingCacheService] = None, progress_callback: Optional[ProgressCallback] = None):
+        self.logger = logger
+        self.embedder = embedder
+        self.embedded_document_service = embedded_document_service
+        self.embedding_cache_service = embedding_cache_service if EMBEDDING_CACHE_ENABLED else None
+        self.progress_callback = progress_callback
+
+    async def run(self, body: RagDocumentCreate, chunk_batches: AsyncIterator[List[Document]]) -> IngestionResult:
+        metadata: EmbeddedDocumentMetadata = EmbeddedDocumentMetadata()
+        if body.metadata:
+            metadata.org_id = body.metadata.org_id
+
+        document_id = body.document_id or default_document_id(body.title, body.category)
+        stored_chunks = await self.embedded_document_service.get_document_chunks(document_id, body.title, body.category)
+        version = await self.embedded_document_service.start_document_version(document_id, body.title)
+        diff = DocumentDiff.from_chunks(document_id, version, self.embedder.model, stored_chunks)
+        self.logger.info(f"Ingesting version {version} of document {document_id} against {len(stored_chunks)} stored chunks")
+
+        embed_queue: asyncio.Queue[Optional[ChunkBatch]] = asyncio.Queue(maxsize=INGESTION_QUEUE_SIZE)
+        store_queue: asyncio.Queue[Optional[List[EmbeddedDocumentCreate]]] = asyncio.Queue(maxsize=INGESTION_QUEUE_SIZE)
+        result = IngestionResult()
+        started_at = time.monotonic()
+
+        async def embed_workers():
+            async with asyncio.TaskGroup() as workers:
+                for _ in range(EMBEDDING_MAX_CONCURRENCY):
+                    workers.create_task(self._embed_stage(body, metadata, diff, embed_queue, store_queue, result))
+            await store_queue.put(None)
+
+        # A failing stage cancels the others, which would otherwise block forever on a queue nobody drains
+        try:
+            async with asyncio.TaskGroup() as stages:
+                stages.create_task(self._split_stage(chunk_batches, embed_queue))
+                stages.create_task(embed_workers())
+                stages.create_task(self._store_stage(store_queue, result, started_at))
+        except BaseExceptionGroup as e:
+            error = first_error(e)
+            self.logger.error(f"Ingestion of version {version} of document {document_id} failed: {error}")
+            raise error
+
+        await self.embedded_document_service.update_embedded_documents(diff.updates)
+        result.failed_chunk_numbers.sort()
+        if result.failed_chunk_numbers:
+            # The previous version's chunks stay searchable until an upload stores every chunk;
+            # the next complete upload claims or deletes them
+            self.logger.warning(f"Version {version} of document {document_id} is incomplete, failed chunks: {result.failed_chunk_numbers}; "
+                                f"kept {len(diff.removed())} chunks of the previous version")
+        else:
+            result.deleted_count = await self.embedded_document_service.delete_embedded_documents(diff.removed())
+            await self._report("chunks_deleted", result.deleted_count)
+            await self.embedded_document_service.finish_document_version(document_id, version, result.inserted_count + result.unchanged_count)
+            result.document_version = version
+
+        self.logger.info(
+            f"Stored {result.inserted_count} chunks in {time.monotonic() - started_at:.2f}s, kept {result.unchanged_count} unchanged, "
+            f"deleted {result.deleted_count} removed, failed chunks: {result.failed_chunk_numbers}, "
+            f"embedding cache hits: {result.embedding_cache_hits}, misses: {result.embedding_cache_misses}"
+        )
+        return result
+
+    async def _split_stage(self, chunk_batches: AsyncIterator[List[Document]], embed_queue: asyncio.Queue):
+        start = 0
+        batch: List[Document] = []
+        # Re-batch whatever the splitter produces (pages, page ranges) into embedding-sized batches
+        async for chunks in chunk_batches:
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) >= EMBEDDING_BATCH_SIZE:
+                    await self._report("chunks_split", len(batch))
+                    await embed_queue.put((start, batch))
+                    start += len(batch)
+                    batch = []
+        if batch:
+            await self._report("chunks_split", len(batch))
+            await embed_queue.put((start, batch))
+            start += len(batch)
+        self.logger.info(f"Split stage produced {start} chunks")
+        # Only a completed split ends the embed workers; on failure the run cancels them instead
+        for _ in range(EMBEDDING_MAX_CONCURRENCY):
+            await embed_queue.put(None)
+
+    async def _embed_stage(self, body: RagDocumentCreate, metadata: EmbeddedDocumentMetadata, diff: DocumentDiff, embed_queue: asyncio.Queue, store_queue: asyncio.Queue, result: IngestionResult):
+        while True:
+            item = await embed_queue.get()
+            if item is None:
+                return
+            start, batch = item
+            # Chunks the stored version already has are claimed before any await, so workers never claim one twice
+            new_chunks = []
+            for offset, chunk in enumerate(batch):
+                chunk_hash = content_hash(chunk.page_content)
+                if not diff.claim(chunk_hash, body.category, start + offset):
+                    new_chunks.append((start + offset, chunk_hash, chunk))
+            unchanged = len(batch) - len(new_chunks)
+            result.unchanged_count += unchanged
+            await self._report("chunks_unchanged", unchanged)
+            if not new_chunks:
+                continue
+
+            try:
+                self.logger.info(f"Generating embedding for {len(new_chunks)} new chunks of {start} to {start + len(batch) - 1}")
+                embeddings: List[List[float]] = await self._embed_batch([chunk for _, _, chunk in new_chunks], result)
+                documents = [
+                    EmbeddedDocumentCreate(
+                        title=body.title,
+                        content=chunk.page_content,
+                        chunk_number=chunk_number,
+                        category=body.category,
+                        metadata=metadata,
+                        embeddings=chunk_embeddings,
+                        document_id=diff.document_id,
+                        content_hash=chunk_hash,
+                        document_version=diff.version,
+                        embedding_model=self.embedder.model,
+                    )
+                    for (chunk_number, chunk_hash, chunk), chunk_embeddings in zip(new_chunks, embeddings)
+                ]
+            except Exception as e:
+                self.logger.error(f"Failed to generate embedding for chunks {start} to {start + len(batch) - 1}: {e}")
+                result.failed_chunk_numbers.extend(chunk_number for chunk_number, _, _ in new_chunks)
+                await self._report("chunks_failed", len(new_chunks))
+                continue
+
+            await self._report("chunks_embedded", len(documents))
+            await store_queue.put(documents)
+
+    async def _embed_batch(self, batch: List[Document], result: IngestionResult) -> List[List[float]]:
+        """Embed a batch, serving chunks whose text was embedded before from the embedding cache."""
+        if self.embedding_cache_service is None:
+            return await self.embedder.embed_documents(batch)
+
+        keys = [EmbeddingCacheService.cache_key(self.embedder.model, self.embedder.task_type, chunk.page_content) for chunk in batch]
+        cached = await self.embedding_cache_service.get_embeddings(keys)
+
+        # Embed each missing text once, even if it repeats within the batch
+        missing: Dict[str, Document] = {}
+        for key, chunk in zip(keys, batch):
+            if key not in cached and key not in missing:
+                missing[key] = chunk
+        if missing:
+            fresh = await self.embedder.embed_documents(list(missing.values()))
+            fresh_by_key = dict(zip(missing.keys(), fresh))
+            await self.embedding_cache_service.put_embeddings(fresh_by_key)
+            cached.update(fresh_by_key)
+
+        hits = len(batch) - len(missing)
+        result.embedding_cache_hits += hits
+        result.embedding_cache_misses += len(missing)
+        await self._report("embedding_cache_hits", hits)
+        await self._report("embedding_cache_misses", len(missing))
+        return [cached[key] for key in keys]
+
+    async def _store_stage(self, store_queue: asyncio.Queue, result: IngestionResult, started_at: float):
+        pending: List[EmbeddedDocumentCreate] = []
+        done = False
+        while not done:
+            documents = await store_queue.get()
+            if documents is None:
+                done = True
+            else:
+                pending.extend(documents)
+
+            # Write as soon as nothing else is waiting: when embedding is the bottleneck this keeps
+            # time-to-first-stored-chunk low, and under a backlog writes grow up to the flush size.
+            if pending and (done or store_queue.empty() or len(pending) >= BULK_WRITE_FLUSH_SIZE):
+                is_first_write = not result.batch_counts
+                write_result = await self.embedded_document_service.store_embedded_documents(pending)
+                result.merge(write_result)
+                pending = []
+                await self._report("chunks_stored", write_result.inserted_count)
+                await self._report("chunks_failed", len(write_result.failed_chunk_numbers))
+                if is_first_write:
+                    self.logger.info(f"First chunks stored after {time.monotonic() - started_at:.2f}s")
+
+    async def _report(self, counter: str, amount: int):
+        if self.progress_callback is None or amount == 0:
+            return
+        try:
+            await self.progress_callback(counter, amount)
+        except Exception as e:
+            # Progress reporting must never fail the ingestion itself
+            self.logger.warning(f"Failed to report ingestion progress {counter}: {e}")
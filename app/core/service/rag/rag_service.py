@@ -1,86 +1,256 @@
-from typing import List
+import asyncio
+import os
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from langchain_core.documents import Document
-from app.core.langchain.embedding import LangchainEmbeddingService
-from app.core.schema.embedded_document_schema import EmbeddedDocumentCreate, EmbeddedDocumentMetadata, SearchQuery
-from app.core.schema.rag_schema import RagDocumentCreate
+from app.core.cache.query_embedding_cache import query_embedding_cache
+from app.core.cache.search_result_cache import search_result_cache
+from app.core.config.executors import executor_manager
+from app.core.langchain.embedding_provider import EmbeddingProvider
+from app.core.schema.embedded_document_schema import BatchSearchQuery, BatchSearchResponse, BatchSearchResultItem, SearchQuery, SearchResult
+from app.core.schema.rag_schema import IngestionResult, RagDocumentCreate
 from app.core.service.embedded_document.embedded_document_service import EmbeddedDocumentService
+from app.core.service.embedded_document.search_backend import serves_current_results, to_search_result
+from app.core.service.embedding_cache.embedding_cache_service import EmbeddingCacheService
+from app.core.service.rag.ingestion_pipeline import IngestionPipeline, ProgressCallback
 from app.utils.logger import logger
-from app.core.splitter.text_splitter import load_and_split_from_s3
+from app.core.splitter.text_splitter import iter_chunk_batches_from_bytes
+from app.core.utils.rank_fusion import reciprocal_rank_fusion
+from app.core.utils.rerank import rerank_documents
 from app.core.utils.s3 import upload_file_to_s3
 from fastapi.responses import JSONResponse
 
+# Candidates taken from each of the lexical and vector rankings before fusing them
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES") or 20)
+# Searches of one batch query request that run at the same time
+BATCH_QUERY_CONCURRENCY = int(os.getenv("BATCH_QUERY_CONCURRENCY") or 8)
+# Re-ranked queries fetch limit * RERANK_CANDIDATE_FACTOR (at least RERANK_MIN_CANDIDATES) vector search candidates
+RERANK_CANDIDATE_FACTOR = int(os.getenv("RERANK_CANDIDATE_FACTOR") or 4)
+RERANK_MIN_CANDIDATES = int(os.getenv("RERANK_MIN_CANDIDATES") or 20)
+
 
 class RagService():
-    def __init__(self, org_id: str, db_name: str):
+    def __init__(self, org_id: str, db_name: str, embedder: EmbeddingProvider):
         self.logger = logger
-        self.embedder = LangchainEmbeddingService()
+        self.embedder = embedder
         self.embedder_document_service = EmbeddedDocumentService(org_id=org_id, db_name=db_name)
+        self.embedding_cache_service = EmbeddingCacheService(org_id=org_id, db_name=db_name)
         self.org_id = org_id
         self.db_name = db_name
 
-    async def generate_embedding_service(self, body: RagDocumentCreate, file_data: bytes, filename: str, content_type: str):
+    async def generate_embedding_service(self, body: RagDocumentCreate, file_data: bytes, filename: str, content_type: str, progress_callback: Optional[ProgressCallback] = None):
         try:
             self.logger.info(f"Generating embedding for {filename}")
+            # Archive to S3 in the background while the upload is parsed from memory
             self.logger.info("Uploading file to S3")
-            s3_key = upload_file_to_s3(self.org_id, file_data, filename, content_type)
-            self.logger.info("File uploaded to S3")
+            upload_task = asyncio.create_task(executor_manager.run_io(upload_file_to_s3, self.org_id, file_data, filename, content_type))
 
             self.logger.info(f"Generating chunks for {filename}")
 
-            chunks = load_and_split_from_s3(s3_key, filename)
+            try:
+                chunks = iter_chunk_batches_from_bytes(file_data, filename)
+                result = await self._handle_document_chunks(body, chunks, progress_callback)
+            except Exception:
+                await asyncio.gather(upload_task, return_exceptions=True)
+                raise
 
-            self.logger.info(f"Generated chunks for {filename}")
-            await self._handle_document_chunks(body, chunks)
+            await upload_task
+            self.logger.info("File uploaded to S3")
 
-            self.logger.info(f"Generated embedding for {filename}")
-            return JSONResponse(content={"message": f"Generated embedding for {filename}"}, status_code=200)
+            self.logger.info(f"Generated embedding for {filename}, stored {result.inserted_count} chunks, kept {result.unchanged_count}, deleted {result.deleted_count}, failed chunks: {result.failed_chunk_numbers}, "
+                             f"embedding cache hits: {result.embedding_cache_hits}, misses: {result.embedding_cache_misses}")
+            # Per-batch write counts, failed chunk numbers and the other counters of the run
+            report = result.model_dump()
+            if result.failed_chunk_numbers:
+                # Multi-status: the upload is searchable, but the previous version's chunks were kept alongside it
+                return JSONResponse(content={
+                    "message": f"Generated embedding for {filename} with {len(result.failed_chunk_numbers)} failed chunks, kept the previous version's chunks",
+                    **report,
+                }, status_code=207)
+            return JSONResponse(content={"message": f"Generated embedding for {filename}", **report}, status_code=200)
         except Exception as e:
             self.logger.error(f"Failed to generate embedding for {filename}: {e}")
             raise
 
-    async def query_embedding_service(self, query: SearchQuery):
+    async def query_embedding_service(self, query: SearchQuery, use_cache: bool = True):
         try:
             self.logger.info(f"Generating query embedding for {query.query}")
-            return await self._handle_query_embedding(query)
+            if not use_cache:
+                return await self._handle_query_embedding(query)
+
+            results, generation = await search_result_cache.get(self.org_id, self.db_name, self.embedder.model, query)
+            if results is not None:
+                self.logger.info(f"Search result cache hit for {query.query}")
+                return results
+
+            results = await self._handle_query_embedding(query)
+            await self._cache_results(generation, query, results)
+            return results
         except Exception as e:
             self.logger.error(f"Failed to get query embedding: {e}")
             raise e
 
-    async def _handle_query_embedding(self, query: SearchQuery):
+    async def stream_query_embedding_service(self, query: SearchQuery, use_cache: bool = True) -> AsyncIterator[SearchResult]:
+        """Yield results as they come off the cursor; cached, hybrid and re-ranked results, which need the full list, are yielded from it"""
         try:
-            self.logger.info(f"Generating query embedding for by gemini {query.query}")
+            generation = None
+            if use_cache:
+                results, generation = await search_result_cache.get(self.org_id, self.db_name, self.embedder.model, query)
+                if results is not None:
+                    self.logger.info(f"Search result cache hit for {query.query}")
+                    for result in results:
+                        yield result
+                    return
+            if query.hybrid or query.rerank:
+                results = await self._handle_query_embedding(query)
+                for result in results:
+                    yield result
+            else:
+                query_embedding = await query_embedding_cache.get_or_embed(self.embedder.model, query.query, self.embedder.embed_query)
+                results = []
+                async for result in self.embedder_document_service.iter_search_embedded_documents(query_embedding, query):
+                    results.append(result)
+                    yield result
+            await self._cache_results(generation, query, results)
+        except Exception as e:
+            self.logger.error(f"Failed to stream query results: {e}")
+            raise e
 
-            query_embeddings = await self.embedder.langchain_generate_query_embedding_by_gemini(query.query)
+    async def batch_query_embedding_service(self, batch: BatchSearchQuery, use_cache: bool = True) -> BatchSearchResponse:
+        try:
+            results = {query: query_results async for query, query_results in self._iter_batch_results(batch, use_cache)}
+            ordered = {query.query: results[query.query] for query in batch.search_queries()}
+            return BatchSearchResponse(results=self._dedupe_results(ordered) if batch.dedupe else ordered)
+        except Exception as e:
+            self.logger.error(f"Failed to search batch of queries: {e}")
+            raise e
 
-            self.logger.info(f"Generated query embedding for by gemini {query.query}")
-            return await self.embedder_document_service.search_embedded_documents(query_embeddings, query)
+    async def stream_batch_query_embedding_service(self, batch: BatchSearchQuery, use_cache: bool = True) -> AsyncIterator[BatchSearchResultItem]:
+        """
+        Yield each query's results as soon as that query's search completes. With dedupe, a chunk is
+        kept under the first query that returns it, since later scores are not known yet.
+        """
+        try:
+            seen = set()
+            async for query, query_results in self._iter_batch_results(batch, use_cache):
+                for result in query_results:
+                    if batch.dedupe:
+                        if result.id in seen:
+                            continue
+                        seen.add(result.id)
+                    yield BatchSearchResultItem(query=query, result=result)
+        except Exception as e:
+            self.logger.error(f"Failed to stream batch of queries: {e}")
+            raise e
+
+    async def _iter_batch_results(self, batch: BatchSearchQuery, use_cache: bool) -> AsyncIterator[Tuple[str, List[SearchResult]]]:
+        """
+        Search several queries for one tenant, yielding (query, results) in completion order: cached
+        results first, then the remaining queries, embedded in one batched call and searched
+        concurrently, at most BATCH_QUERY_CONCURRENCY at a time.
+        """
+        queries = batch.search_queries()
+        self.logger.info(f"Searching batch of {len(queries)} queries")
+        generations: Dict[str, Optional[int]] = {}
+        pending = queries
+        if use_cache:
+            cached = await asyncio.gather(*(search_result_cache.get(self.org_id, self.db_name, self.embedder.model, query) for query in queries))
+            pending = []
+            for query, (query_results, generation) in zip(queries, cached):
+                generations[query.query] = generation
+                if query_results is None:
+                    pending.append(query)
+                else:
+                    yield query.query, query_results
+            self.logger.info(f"Search result cache hits for {len(queries) - len(pending)} of {len(queries)} queries")
+        if not pending:
+            return
+
+        embeddings = await query_embedding_cache.get_or_embed_many(
+            self.embedder.model, [query.query for query in pending], self.embedder.embed_queries
+        )
+        semaphore = asyncio.Semaphore(BATCH_QUERY_CONCURRENCY)
+
+        async def search(query: SearchQuery) -> Tuple[str, List[SearchResult]]:
+            async with semaphore:
+                query_results = await self._handle_query_embedding(query, embeddings[query.query])
+            await self._cache_results(generations.get(query.query), query, query_results)
+            return query.query, query_results
+
+        tasks = [asyncio.create_task(search(query)) for query in pending]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _cache_results(self, generation: Optional[int], query: SearchQuery, results: List[SearchResult]):
+        """Cache results under generation, unless they came from a per-process index that may lag other processes' writes"""
+        if generation is None or not await serves_current_results(self.db_name, query):
+            return
+        await search_result_cache.set(self.org_id, self.db_name, self.embedder.model, generation, query, results)
+
+    @staticmethod
+    def _dedupe_results(results: Dict[str, List[SearchResult]]) -> Dict[str, List[SearchResult]]:
+        """Keep each chunk only under the query that scored it highest (the earliest query on ties)"""
+        best: Dict[str, tuple] = {}
+        for query, query_results in results.items():
+            for result in query_results:
+                if result.id not in best or result.score > best[result.id][1]:
+                    best[result.id] = (query, result.score)
+        return {query: [result for result in query_results if best[result.id][0] == query] for query, query_results in results.items()}
+
+    async def _handle_query_embedding(self, query: SearchQuery, query_embedding: Optional[List[float]] = None):
+        try:
+            if query.hybrid:
+                return await self._handle_hybrid_query(query, query_embedding)
+            return await self._vector_search(query, query_embedding)
         except Exception as e:
             self.logger.error(f"Failed to get query embedding: {e}")
             raise e
 
-    async def _handle_document_chunks(self, body: RagDocumentCreate, chunks: List[Document]):
+    async def _vector_search(self, query: SearchQuery, query_embedding: Optional[List[float]] = None) -> List[SearchResult]:
+        if query_embedding is None:
+            self.logger.info(f"Generating query embedding for by gemini {query.query}")
+
+            query_embedding = await query_embedding_cache.get_or_embed(self.embedder.model, query.query, self.embedder.embed_query)
+
+            self.logger.info(f"Generated query embedding for by gemini {query.query}")
+        if query.rerank:
+            return await self._reranked_vector_search(query, query_embedding)
+        return await self.embedder_document_service.search_embedded_documents(query_embedding, query)
+
+    async def _reranked_vector_search(self, query: SearchQuery, query_embedding: List[float]) -> List[SearchResult]:
+        """Vector search over a larger candidate set, collapsing adjacent overlapping chunks and diversifying with MMR"""
+        candidate_query = query.model_copy(update={"limit": min(max(query.limit * RERANK_CANDIDATE_FACTOR, RERANK_MIN_CANDIDATES), 10000)})
+        documents = await self.embedder_document_service.search_candidate_documents(query_embedding, candidate_query)
+        reranked = rerank_documents(documents, query_embedding, query.limit, query.mmr_lambda)
+        self.logger.info(f"Re-ranked {len(documents)} candidates to {len(reranked)} results for {query.query}")
+        return [to_search_result(document, query) for document in reranked]
+
+    async def _handle_hybrid_query(self, query: SearchQuery, query_embedding: Optional[List[float]] = None) -> List[SearchResult]:
+        """Run BM25 and vector retrieval concurrently and fuse their rankings with reciprocal rank fusion"""
+        candidate_query = query.model_copy(update={"limit": max(query.limit, HYBRID_CANDIDATES)})
+        vector_results, lexical_results = await asyncio.gather(
+            self._vector_search(candidate_query, query_embedding),
+            self.embedder_document_service.lexical_search_embedded_documents(candidate_query),
+        )
+        self.logger.info(f"Fusing {len(vector_results)} vector and {len(lexical_results)} lexical results for {query.query}")
+
+        results = {result.id: result for result in lexical_results}
+        results.update((result.id, result) for result in vector_results)
+        fused = reciprocal_rank_fusion([[result.id for result in vector_results], [result.id for result in lexical_results]])
+        return [results[result_id].model_copy(update={"score": score}) for result_id, score in fused[:query.limit]]
+
+    async def _handle_document_chunks(self, body: RagDocumentCreate, chunks: AsyncIterator[List[Document]], progress_callback: Optional[ProgressCallback] = None) -> IngestionResult:
         try:
-            self.logger.info(f"Generating embedding for chunks and Storing in DB, TOtal Chunks: {len(chunks)}", )
-            for i, chunk in enumerate(chunks):
-                try:
-                    self.logger.info(f"Generating embedding for chunk {i}")
-                    embeddings: List[float] = await self.embedder.langchain_generate_embedding_by_gemini(chunk)
-                    metadata: EmbeddedDocumentMetadata = EmbeddedDocumentMetadata()
-                    if body.metadata:
-                        metadata.org_id = body.metadata.org_id
-
-                    rag_data: EmbeddedDocumentCreate = EmbeddedDocumentCreate(
-                        title=body.title,
-                        content=chunk.page_content,
-                        chunk_number=i,
-                        category=body.category,
-                        metadata=metadata,
-                        embeddings=embeddings,
-                    )
-
-                    await self.embedder_document_service.store_embedded_document(rag_data)
-                except Exception as e:
-                    self.logger.error(f"Failed to generate embedding for chunk {i}: {e}")
+            self.logger.info("Generating embedding for chunks and Storing in DB")
+            pipeline = IngestionPipeline(self.embedder, self.embedder_document_service, self.embedding_cache_service, progress_callback)
+            result = await pipeline.run(body, chunks)
+            if result.inserted_count or result.deleted_count:
+                # New and deleted chunks can change any search result of this tenant
+                await search_result_cache.bump_generation(self.org_id, self.db_name)
+            return result
         except Exception as e:
             self.logger.error(f"Failed to create documents: {e}")
             raise e
@@ -1,8 +1,13 @@
+import asyncio
 import os
 import uuid
-from langchain_community.document_loaders import TextLoader, PyMuPDFLoader
+from collections import deque
+from typing import AsyncIterator, Deque, Iterable, Iterator, List
+import pymupdf
+from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from app.core.utils.s3 import download_file_from_s3, delete_file_from_local
+from app.core.config.executors import CPU_PROCESS_POOL_SIZE, executor_manager
+from app.core.utils.s3 import delete_file_from_local
 from app.utils.logger import logger
 
 TEMP_DIR = "/tmp/rag_uploads"
@@ -10,49 +15,102 @@ os.makedirs(TEMP_DIR, exist_ok=True)
 
 CHUNK_SIZE = int((os.getenv("CHUNK_SIZE")) or 1000)
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP") or 200)
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK") or 20)
+PDF_PARSE_MAX_PARALLEL = int(os.getenv("PDF_PARSE_MAX_PARALLEL") or CPU_PROCESS_POOL_SIZE)
 
 
-def load_and_split_from_s3(s3_key: str, filename: str):
+async def iter_chunk_batches_from_bytes(file_data: bytes, filename: str) -> AsyncIterator[List[Document]]:
     """
-    Load a document from S3, convert content to lowercase,
-    split it into individual pages, and return the pages as a list of strings.
+    Parse an uploaded document without fetching it back from S3 and yield its chunks in page order.
+
+    PDFs are spooled to local disk once and parsed in page ranges on the process pool, so parsing
+    neither blocks the event loop nor holds more than a few ranges of pages in memory.
     """
+    file_ext = filename.lower()
+    if file_ext.endswith(".txt"):
+        yield await executor_manager.run_cpu(split_text, file_data, filename)
+        return
+    if not file_ext.endswith(".pdf"):
+        raise ValueError("Unsupported file type")
+
+    local_path = await executor_manager.run_io(write_file_to_local, file_data, filename)
     try:
-        # Create full local path including the filename
-        local_path = os.path.join(TEMP_DIR, f"{uuid.uuid4()}-{filename}")
-        logger.info(f"Downloading {s3_key} to {local_path}")
+        async for chunks in iter_pdf_chunk_batches(local_path, filename):
+            yield chunks
+    finally:
+        await executor_manager.run_io(delete_file_from_local, local_path)
 
-        download_file_from_s3(s3_key, local_path)
 
-        logger.info(f"Downloaded {s3_key} to {local_path}")
+async def iter_pdf_chunk_batches(local_path: str, filename: str) -> AsyncIterator[List[Document]]:
+    """
+    Split a PDF into page ranges, extract and chunk up to PDF_PARSE_MAX_PARALLEL ranges at once
+    on the process pool, and yield each range's chunks in page order.
 
-        file_ext = filename.lower()
-        if file_ext.endswith(".pdf"):
-            loader = PyMuPDFLoader(local_path)
-        elif file_ext.endswith(".txt"):
-            loader = TextLoader(local_path)
-        else:
-            raise ValueError("Unsupported file type")
+    Pages are chunked independently, so the output (and every chunk_number assigned downstream)
+    is identical to a sequential parse whatever the range size or degree of parallelism.
+    """
+    page_count = await executor_manager.run_io(count_pdf_pages, local_path)
+    logger.info(f"Splitting {filename} ({page_count} pages) into chunks of {CHUNK_SIZE} tokens with {CHUNK_OVERLAP} overlap")
 
-        logger.info(f"Splitting {s3_key} into chunks of {CHUNK_SIZE} tokens with {CHUNK_OVERLAP} overlap")
+    page_ranges = iter([(start, min(start + PDF_PAGES_PER_TASK, page_count)) for start in range(0, page_count, PDF_PAGES_PER_TASK)])
+    in_flight: Deque[asyncio.Future] = deque()
 
-        docs = loader.load()
+    def schedule_next():
+        page_range = next(page_ranges, None)
+        if page_range is not None:
+            in_flight.append(asyncio.ensure_future(executor_manager.run_cpu(split_pdf_page_range, local_path, filename, *page_range)))
 
-        # Convert content to lowercase
-        for doc in docs:
-            doc.page_content = doc.page_content.lower()
+    try:
+        for _ in range(PDF_PARSE_MAX_PARALLEL):
+            schedule_next()
+        while in_flight:
+            chunks = await in_flight.popleft()
+            # Keep the pool busy while the consumer handles this range
+            schedule_next()
+            yield chunks
+    finally:
+        for future in in_flight:
+            future.cancel()
 
-        splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
-        chunks = splitter.split_documents(docs)
 
-        logger.info(f"Split {s3_key} into {len(chunks)} chunks")
+def write_file_to_local(file_data: bytes, filename: str) -> str:
+    local_path = os.path.join(TEMP_DIR, f"{uuid.uuid4()}-{filename}")
+    with open(local_path, "wb") as f:
+        f.write(file_data)
+    return local_path
+
+
+def count_pdf_pages(local_path: str) -> int:
+    with pymupdf.open(local_path) as doc:
+        return doc.page_count
 
-        for chunk in chunks:
-            chunk.metadata["source"] = filename
 
-        delete_file_from_local(local_path)
-        return chunks
+def split_pdf_page_range(local_path: str, filename: str, start: int, end: int) -> List[Document]:
+    """
+    Extract pages [start, end) of a PDF and split them into chunks.
+    Runs in a worker process; page text matches what PyMuPDFLoader produces.
+    """
+    with pymupdf.open(local_path) as doc:
+        pages = [
+            Document(page_content=doc[page_number].get_text().strip(), metadata={"source": filename, "page": page_number, "total_pages": doc.page_count})
+            for page_number in range(start, end)
+        ]
+    return list(split_documents(pages, filename))
+
+
+def split_text(file_data: bytes, filename: str) -> List[Document]:
+    return list(split_documents([Document(page_content=file_data.decode("utf-8"), metadata={"source": filename})], filename))
+
 
-    except Exception as e:
-        logger.error(f"Failed to load and split {s3_key}: {e}")
-        raise e
+def split_documents(docs: Iterable[Document], filename: str) -> Iterator[Document]:
+    """
+    Lowercase and split pages into chunks as they arrive. Pages are split independently,
+    exactly as RecursiveCharacterTextSplitter.split_documents does for a list of pages.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    for doc in docs:
+        # Convert content to lowercase
+        doc.page_content = doc.page_content.lower()
+        for chunk in splitter.split_documents([doc]):
+            chunk.metadata["source"] = filename
+            yield chunk
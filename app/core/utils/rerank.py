@@ -0,0 +1,66 @@
+from typing import Any, List, Mapping, Sequence
+
+import numpy as np
+
+from app.core.utils.vector_codec import decode_embedding
+
+
+def adjacent_duplicates(titles: Sequence[Any], chunk_numbers: Sequence[Any], scores: np.ndarray) -> np.ndarray:
+    """
+    Mask of chunks that sit next to a better-scoring chunk of the same document (same title,
+    chunk_number one apart). Consecutive chunks share CHUNK_OVERLAP characters, so only the best of
+    each run of neighbours is kept. Chunks without a chunk_number are never collapsed.
+    """
+    _, title_codes = np.unique(np.array([str(title) for title in titles]), return_inverse=True)
+    numbered = np.array([chunk_number is not None for chunk_number in chunk_numbers])
+    numbers = np.array([chunk_number if chunk_number is not None else 0 for chunk_number in chunk_numbers], dtype=np.int64)
+    # Ties go to the earlier candidate
+    order = np.arange(len(scores))
+    better = (scores[None, :] > scores[:, None]) | ((scores[None, :] == scores[:, None]) & (order[None, :] < order[:, None]))
+    neighbours = (title_codes[:, None] == title_codes[None, :]) & (np.abs(numbers[:, None] - numbers[None, :]) == 1) & numbered[:, None] & numbered[None, :]
+    return (neighbours & better).any(axis=1)
+
+
+def maximal_marginal_relevance(query_vector: np.ndarray, vectors: np.ndarray, limit: int, mmr_lambda: float) -> List[int]:
+    """
+    Greedy MMR over unit vectors: each step picks the row maximising
+    mmr_lambda * sim(query, row) - (1 - mmr_lambda) * max sim(row, picked rows),
+    so mmr_lambda 1.0 ranks by relevance alone.
+    The similarity matrix is computed once; each step is an O(n) vector update.
+    """
+    count = len(vectors)
+    if not count:
+        return []
+    relevance = vectors @ query_vector
+    similarities = vectors @ vectors.T
+    redundancy = np.full(count, -np.inf, dtype=np.float32)
+    available = np.ones(count, dtype=bool)
+    picked: List[int] = []
+    for _ in range(min(limit, count)):
+        marginal = mmr_lambda * relevance - (1.0 - mmr_lambda) * redundancy if picked else relevance.copy()
+        marginal[~available] = -np.inf
+        best = int(np.argmax(marginal))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarities[best], out=redundancy)
+    return picked
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def rerank_documents(documents: List[Mapping[str, Any]], query_embedding: List[float], limit: int, mmr_lambda: float) -> List[Mapping[str, Any]]:
+    """
+    Collapse adjacent overlapping chunks, then order the rest by MMR and keep limit of them.
+    documents are best-first search candidates with their stored embedding, title, chunk_number and score.
+    """
+    if not documents:
+        return []
+    scores = np.array([document["score"] for document in documents], dtype=np.float32)
+    keep = ~adjacent_duplicates([document.get("title") for document in documents], [document.get("chunk_number") for document in documents], scores)
+    candidates = [document for document, kept in zip(documents, keep) if kept]
+    vectors = _unit_rows(np.stack([decode_embedding(document) for document in candidates]))
+    query_vector = _unit_rows(np.asarray(query_embedding, dtype=np.float32))
+    return [candidates[row] for row in maximal_marginal_relevance(query_vector, vectors, limit, mmr_lambda)]
@@ -0,0 +1,39 @@
+import json
+from typing import AsyncIterator, Literal
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.utils.logger import logger
+
+STREAM_FORMAT_NDJSON = "ndjson"
+STREAM_FORMAT_SSE = "sse"
+StreamFormat = Literal["ndjson", "sse"]
+STREAM_MEDIA_TYPES = {STREAM_FORMAT_NDJSON: "application/x-ndjson", STREAM_FORMAT_SSE: "text/event-stream"}
+
+
+def _frame(data: str, stream_format: str, event: str = "") -> str:
+    if stream_format == STREAM_FORMAT_SSE:
+        return f"event: {event}\ndata: {data}\n\n" if event else f"data: {data}\n\n"
+    return f"{data}\n"
+
+
+def stream_response(items: AsyncIterator[BaseModel], stream_format: StreamFormat) -> StreamingResponse:
+    """
+    Stream items as NDJSON lines or server-sent events as they are produced. Headers are already
+    sent when an item fails, so the failure is reported as a final {"error": ...} record
+    (an "error" event for SSE). SSE streams end with an "end" event.
+    """
+    async def body():
+        try:
+            async for item in items:
+                yield _frame(item.model_dump_json(), stream_format)
+        except Exception as e:
+            logger.error(f"Failed while streaming response: {e}")
+            yield _frame(json.dumps({"error": str(e)}), stream_format, event="error")
+            return
+        if stream_format == STREAM_FORMAT_SSE:
+            yield _frame("{}", stream_format, event="end")
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(body(), media_type=STREAM_MEDIA_TYPES[stream_format], headers=headers)
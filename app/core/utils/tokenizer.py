@@ -0,0 +1,33 @@
+import hashlib
+import re
+from collections import Counter
+from typing import Dict, List
+
+# Alphanumeric runs, joined by -, _, . or / so identifiers such as "ab-1234" or "v2.1" stay one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+TOKEN_SEPARATORS = re.compile(r"[-_./]")
+MAX_TOKEN_LENGTH = 64
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased lexical tokens of text. Compound identifiers are kept whole and also split into
+    their parts, so a query for "ab-1234" matches exactly while "1234" alone still matches.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if len(token) > MAX_TOKEN_LENGTH:
+            continue
+        tokens.append(token)
+        if TOKEN_SEPARATORS.search(token):
+            tokens.extend(part for part in TOKEN_SEPARATORS.split(token) if part)
+    return tokens
+
+
+def term_frequencies(text: str) -> Dict[str, int]:
+    return dict(Counter(tokenize(text)))
+
+
+def term_hash(term: str) -> int:
+    """Stable signed 64-bit hash of a term, so indexes can key postings by integer"""
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little", signed=True)
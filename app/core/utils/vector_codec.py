@@ -0,0 +1,75 @@
+import os
+from typing import Any, Dict, List, Mapping, Tuple, Union
+
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype, VECTOR_SUBTYPE
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STORAGE_MODE_FLOAT64 = "float64"
+STORAGE_MODE_FLOAT32 = "float32"
+STORAGE_MODE_INT8 = "int8"
+STORAGE_MODES = (STORAGE_MODE_FLOAT64, STORAGE_MODE_FLOAT32, STORAGE_MODE_INT8)
+
+EMBEDDING_STORAGE_MODE = (os.getenv("EMBEDDING_STORAGE_MODE") or STORAGE_MODE_FLOAT64).lower()
+if EMBEDDING_STORAGE_MODE not in STORAGE_MODES:
+    raise Exception(f"EMBEDDING_STORAGE_MODE must be one of {STORAGE_MODES}")
+
+EMBEDDING_FIELD = "embeddings"
+EMBEDDING_SCALE_FIELD = "embeddings_scale"
+EMBEDDING_OFFSET_FIELD = "embeddings_offset"
+
+# BSON vector header: one dtype byte and one padding byte before the packed values
+VECTOR_HEADER_SIZE = 2
+VECTOR_NUMPY_DTYPES = {
+    BinaryVectorDtype.FLOAT32.value: np.dtype("<f4"),
+    BinaryVectorDtype.INT8.value: np.dtype("i1"),
+}
+
+
+def quantize_int8(embedding: Union[List[float], np.ndarray]) -> Tuple[np.ndarray, float, float]:
+    """
+    Symmetric per-vector scalar quantization: value ~= q * scale + offset with offset 0.
+    Keeping the offset at 0 preserves vector direction, so cosine similarity on the raw int8
+    values (as Atlas computes it) stays close to the float result.
+    """
+    vector = np.asarray(embedding, dtype=np.float32)
+    max_abs = float(np.max(np.abs(vector))) if vector.size else 0.0
+    scale = max_abs / 127.0 if max_abs > 0 else 1.0
+    quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return quantized, scale, 0.0
+
+
+def encode_embedding(embedding: List[float], mode: str = EMBEDDING_STORAGE_MODE) -> Dict[str, Any]:
+    """Return the document fields that store embedding in the given storage mode"""
+    if mode == STORAGE_MODE_FLOAT32:
+        return {EMBEDDING_FIELD: Binary.from_vector(np.asarray(embedding, dtype=np.float32).tolist(), BinaryVectorDtype.FLOAT32)}
+    if mode == STORAGE_MODE_INT8:
+        quantized, scale, offset = quantize_int8(embedding)
+        return {
+            EMBEDDING_FIELD: Binary.from_vector(quantized.tolist(), BinaryVectorDtype.INT8),
+            EMBEDDING_SCALE_FIELD: scale,
+            EMBEDDING_OFFSET_FIELD: offset,
+        }
+    return {EMBEDDING_FIELD: [float(value) for value in embedding]}
+
+
+def encode_query_vector(embedding: List[float], mode: str = EMBEDDING_STORAGE_MODE) -> Union[List[float], Binary]:
+    """Encode a query vector to match the indexed field's type for $vectorSearch"""
+    return encode_embedding(embedding, mode)[EMBEDDING_FIELD]
+
+
+def decode_embedding(document: Mapping[str, Any]) -> np.ndarray:
+    """Decode the stored embedding of a document, whatever its storage mode, to a float32 vector"""
+    value = document[EMBEDDING_FIELD]
+    if isinstance(value, Binary) and value.subtype == VECTOR_SUBTYPE:
+        raw = bytes(value)
+        dtype = VECTOR_NUMPY_DTYPES.get(raw[:1])
+        if dtype is None:
+            raise ValueError("Unsupported binary vector dtype")
+        vector = np.frombuffer(raw, dtype=dtype, offset=VECTOR_HEADER_SIZE).astype(np.float32)
+        if dtype == np.int8:
+            vector = vector * np.float32(document.get(EMBEDDING_SCALE_FIELD, 1.0)) + np.float32(document.get(EMBEDDING_OFFSET_FIELD, 0.0))
+        return vector
+    return np.asarray(value, dtype=np.float32)
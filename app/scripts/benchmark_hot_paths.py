@@ -0,0 +1,690 @@
+"""
+Throughput and latency of the ingestion and query hot paths, without S3, Gemini or (by default)
+a Mongo / Redis server.
+
+    python -m app.scripts.benchmark_hot_paths --output before.json
+    python -m app.scripts.benchmark_hot_paths --only split,ingest --pages 200 --embed-latency-ms 80
+    python -m app.scripts.benchmark_hot_paths --configured-stores --output local-mongo.json
+
+Measured:
+    split   iter_chunk_batches_from_bytes, the upload path, on a synthetic PDF and TXT (pages/s,
+            chunks/s); PDF page ranges are parsed on the process pool
+    ingest  RagService._handle_document_chunks end to end for a new document, then a re-upload of
+            the same document (every chunk unchanged)
+    search  EmbeddedDocumentService.search_embedded_documents over a synthetic corpus
+    query_under_ingest
+            /rag/query latency (p50/p95/p99) idle and while a large PDF upload is ingested
+    query_throughput
+            /rag/query requests/s with the app-scoped embedding service and with a new embedding
+            client per request
+    crud    the prompt and tool routes, called in-process through the ASGI app
+
+S3 is an in-memory stand-in and embeddings come from a deterministic fake provider that sleeps
+--embed-latency-ms per call. Mongo and Redis are in-memory stand-ins (mongomock on threads of its
+own, fakeredis) unless --configured-stores points the run at MONGODB_URI and REDIS_URL, e.g. a
+local mongod; the stand-ins are good for relative comparisons between commits, not for absolute
+database latency. The Mongo stand-in shares the interpreter lock with the app, so its inserts
+still slow concurrent queries down; query_under_ingest's loop_lag figures, how late the event
+loop wakes a 10 ms sleeper, are what the app itself adds while ingesting.
+The JSON report carries the git commit, so reports of two commits can be diffed directly.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+import pymupdf
+from langchain_core.documents import Document
+
+from app.core.config.executors import executor_manager
+from app.core.splitter import text_splitter
+from app.core.utils import s3 as s3_utils
+from app.utils.logger import logger
+
+BENCHMARKS = ["split", "ingest", "search", "query_under_ingest", "query_throughput", "crud"]
+MONGO_STAND_IN_THREADS = 4
+WORDS = ("shipping refund invoice warranty account delivery order payment return policy customer support "
+         "tracking package address billing discount subscription cancel exchange product service").split()
+
+
+class InMemoryS3Client:
+    """The subset of the boto3 S3 client used by app.core.utils.s3, backed by a dict"""
+
+    def __init__(self):
+        self.objects: Dict[str, bytes] = {}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs):
+        self.objects[Key] = Body
+
+    def upload_fileobj(self, Fileobj, Bucket: str, Key: str, ExtraArgs: Dict[str, Any] = None):
+        self.objects[Key] = Fileobj.read()
+
+    def download_file(self, Bucket: str, Key: str, Filename: str):
+        if Key not in self.objects:
+            raise FileNotFoundError(f"No object {Key} in the in-memory bucket")
+        with open(Filename, "wb") as output:
+            output.write(self.objects[Key])
+
+
+class FakeEmbeddingService:
+    """
+    Deterministic EmbeddingProvider stand-in: vectors are seeded by the text, and every
+    provider call sleeps latency seconds, as one network round trip would.
+    """
+
+    def __init__(self, dimensions: int, latency: float):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.task_type = "retrieval_document"
+        self.model = f"benchmark-fake-{dimensions}"
+        self.calls = 0
+
+    def vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    async def _call(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [self.vector(text) for text in texts]
+
+    async def embed_document(self, document: Document) -> List[float]:
+        return (await self._call([document.page_content]))[0]
+
+    async def embed_documents(self, documents: List[Document]) -> List[List[float]]:
+        return await self._call([document.page_content for document in documents])
+
+    async def embed_query(self, query: str) -> List[float]:
+        return (await self._call([query]))[0]
+
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        return await self._call(queries)
+
+
+class PerRequestEmbeddingService(FakeEmbeddingService):
+    """
+    The embedding service as routes used it before it was app-scoped: every request builds a new
+    GoogleGenerativeAIEmbeddings client, whose first call pays connect_latency seconds for setting
+    up its channel. Vectors still come from the fake provider.
+    """
+
+    def __init__(self, dimensions: int, latency: float, connect_latency: float):
+        super().__init__(dimensions, latency)
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        from pydantic import SecretStr
+
+        self.client = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", google_api_key=SecretStr("benchmark"), task_type=self.task_type)
+        self.connect_latency = connect_latency
+
+    async def _call(self, texts: List[str]) -> List[List[float]]:
+        if self.calls == 0:
+            await asyncio.sleep(self.connect_latency)
+        return await super()._call(texts)
+
+
+class InMemoryMongoClient:
+    """
+    The subset of the Motor client API the app uses, over a mongomock client whose calls run on
+    threads of their own: like a Mongo server, the stand-in works off the event loop and serves a
+    query while an insert is in progress (mongomock's store takes a reader-writer lock).
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=MONGO_STAND_IN_THREADS, thread_name_prefix="mongo-stand-in")
+
+    async def run(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    def __getitem__(self, db_name: str) -> "InMemoryMongoDatabase":
+        return InMemoryMongoDatabase(self, self.client[db_name])
+
+    async def drop_database(self, db_name: str):
+        await self.run(self.client.drop_database, db_name)
+
+
+class InMemoryMongoDatabase:
+    def __init__(self, server: InMemoryMongoClient, database):
+        self.server = server
+        self.database = database
+
+    def __getitem__(self, collection_name: str) -> "InMemoryMongoCollection":
+        return InMemoryMongoCollection(self.server, self.database[collection_name])
+
+
+class InMemoryMongoCollection:
+    def __init__(self, server: InMemoryMongoClient, collection):
+        self.server = server
+        self.collection = collection
+
+    def find(self, *args, **kwargs) -> "InMemoryMongoCursor":
+        return InMemoryMongoCursor(self.server, lambda: self.collection.find(*args, **kwargs))
+
+    def aggregate(self, pipeline, **kwargs) -> "InMemoryMongoCursor":
+        return InMemoryMongoCursor(self.server, lambda: self.collection.aggregate(pipeline, **kwargs))
+
+    def __getattr__(self, name: str):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            return await self.server.run(method, *args, **kwargs)
+        return call
+
+
+class InMemoryMongoCursor:
+    """Records cursor options and reads the whole result on the stand-in's thread when first iterated"""
+
+    def __init__(self, server: InMemoryMongoClient, open_cursor):
+        self.server = server
+        self.open_cursor = open_cursor
+        self.options: List[Tuple[str, tuple]] = []
+
+    def __getattr__(self, name: str):
+        if name not in ("sort", "limit", "skip", "batch_size"):
+            raise AttributeError(name)
+
+        def chain(*args):
+            self.options.append((name, args))
+            return self
+        return chain
+
+    def _read(self) -> List[Dict[str, Any]]:
+        cursor = self.open_cursor()
+        for name, args in self.options:
+            if name != "batch_size":
+                cursor = getattr(cursor, name)(*args)
+        return list(cursor)
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        documents = await self.server.run(self._read)
+        return documents if length is None else documents[:length]
+
+    async def __aiter__(self):
+        for document in await self.to_list():
+            yield document
+
+
+def install_in_memory_stores():
+    """
+    Swap the Mongo and Redis clients for in-memory stand-ins. Services bind mongo_client when their
+    module is imported, so this runs before any of them is imported.
+    """
+    try:
+        import fakeredis
+        import mongomock
+    except ImportError as e:
+        raise SystemExit(f"In-memory stores need mongomock and fakeredis ({e}); pip install mongomock fakeredis, or pass --configured-stores")
+
+    os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+    os.environ.setdefault("REDIS_URL", "redis://localhost:6379")
+    from app.core.config import mongodb
+    from app.core.config.redis import redis_manager
+
+    mongodb.mongo_client = InMemoryMongoClient(mongomock.MongoClient())
+    server = fakeredis.FakeServer()
+    redis_manager.redis_client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    redis_manager.binary_client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=False)
+
+
+def synthetic_pages(pages: int, page_chars: int, seed: int) -> List[str]:
+    rng = np.random.default_rng(seed)
+    texts = []
+    for page in range(pages):
+        words = rng.choice(WORDS, page_chars // 7)
+        # A page-specific token keeps chunks of different pages and seeds distinct
+        texts.append(f"page {seed}-{page} " + " ".join(words))
+    return texts
+
+
+def synthetic_pdf(texts: List[str]) -> bytes:
+    with pymupdf.open() as doc:
+        for text in texts:
+            page = doc.new_page()
+            page.insert_textbox(pymupdf.Rect(36, 36, page.rect.width - 36, page.rect.height - 36), text, fontsize=7)
+        return doc.tobytes()
+
+
+def _latency_stats(latencies: List[float]) -> Dict[str, float]:
+    milliseconds = np.array(latencies) * 1000
+    return {
+        "mean_ms": float(np.mean(milliseconds)),
+        "p50_ms": float(np.percentile(milliseconds, 50)),
+        "p95_ms": float(np.percentile(milliseconds, 95)),
+        "p99_ms": float(np.percentile(milliseconds, 99)),
+    }
+
+
+def _throughput(pages: int, chunks: int, size: int, seconds: List[float]) -> Dict[str, Any]:
+    """Rates over the median of the repeated runs"""
+    median = float(np.median(seconds))
+    return {
+        "pages": pages,
+        "chunks": chunks,
+        "bytes": size,
+        "median_seconds": median,
+        "pages_per_s": pages / median,
+        "chunks_per_s": chunks / median,
+        "megabytes_per_s": size / median / 1e6,
+    }
+
+
+async def benchmark_split(args) -> Dict[str, Any]:
+    texts = synthetic_pages(args.pages, args.page_chars, args.seed)
+    pdf_data = synthetic_pdf(texts)
+    txt_data = "\n\n".join(texts).encode("utf-8")
+
+    report: Dict[str, Any] = {}
+    for name, filename, data, pages in (("upload_pdf", "benchmark.pdf", pdf_data, args.pages), ("upload_txt", "benchmark.txt", txt_data, 1)):
+        seconds = []
+        for _ in range(args.repeat):
+            started_at = time.perf_counter()
+            chunks = [chunk async for batch in text_splitter.iter_chunk_batches_from_bytes(data, filename) for chunk in batch]
+            seconds.append(time.perf_counter() - started_at)
+        report[name] = _throughput(pages, len(chunks), len(data), seconds)
+    return report
+
+
+async def _chunk_batches(chunks: List[Document]) -> AsyncIterator[List[Document]]:
+    """Chunks grouped by page range, as iter_pdf_chunk_batches yields them; copies, since ingestion edits metadata"""
+    batch: List[Document] = []
+    for chunk in chunks:
+        if batch and chunk.metadata["page"] // text_splitter.PDF_PAGES_PER_TASK != batch[-1].metadata["page"] // text_splitter.PDF_PAGES_PER_TASK:
+            yield batch
+            batch = []
+        batch.append(chunk.model_copy(deep=True))
+    if batch:
+        yield batch
+
+
+async def benchmark_ingest(args, embedder: FakeEmbeddingService) -> Dict[str, Any]:
+    from app.core.schema.rag_schema import RagDocumentCreate, RagMetadata
+    from app.core.service.rag.rag_service import RagService
+
+    service = RagService(args.org_id, args.db_name, embedder)
+    runs = []
+    for run in range(args.repeat):
+        # Distinct text per run, so neither the embedding cache nor the chunk diff skips any work
+        texts = synthetic_pages(args.ingest_pages, args.page_chars, args.seed + 1000 + run)
+        chunks = list(text_splitter.split_documents([Document(page_content=text, metadata={"page": page}) for page, text in enumerate(texts)], "benchmark.pdf"))
+        body = RagDocumentCreate(title=f"benchmark {run}", document_id=f"benchmark-{run}", metadata=RagMetadata(org_id=args.org_id))
+
+        entry: Dict[str, Any] = {"chunks": len(chunks)}
+        for phase in ("new_document", "unchanged_reupload"):
+            calls = embedder.calls
+            started_at = time.perf_counter()
+            result = await service._handle_document_chunks(body, _chunk_batches(chunks))
+            seconds = time.perf_counter() - started_at
+            entry[phase] = {
+                "seconds": seconds,
+                "chunks_per_s": len(chunks) / seconds,
+                "embedding_calls": embedder.calls - calls,
+                "inserted": result.inserted_count,
+                "unchanged": result.unchanged_count,
+                "failed": len(result.failed_chunk_numbers),
+            }
+        runs.append(entry)
+
+    return {
+        "pages": args.ingest_pages,
+        "embed_latency_ms": args.embed_latency_ms,
+        "median_chunks_per_s": {phase: float(np.median([run[phase]["chunks_per_s"] for run in runs])) for phase in ("new_document", "unchanged_reupload")},
+        "runs": runs,
+    }
+
+
+async def _store_search_corpus(args, service) -> float:
+    """Store args.search_documents chunks with random unit embeddings through service; returns the seconds taken"""
+    from app.core.schema.embedded_document_schema import EmbeddedDocumentCreate, EmbeddedDocumentMetadata
+
+    metadata = EmbeddedDocumentMetadata(org_id=args.org_id)
+    rng = np.random.default_rng(args.seed)
+    started_at = time.perf_counter()
+    for start in range(0, args.search_documents, 1000):
+        count = min(1000, args.search_documents - start)
+        vectors = rng.standard_normal((count, args.dimensions)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        await service.store_embedded_documents([
+            EmbeddedDocumentCreate(title=f"search {(start + row) // 100}", content=" ".join(rng.choice(WORDS, 40)), chunk_number=(start + row) % 100,
+                                   embeddings=vector.tolist(), metadata=metadata)
+            for row, vector in enumerate(vectors)
+        ])
+    return time.perf_counter() - started_at
+
+
+async def benchmark_search(args, embedder: FakeEmbeddingService) -> Dict[str, Any]:
+    from app.core.schema.embedded_document_schema import EmbeddedDocumentMetadata, SearchQuery
+    from app.core.service.embedded_document import search_backend
+    from app.core.service.embedded_document.embedded_document_service import EmbeddedDocumentService
+
+    search_backend.SEARCH_BACKEND = args.search_backend
+    service = EmbeddedDocumentService(org_id=args.org_id, db_name=f"{args.db_name}_search")
+    metadata = EmbeddedDocumentMetadata(org_id=args.org_id)
+    load_seconds = await _store_search_corpus(args, service)
+
+    queries = [SearchQuery(query=f"benchmark query {number}", limit=args.k, metadata=metadata) for number in range(args.queries)]
+    query_embeddings = [embedder.vector(query.query) for query in queries]
+
+    # The first query also loads the backend's in-process index, if it has one
+    started_at = time.perf_counter()
+    await service.search_embedded_documents(query_embeddings[0], queries[0])
+    first_query_seconds = time.perf_counter() - started_at
+
+    latencies = []
+    for query, query_embedding in zip(queries, query_embeddings):
+        started_at = time.perf_counter()
+        results = await service.search_embedded_documents(query_embedding, query)
+        latencies.append(time.perf_counter() - started_at)
+        if len(results) != min(args.k, args.search_documents):
+            raise RuntimeError(f"Search returned {len(results)} results, expected {args.k}")
+
+    return {
+        "backend": args.search_backend,
+        "documents": args.search_documents,
+        "dimensions": args.dimensions,
+        "k": args.k,
+        "queries": args.queries,
+        "store_seconds": load_seconds,
+        "first_query_ms": first_query_seconds * 1000,
+        **_latency_stats(latencies),
+    }
+
+
+async def _timed_request(client, latencies: Dict[str, List[float]], operation: str, method: str, url: str, **kwargs) -> Any:
+    started_at = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    latencies.setdefault(operation, []).append(time.perf_counter() - started_at)
+    body = response.json()
+    # The routes report failures as {"error": ...} with status 200
+    if response.status_code != 200 or (isinstance(body, dict) and "error" in body):
+        raise RuntimeError(f"{method} {url} failed with {response.status_code}: {body}")
+    return body
+
+
+@asynccontextmanager
+async def _registered_tenant(args, db_name: str):
+    """Map args.org_id to db_name in the tenant collection the *Api classes resolve, for the duration of a benchmark"""
+    from app.core.helper.db_info import delete_db_info, save_db_info
+
+    await save_db_info(args.org_id, db_name)
+    try:
+        yield
+    finally:
+        await delete_db_info(args.org_id)
+
+
+@asynccontextmanager
+async def _loop_lag(lags: List[float], interval: float = 0.01):
+    """Record how late the event loop wakes a sleeper, i.e. how long other callbacks held the loop"""
+    async def probe():
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - started_at - interval)
+
+    task = asyncio.create_task(probe())
+    try:
+        yield
+    finally:
+        task.cancel()
+
+
+async def _timed_query(client, args, latencies: List[float], number: int):
+    # Distinct query text per request, so neither the query embedding cache nor the result cache answers it
+    await _timed_request(client, {"query": latencies}, "query", "GET", f"/api/v1/r/{args.org_id}/rag/query",
+                         params={"query": f"benchmark query {number}", "limit": args.k, "no_cache": "true"})
+
+
+async def benchmark_query_under_ingest(args, embedder: FakeEmbeddingService) -> Dict[str, Any]:
+    """
+    /rag/query latency on an idle app, then while a large PDF is uploaded through the synchronous
+    generate-embedding route in the same process. Parsing, S3 and Mongo work off the event loop
+    keeps the during-ingest tail close to the idle one.
+    """
+    import httpx
+    from app.core.langchain.embedding import get_embedding_service
+    from app.core.main import app
+    from app.core.service.embedded_document import search_backend
+    from app.core.service.embedded_document.embedded_document_service import EmbeddedDocumentService
+
+    search_backend.SEARCH_BACKEND = args.search_backend
+    db_name = f"{args.db_name}_query"
+    await _store_search_corpus(args, EmbeddedDocumentService(org_id=args.org_id, db_name=db_name))
+    pdf_data = synthetic_pdf(synthetic_pages(args.load_pages, args.page_chars, args.seed + 2000))
+
+    async def app_embedder():
+        return embedder
+
+    app.dependency_overrides[get_embedding_service] = app_embedder
+    idle: List[float] = []
+    during: List[float] = []
+    idle_lag: List[float] = []
+    during_lag: List[float] = []
+    try:
+        async with _registered_tenant(args, db_name), httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None) as client:
+            # Warm up: tenant resolution and the backend's in-process index
+            await _timed_query(client, args, [], -1)
+            async with _loop_lag(idle_lag):
+                for number in range(args.queries):
+                    await _timed_query(client, args, idle, number)
+
+            started_at = time.perf_counter()
+            async with _loop_lag(during_lag):
+                upload = asyncio.create_task(_timed_request(
+                    client, {}, "upload", "POST", f"/api/v1/r/{args.org_id}/rag/generate-embedding",
+                    data={"body": json.dumps({"title": "benchmark load", "metadata": {"org_id": args.org_id}})},
+                    files={"file": ("benchmark-load.pdf", pdf_data, "application/pdf")},
+                ))
+                number = args.queries
+                while not upload.done():
+                    await _timed_query(client, args, during, number)
+                    number += 1
+                await upload
+            ingest_seconds = time.perf_counter() - started_at
+    finally:
+        app.dependency_overrides.pop(get_embedding_service, None)
+
+    idle_stats, during_stats = _latency_stats(idle), _latency_stats(during)
+    return {
+        "backend": args.search_backend,
+        "documents": args.search_documents,
+        "load_pages": args.load_pages,
+        "ingest_seconds": ingest_seconds,
+        "idle": {"queries": len(idle), **idle_stats, "loop_lag": {**_latency_stats(idle_lag), "max_ms": max(idle_lag) * 1000}},
+        "during_ingest": {"queries": len(during), **during_stats, "loop_lag": {**_latency_stats(during_lag), "max_ms": max(during_lag) * 1000}},
+        "p99_ratio": during_stats["p99_ms"] / idle_stats["p99_ms"],
+    }
+
+
+async def benchmark_query_throughput(args, embedder: FakeEmbeddingService) -> Dict[str, Any]:
+    """
+    /rag/query requests per second at --query-concurrency, with the app-scoped embedding service,
+    then with a new embedding client per request as the routes did before.
+    """
+    import httpx
+    from app.core.langchain.embedding import get_embedding_service
+    from app.core.main import app
+    from app.core.service.embedded_document import search_backend
+    from app.core.service.embedded_document.embedded_document_service import EmbeddedDocumentService
+
+    search_backend.SEARCH_BACKEND = args.search_backend
+    db_name = f"{args.db_name}_throughput"
+    await _store_search_corpus(args, EmbeddedDocumentService(org_id=args.org_id, db_name=db_name))
+
+    async def shared_embedder():
+        return embedder
+
+    async def per_request_embedder():
+        return PerRequestEmbeddingService(args.dimensions, args.embed_latency_ms / 1000, args.connect_latency_ms / 1000)
+
+    report: Dict[str, Any] = {"backend": args.search_backend, "documents": args.search_documents, "concurrency": args.query_concurrency, "requests": args.queries}
+    number = 0
+    try:
+        async with _registered_tenant(args, db_name), httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None) as client:
+            for mode, dependency in (("shared", shared_embedder), ("per_request", per_request_embedder)):
+                app.dependency_overrides[get_embedding_service] = dependency
+                # Warm up: tenant resolution and the backend's in-process index
+                await _timed_query(client, args, [], -1)
+                latencies: List[float] = []
+                numbers = iter(range(number, number + args.queries))
+                number += args.queries
+
+                async def worker():
+                    for query_number in numbers:
+                        await _timed_query(client, args, latencies, query_number)
+
+                started_at = time.perf_counter()
+                await asyncio.gather(*(worker() for _ in range(args.query_concurrency)))
+                seconds = time.perf_counter() - started_at
+                report[mode] = {"seconds": seconds, "requests_per_s": len(latencies) / seconds, **_latency_stats(latencies)}
+    finally:
+        app.dependency_overrides.pop(get_embedding_service, None)
+
+    report["speedup"] = report["shared"]["requests_per_s"] / report["per_request"]["requests_per_s"]
+    return report
+
+
+async def benchmark_crud(args) -> Dict[str, Any]:
+    import httpx
+    from app.core.main import app
+
+    report: Dict[str, Any] = {"operations": args.crud_operations}
+    async with _registered_tenant(args, args.db_name):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+            for resource, prefix, make_body in (
+                ("prompt", "/api/v1/p", lambda number: {"name": f"prompt {number}", "system_prompt": "You answer shipping questions.", "user_prompt_template": "{question}"}),
+                ("tool", "/api/v1/t", lambda number: {"name": f"tool {number}", "description": "Looks up an order", "api_config": {"url": "https://example.com/orders/{id}"}}),
+            ):
+                url = f"{prefix}/{args.org_id}/{resource}"
+                latencies: Dict[str, List[float]] = {}
+                ids = []
+                for number in range(args.crud_operations):
+                    created = await _timed_request(client, latencies, "create", "POST", url, json=make_body(number))
+                    ids.append(created.get("_id") or created.get("id"))
+                for _ in range(max(1, args.crud_operations // 10)):
+                    await _timed_request(client, latencies, "list", "GET", url)
+                for number, item_id in enumerate(ids):
+                    await _timed_request(client, latencies, "get", "GET", f"{url}/{item_id}")
+                    await _timed_request(client, latencies, "update", "PUT", f"{url}/{item_id}", json={"name": f"{resource} {number} updated"})
+                for item_id in ids:
+                    await _timed_request(client, latencies, "delete", "DELETE", f"{url}/{item_id}")
+                report[resource] = {operation: _latency_stats(values) for operation, values in latencies.items()}
+    return report
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def _drop_databases(args):
+    from app.core.config.mongodb import mongo_client
+    for db_name in (args.db_name, f"{args.db_name}_search", f"{args.db_name}_query", f"{args.db_name}_throughput"):
+        await mongo_client.drop_database(db_name)
+
+
+async def run_benchmarks(args) -> Dict[str, Any]:
+    s3_utils.s3 = InMemoryS3Client()
+    embedder = FakeEmbeddingService(args.dimensions, args.embed_latency_ms / 1000)
+
+    if args.configured_stores:
+        from app.core.config.redis import redis_manager
+        await redis_manager.connect()
+    await _drop_databases(args)
+
+    report: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "stores": "configured" if args.configured_stores else "in-memory",
+        "settings": {
+            "chunk_size": text_splitter.CHUNK_SIZE,
+            "chunk_overlap": text_splitter.CHUNK_OVERLAP,
+            "pdf_pages_per_task": text_splitter.PDF_PAGES_PER_TASK,
+            "pdf_parse_max_parallel": text_splitter.PDF_PARSE_MAX_PARALLEL,
+        },
+        "args": vars(args),
+    }
+    executor_manager.start()
+    try:
+        for name in args.only:
+            logger.warning(f"Running {name} benchmark")
+            if name == "split":
+                report[name] = await benchmark_split(args)
+            elif name == "ingest":
+                report[name] = await benchmark_ingest(args, embedder)
+            elif name == "search":
+                report[name] = await benchmark_search(args, embedder)
+            elif name == "query_under_ingest":
+                report[name] = await benchmark_query_under_ingest(args, embedder)
+            elif name == "query_throughput":
+                report[name] = await benchmark_query_throughput(args, embedder)
+            elif name == "crud":
+                report[name] = await benchmark_crud(args)
+    finally:
+        executor_manager.shutdown()
+        await _drop_databases(args)
+    return report
+
+
+def _benchmark_names(value: str) -> List[str]:
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = sorted(set(names) - set(BENCHMARKS))
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown benchmarks {unknown}, expected some of {BENCHMARKS}")
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion and query hot paths with local stand-ins")
+    parser.add_argument("--only", type=_benchmark_names, default=BENCHMARKS, help=f"comma-separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument("--configured-stores", action="store_true", help="use MONGODB_URI and REDIS_URL instead of in-memory stand-ins")
+    parser.add_argument("--db-name", default="rag_benchmark", help="scratch database, dropped before and after the run")
+    parser.add_argument("--org-id", default="rag-benchmark")
+    parser.add_argument("--pages", type=int, default=100, help="pages of the split benchmark documents")
+    parser.add_argument("--ingest-pages", type=int, default=50, help="pages of each ingested document")
+    parser.add_argument("--page-chars", type=int, default=3000)
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0, help="simulated latency of each embedding provider call")
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--search-documents", type=int, default=5000)
+    parser.add_argument("--search-backend", default="local", choices=["local", "ivf", "atlas", "auto"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--load-pages", type=int, default=300, help="pages of the PDF uploaded while query_under_ingest measures queries")
+    parser.add_argument("--query-concurrency", type=int, default=16, help="concurrent clients of the query_throughput benchmark")
+    parser.add_argument("--connect-latency-ms", type=float, default=0.0, help="simulated channel setup on the first call of each per-request embedding client")
+    parser.add_argument("--crud-operations", type=int, default=100, help="items created, read, updated and deleted per resource")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING", help="app logger level during the run")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    logger.setLevel(getattr(logging, args.log_level.upper()))
+    if not args.configured_stores:
+        install_in_memory_stores()
+    os.makedirs(text_splitter.TEMP_DIR, exist_ok=True)
+
+    report = asyncio.run(run_benchmarks(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
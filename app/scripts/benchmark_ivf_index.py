@@ -0,0 +1,123 @@
+"""
+Recall@k and latency of the IVF index against exact search, for a range of probe counts.
+
+    python -m app.scripts.benchmark_ivf_index --documents 200000 --dimensions 768
+    python -m app.scripts.benchmark_ivf_index --db-name <db_name> --documents 100000
+
+Synthetic vectors are drawn around random cluster centres; with --db-name, the tenant's stored
+embeddings are used instead and queries are perturbed copies of stored chunks. Pick IVF_NUM_PROBES
+from the output.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.core.config.mongodb import mongo_client
+from app.core.service.embedded_document.ivf_index import IVFIndex, normalize_rows
+from app.core.service.embedded_document.local_vector_index import INDEX_PROJECTION, FilterCodes, LocalVectorIndex
+from app.core.service.embedded_document.search_backend import EMBEDDED_DOCUMENT_COLLECTION
+from app.core.utils.vector_codec import EMBEDDING_FIELD, decode_embedding
+
+PROBES = [1, 2, 4, 8, 16, 32, 64, 128]
+
+
+def synthetic_vectors(documents: int, dimensions: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimensions)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, documents)] + 0.5 * rng.standard_normal((documents, dimensions)).astype(np.float32)
+    return normalize_rows(vectors)
+
+
+async def tenant_vectors(db_name: str, documents: int) -> np.ndarray:
+    collection = mongo_client[db_name][EMBEDDED_DOCUMENT_COLLECTION]
+    stored = await collection.find({EMBEDDING_FIELD: {"$exists": True}}, INDEX_PROJECTION).limit(documents).to_list(length=documents)
+    if not stored:
+        raise ValueError(f"No embedded documents in {db_name}")
+    return normalize_rows(np.stack([decode_embedding(document) for document in stored]))
+
+
+def _latency_stats(latencies: List[float]) -> Dict[str, float]:
+    milliseconds = np.array(latencies) * 1000
+    return {
+        "mean_ms": float(np.mean(milliseconds)),
+        "p50_ms": float(np.percentile(milliseconds, 50)),
+        "p95_ms": float(np.percentile(milliseconds, 95)),
+    }
+
+
+def run_benchmark(vectors: np.ndarray, num_queries: int, k: int, num_lists: int, seed: int) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed + 1)
+    ids = rng.integers(0, 256, (len(vectors), 12), dtype=np.uint8)
+    no_codes = np.full(len(vectors), -1, dtype=np.int32)
+    queries = normalize_rows(vectors[rng.choice(len(vectors), num_queries, replace=False)] + 0.1 * rng.standard_normal((num_queries, vectors.shape[1])).astype(np.float32))
+
+    # Exact baseline: the in-process brute-force index used by the local backend
+    exact_index = LocalVectorIndex(vectors.shape[1])
+    exact_index._reserve(len(vectors), vectors.shape[1])
+    exact_index.vectors[:len(vectors)] = vectors
+    exact_index.ids = [row.tobytes() for row in ids]
+    exact_index.size = len(vectors)
+
+    started_at = time.perf_counter()
+    ivf_index = IVFIndex.build(vectors, no_codes, no_codes, ids, FilterCodes(), FilterCodes(), num_lists=num_lists or None)
+    build_seconds = time.perf_counter() - started_at
+
+    expected, latencies = [], []
+    for query in queries:
+        started_at = time.perf_counter()
+        hits = exact_index.search(query, k)
+        latencies.append(time.perf_counter() - started_at)
+        expected.append({oid for oid, _ in hits})
+
+    results = []
+    for num_probes in [probes for probes in PROBES if probes <= ivf_index.num_lists]:
+        recalls, probe_latencies = [], []
+        for query, truth in zip(queries, expected):
+            started_at = time.perf_counter()
+            hits = ivf_index.search(query, k, num_probes=num_probes)
+            probe_latencies.append(time.perf_counter() - started_at)
+            recalls.append(len(truth & {oid.binary for oid, _ in hits}) / len(truth))
+        results.append({"num_probes": num_probes, "recall_at_k": float(np.mean(recalls)), **_latency_stats(probe_latencies)})
+
+    return {
+        "documents": len(vectors),
+        "dimensions": int(vectors.shape[1]),
+        "queries": num_queries,
+        "k": k,
+        "num_lists": ivf_index.num_lists,
+        "build_seconds": build_seconds,
+        "exact": _latency_stats(latencies),
+        "ivf": results,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark IVF recall@k and latency against exact search")
+    parser.add_argument("--db-name", help="benchmark a tenant's stored embeddings instead of synthetic vectors")
+    parser.add_argument("--documents", type=int, default=200000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=1000, help="cluster centres of the synthetic vectors")
+    parser.add_argument("--num-lists", type=int, default=0, help="IVF lists, 0 for the default 4 * sqrt(documents)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.db_name:
+        vectors = await tenant_vectors(args.db_name, args.documents)
+    else:
+        vectors = synthetic_vectors(args.documents, args.dimensions, args.clusters, args.seed)
+    report = run_benchmark(vectors, args.queries, args.k, args.num_lists, args.seed)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""
+Re-encode the embeddings of a tenant's EmbeddedDocuments collection into another storage mode,
+and report the size and recall impact of doing so.
+
+    python -m app.scripts.migrate_embedding_storage --db-name <db_name> --mode float32 --report-only
+    python -m app.scripts.migrate_embedding_storage --db-name <db_name> --mode float32
+
+Set EMBEDDING_STORAGE_MODE to the same mode afterwards so new chunks are written the same way.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict
+
+import bson
+import numpy as np
+from pymongo import UpdateOne
+
+from app.core.config.mongodb import mongo_client
+from app.core.service.embedded_document.embedded_document_service import EMBEDDED_DOCUMENT_COLLECTION
+from app.core.utils.vector_codec import EMBEDDING_FIELD, EMBEDDING_OFFSET_FIELD, EMBEDDING_SCALE_FIELD, STORAGE_MODE_FLOAT64, STORAGE_MODE_INT8, STORAGE_MODES, decode_embedding, encode_embedding
+from app.utils.logger import logger
+
+EMBEDDING_PROJECTION = {EMBEDDING_FIELD: 1, EMBEDDING_SCALE_FIELD: 1, EMBEDDING_OFFSET_FIELD: 1}
+
+
+def _stored_size(fields: Dict[str, Any]) -> int:
+    return len(bson.encode({key: value for key, value in fields.items() if key != "_id"}))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+async def build_report(db_name: str, mode: str, sample_size: int, num_queries: int, k: int) -> Dict[str, Any]:
+    """Compare current and target encodings on a sample: bytes per embedding and recall@k of cosine top-k"""
+    collection = mongo_client[db_name][EMBEDDED_DOCUMENT_COLLECTION]
+    documents = await collection.find({EMBEDDING_FIELD: {"$exists": True}}, EMBEDDING_PROJECTION).limit(sample_size).to_list(length=sample_size)
+    if not documents:
+        return {"db_name": db_name, "mode": mode, "documents_sampled": 0}
+
+    current = np.stack([decode_embedding(document) for document in documents])
+    encoded = [encode_embedding(vector.tolist(), mode) for vector in current]
+    converted = np.stack([decode_embedding(fields) for fields in encoded])
+
+    current_bytes = float(np.mean([_stored_size(document) for document in documents]))
+    target_bytes = float(np.mean([_stored_size(fields) for fields in encoded]))
+    float64_bytes = float(_stored_size(encode_embedding(current[0].tolist(), STORAGE_MODE_FLOAT64)))
+
+    k = min(k, len(documents))
+    queries = _normalize(current[:num_queries])
+    exact = _top_k(_normalize(current), queries, k)
+    approximate = _top_k(_normalize(converted), queries, k)
+    recall = float(np.mean([len(set(e) & set(a)) / k for e, a in zip(exact, approximate)]))
+
+    total_documents = await collection.estimated_document_count()
+    return {
+        "db_name": db_name,
+        "mode": mode,
+        "documents_sampled": len(documents),
+        "dimensions": int(current.shape[1]),
+        "bytes_per_embedding_float64": float64_bytes,
+        "bytes_per_embedding_current": current_bytes,
+        "bytes_per_embedding_target": target_bytes,
+        "size_ratio_vs_current": target_bytes / current_bytes,
+        "estimated_savings_bytes": int((current_bytes - target_bytes) * total_documents),
+        "recall_at_k": recall,
+        "k": k,
+        "max_abs_error": float(np.max(np.abs(current - converted))),
+    }
+
+
+async def migrate(db_name: str, mode: str, batch_size: int) -> int:
+    collection = mongo_client[db_name][EMBEDDED_DOCUMENT_COLLECTION]
+    unset_fields = {} if mode == STORAGE_MODE_INT8 else {EMBEDDING_SCALE_FIELD: "", EMBEDDING_OFFSET_FIELD: ""}
+    migrated = 0
+    operations = []
+    started_at = time.monotonic()
+
+    async for document in collection.find({EMBEDDING_FIELD: {"$exists": True}}, EMBEDDING_PROJECTION).batch_size(batch_size):
+        update: Dict[str, Any] = {"$set": encode_embedding(decode_embedding(document).tolist(), mode)}
+        if unset_fields:
+            update["$unset"] = unset_fields
+        operations.append(UpdateOne({"_id": document["_id"]}, update))
+        if len(operations) >= batch_size:
+            migrated += (await collection.bulk_write(operations, ordered=False)).modified_count
+            operations = []
+            logger.info(f"Migrated {migrated} embeddings in {db_name}")
+    if operations:
+        migrated += (await collection.bulk_write(operations, ordered=False)).modified_count
+
+    logger.info(f"Migrated {migrated} embeddings in {db_name} to {mode} in {time.monotonic() - started_at:.1f}s")
+    return migrated
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Re-encode stored embeddings as float64 arrays, packed float32 or int8 binary vectors")
+    parser.add_argument("--db-name", required=True)
+    parser.add_argument("--mode", required=True, choices=STORAGE_MODES)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--report-only", action="store_true", help="only print the size and recall report")
+    parser.add_argument("--sample-size", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    report = await build_report(args.db_name, args.mode, args.sample_size, args.queries, args.k)
+    print(json.dumps(report, indent=2))
+    if not args.report_only:
+        migrated = await migrate(args.db_name, args.mode, args.batch_size)
+        print(json.dumps({"migrated": migrated}))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
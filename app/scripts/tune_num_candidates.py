@@ -0,0 +1,116 @@
+"""
+Measure $vectorSearch recall and latency against exact (ENN) search for a range of numCandidates
+multipliers, and store the recommended settings for the tenant.
+
+    python -m app.scripts.tune_num_candidates --db-name <db_name>
+    python -m app.scripts.tune_num_candidates --db-name <db_name> --category <category> --write
+
+Queries are stored chunk embeddings. With --write, the recall curve is saved to the tenant's
+SearchSettings collection, where the candidate planner picks the smallest multiplier that reaches
+VECTOR_SEARCH_TARGET_RECALL. --write also recounts the tenant's CategoryStats.
+
+The settings are tenant-wide and the planner divides them by a filtered category's selectivity,
+so a curve measured with --category is saved with that category's selectivity multiplied back
+out. Filtered queries on the tuned category then get the measured numCandidates, not a second
+division by its selectivity.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config.mongodb import mongo_client
+from app.core.service.embedded_document.search_backend import EMBEDDED_DOCUMENT_COLLECTION, EMBEDDED_DOCUMENT_INDEX_NAME, EMBEDDING_PATH
+from app.core.service.embedded_document.search_tuning import MAX_NUM_CANDIDATES, MIN_NUM_CANDIDATES, candidate_planner
+from app.core.utils.vector_codec import EMBEDDING_FIELD, EMBEDDING_OFFSET_FIELD, EMBEDDING_SCALE_FIELD, decode_embedding, encode_query_vector
+
+MULTIPLIERS = [1, 2, 5, 10, 15, 20, 30, 50, 100]
+
+
+async def _vector_search(collection, query_vector: List[float], k: int, category: Optional[str], num_candidates: Optional[int]) -> List[Any]:
+    stage: Dict[str, Any] = {"index": EMBEDDED_DOCUMENT_INDEX_NAME, "path": EMBEDDING_PATH, "queryVector": encode_query_vector(query_vector), "limit": k}
+    if num_candidates is None:
+        stage["exact"] = True
+    else:
+        stage["numCandidates"] = num_candidates
+    if category:
+        stage["filter"] = {"category": {"$eq": category}}
+    cursor = collection.aggregate([{"$vectorSearch": stage}, {"$project": {"_id": 1}}])
+    return [doc["_id"] async for doc in cursor]
+
+
+async def measure(db_name: str, num_queries: int, k: int, category: Optional[str]) -> Dict[str, Any]:
+    collection = mongo_client[db_name][EMBEDDED_DOCUMENT_COLLECTION]
+    sample_filter: Dict[str, Any] = {EMBEDDING_FIELD: {"$exists": True}}
+    if category:
+        sample_filter["category"] = category
+    sample = await collection.aggregate([
+        {"$match": sample_filter},
+        {"$sample": {"size": num_queries}},
+        {"$project": {EMBEDDING_FIELD: 1, EMBEDDING_SCALE_FIELD: 1, EMBEDDING_OFFSET_FIELD: 1}},
+    ]).to_list(length=num_queries)
+    if not sample:
+        return {"db_name": db_name, "queries": 0}
+    queries = [decode_embedding(document).tolist() for document in sample]
+
+    exact = [set(await _vector_search(collection, query, k, category, None)) for query in queries]
+    curve = []
+    for multiplier in MULTIPLIERS:
+        num_candidates = min(max(k * multiplier, k), MAX_NUM_CANDIDATES)
+        recalls, latencies = [], []
+        for query, expected in zip(queries, exact):
+            started_at = time.perf_counter()
+            found = await _vector_search(collection, query, k, category, num_candidates)
+            latencies.append(time.perf_counter() - started_at)
+            recalls.append(len(expected & set(found)) / len(expected) if expected else 1.0)
+        curve.append({
+            "candidates_per_result": multiplier,
+            "num_candidates": num_candidates,
+            "recall": float(np.mean(recalls)),
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        })
+    return {"db_name": db_name, "queries": len(queries), "k": k, "category": category, "recall_curve": curve}
+
+
+def remove_selectivity(curve: List[Dict[str, Any]], selectivity: float) -> List[Dict[str, Any]]:
+    """The curve of a category-filtered run, as the tenant-wide multipliers the planner divides by selectivity"""
+    return [{**point, "candidates_per_result": point["candidates_per_result"] * selectivity} for point in curve]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Tune $vectorSearch numCandidates per tenant against exact search")
+    parser.add_argument("--db-name", required=True)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--category", help="tune with this category filter applied")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--write", action="store_true", help="save the recommended settings and recount category stats")
+    args = parser.parse_args()
+
+    report = await measure(args.db_name, args.queries, args.k, args.category)
+    if report["queries"]:
+        curve = report["recall_curve"]
+        if args.write:
+            report["category_counts"] = await candidate_planner.rebuild_category_counts(args.db_name, EMBEDDED_DOCUMENT_COLLECTION)
+        if args.category:
+            report["category_candidates_per_result"] = candidate_planner.candidates_per_result({"recall_curve": curve}, args.target_recall)
+            counts = report.get("category_counts") or await candidate_planner.get_category_counts(args.db_name)
+            selectivity = candidate_planner.filter_selectivity(counts, args.category)
+            report["category_selectivity"] = selectivity
+            if selectivity is None:
+                raise SystemExit(f"No category stats for {args.db_name}; rerun with --write to count them")
+            curve = remove_selectivity(curve, selectivity)
+        settings = {"recall_curve": curve, "min_num_candidates": MIN_NUM_CANDIDATES, "tuned_k": args.k, "tuned_category": args.category}
+        report["recommended_candidates_per_result"] = candidate_planner.candidates_per_result(settings, args.target_recall)
+        if args.write:
+            settings["candidates_per_result"] = report["recommended_candidates_per_result"]
+            await candidate_planner.save_settings(args.db_name, settings)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# Modules check these at import; clients connect lazily, so no server is needed
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("GEMINI_EMBEDDING_MODEL", "models/text-embedding-004")
+os.environ.setdefault("AWS_REGION", "us-east-1")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
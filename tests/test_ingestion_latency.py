@@ -0,0 +1,128 @@
+import asyncio
+import time
+from typing import List
+
+import numpy as np
+from bson import ObjectId
+from langchain_core.documents import Document
+
+from app.core.config.executors import executor_manager
+from app.core.schema.rag_schema import RagDocumentCreate
+from app.core.service.embedded_document import search_tuning
+from app.core.service.embedded_document.embedded_document_service import EmbeddedDocumentService
+from app.core.service.rag.ingestion_pipeline import IngestionPipeline
+
+DIMENSIONS = 768
+ROUND_TRIP_SECONDS = 0.005
+WORDS = "shipping refund invoice warranty account delivery order payment return policy customer support".split()
+
+
+class InsertResult:
+    def __init__(self, inserted_ids: List[ObjectId]):
+        self.inserted_ids = inserted_ids
+
+
+class Cursor:
+    async def to_list(self, length=None):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        return []
+
+
+class ServerCollection:
+    """A collection whose work happens on the server: every call is one awaited round trip"""
+
+    async def insert_many(self, documents, ordered=True):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        for document in documents:
+            document["_id"] = ObjectId()
+        return InsertResult([document["_id"] for document in documents])
+
+    async def find_one_and_update(self, *args, **kwargs):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        return {"version": 1}
+
+    def find(self, *args, **kwargs):
+        return Cursor()
+
+    def __getattr__(self, name):
+        async def call(*args, **kwargs):
+            await asyncio.sleep(ROUND_TRIP_SECONDS)
+        return call
+
+
+class ServerDatabase:
+    def __getitem__(self, name):
+        return ServerCollection()
+
+
+class ServerClient:
+    def __getitem__(self, name):
+        return ServerDatabase()
+
+
+class FakeEmbedder:
+    model = "test-model"
+    task_type = "retrieval_document"
+
+    def __init__(self):
+        self.vector = np.random.default_rng(0).standard_normal(DIMENSIONS).tolist()
+
+    async def embed_documents(self, documents: List[Document]) -> List[List[float]]:
+        await asyncio.sleep(0.02)
+        return [self.vector for _ in documents]
+
+
+def chunk_texts(count: int) -> List[str]:
+    # About 1000 characters per chunk, like the splitter's default chunk size
+    rng = np.random.default_rng(1)
+    return [" ".join(rng.choice(WORDS, 140)) + f" {number}" for number in range(count)]
+
+
+async def chunk_batches(texts: List[str]):
+    for start in range(0, len(texts), 10):
+        yield [Document(page_content=text) for text in texts[start:start + 10]]
+
+
+async def query_latencies(count: int) -> List[float]:
+    """
+    Latency of a query-shaped request waiting on one database round trip. Whatever ingestion
+    holds the event loop for is added to it; the query's own CPU work is left out, as it competes
+    for cores rather than for the loop.
+    """
+    latencies = []
+    for _ in range(count):
+        started_at = time.perf_counter()
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        latencies.append(time.perf_counter() - started_at)
+    return latencies
+
+
+def test_query_p99_stays_flat_while_a_large_document_is_ingested(monkeypatch):
+    client = ServerClient()
+    monkeypatch.setattr(search_tuning.candidate_planner, "mongo_client", client)
+    service = EmbeddedDocumentService(org_id="org", db_name="tenant_db")
+    service.mongo_client = client
+    pipeline = IngestionPipeline(FakeEmbedder(), service)
+    warm_up_texts, texts = chunk_texts(50), chunk_texts(3000)
+
+    async def run():
+        executor_manager.start()
+        try:
+            # Warm the process pool, then measure idle queries and queries during a 3000-chunk ingest
+            await pipeline.run(RagDocumentCreate(title="Warm-up"), chunk_batches(warm_up_texts))
+            idle = await query_latencies(200)
+            ingest = asyncio.create_task(pipeline.run(RagDocumentCreate(title="Large"), chunk_batches(texts)))
+            during = []
+            while not ingest.done():
+                during.extend(await query_latencies(10))
+            result = await ingest
+            return idle, during, result
+        finally:
+            executor_manager.shutdown()
+
+    idle, during, result = asyncio.run(run())
+
+    assert result.inserted_count == 3000
+    idle_p99, during_p99 = np.percentile(idle, 99), np.percentile(during, 99)
+    print(f"query p99 idle {idle_p99 * 1000:.1f} ms, during ingest {during_p99 * 1000:.1f} ms over {len(during)} queries")
+    assert during_p99 < idle_p99 + 0.025
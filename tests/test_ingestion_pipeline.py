@@ -0,0 +1,109 @@
+import asyncio
+from typing import List
+
+import pytest
+from langchain_core.documents import Document
+
+from app.core.schema.embedded_document_schema import EmbeddedDocumentBulkWriteResult
+from app.core.schema.rag_schema import RagDocumentCreate
+from app.core.service.embedded_document.embedded_document_service import content_hash
+from app.core.service.rag import ingestion_pipeline
+from app.core.service.rag.ingestion_pipeline import IngestionPipeline
+
+
+class FakeEmbedder:
+    model = "test-model"
+    task_type = "retrieval_document"
+
+    async def embed_documents(self, documents: List[Document]) -> List[List[float]]:
+        return [[float(len(document.page_content)), 1.0] for document in documents]
+
+
+class FailingStoreService:
+    """Embedded document service whose bulk inserts fail outside the per-batch error handling"""
+
+    def __init__(self):
+        self.finished = False
+
+    async def get_document_chunks(self, document_id, title, category):
+        return []
+
+    async def start_document_version(self, document_id, title):
+        return 1
+
+    async def store_embedded_documents(self, documents):
+        raise RuntimeError("store stage broke")
+
+    async def update_embedded_documents(self, updates):
+        return 0
+
+    async def delete_embedded_documents(self, documents):
+        return 0
+
+    async def finish_document_version(self, document_id, version, chunk_count):
+        self.finished = True
+
+
+class StoredDocumentService(FailingStoreService):
+    """Embedded document service holding one stored version of the document"""
+
+    def __init__(self, stored_chunks):
+        super().__init__()
+        self.stored_chunks = stored_chunks
+        self.inserted = []
+        self.deleted = []
+
+    async def get_document_chunks(self, document_id, title, category):
+        return [dict(chunk) for chunk in self.stored_chunks]
+
+    async def store_embedded_documents(self, documents):
+        self.inserted.extend(documents)
+        return EmbeddedDocumentBulkWriteResult(inserted_count=len(documents), batch_counts=[len(documents)])
+
+    async def delete_embedded_documents(self, documents):
+        self.deleted.extend(documents)
+        return len(documents)
+
+
+def stored_version(count: int, model: str):
+    return [
+        {"_id": number, "content_hash": content_hash(f"chunk {number}"), "chunk_number": number, "category": None, "embedding_model": model}
+        for number in range(count)
+    ]
+
+
+async def chunk_batches(count: int):
+    for number in range(count):
+        yield [Document(page_content=f"chunk {number}")]
+
+
+def test_store_failure_ends_the_run_with_the_error(monkeypatch):
+    # Tiny batches and queues, so the other stages are blocked on full queues when the store stage dies
+    monkeypatch.setattr(ingestion_pipeline, "EMBEDDING_BATCH_SIZE", 1)
+    monkeypatch.setattr(ingestion_pipeline, "INGESTION_QUEUE_SIZE", 1)
+    service = FailingStoreService()
+    pipeline = IngestionPipeline(FakeEmbedder(), service)
+
+    async def run():
+        return await asyncio.wait_for(pipeline.run(RagDocumentCreate(title="Doc"), chunk_batches(200)), 5)
+
+    with pytest.raises(RuntimeError, match="store stage broke"):
+        asyncio.run(run())
+    assert not service.finished
+
+
+def test_reupload_keeps_chunks_embedded_by_the_same_model():
+    service = StoredDocumentService(stored_version(3, FakeEmbedder.model))
+
+    result = asyncio.run(IngestionPipeline(FakeEmbedder(), service).run(RagDocumentCreate(title="Doc"), chunk_batches(3)))
+
+    assert (result.unchanged_count, result.inserted_count, result.deleted_count) == (3, 0, 0)
+
+
+def test_reupload_after_a_model_change_reembeds_every_chunk():
+    service = StoredDocumentService(stored_version(3, "previous-model"))
+
+    result = asyncio.run(IngestionPipeline(FakeEmbedder(), service).run(RagDocumentCreate(title="Doc"), chunk_batches(3)))
+
+    assert (result.unchanged_count, result.inserted_count, result.deleted_count) == (0, 3, 3)
+    assert {document.embedding_model for document in service.inserted} == {FakeEmbedder.model}
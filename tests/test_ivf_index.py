@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+from bson import ObjectId
+
+from app.core.service.embedded_document import ivf_index
+from app.core.service.embedded_document.ivf_index import IVFIndex, ids_to_array
+from app.core.service.embedded_document.local_vector_index import FilterCodes
+
+
+def build_index(size: int, seed: int) -> IVFIndex:
+    vectors = ivf_index.normalize_rows(np.random.default_rng(seed).standard_normal((size, 8)).astype(np.float32))
+    codes = np.zeros(size, dtype=np.int32)
+    return IVFIndex.build(vectors, codes, codes, ids_to_array([ObjectId() for _ in range(size)]), FilterCodes(), FilterCodes(), num_lists=4)
+
+
+def save_as(monkeypatch, process: str, index: IVFIndex, directory: str, new_base: bool = True):
+    """Save index as the process named process would: its own base prefix, then the shared state file"""
+    monkeypatch.setattr(ivf_index, "BASE_DIR_PREFIX", f"base-{process}-")
+    if new_base:
+        index.save_base(directory)
+    index.save_state(directory, index.state())
+
+
+def test_save_state_keeps_other_processes_bases(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    save_as(monkeypatch, "a", build_index(64, 0), directory)
+    first_base = next(name for name in os.listdir(directory) if name.startswith("base-a-"))
+
+    # b has written a new base but not yet the state file that references it
+    other = build_index(64, 1)
+    monkeypatch.setattr(ivf_index, "BASE_DIR_PREFIX", "base-b-")
+    other_base = other.save_base(directory)
+
+    save_as(monkeypatch, "a", build_index(64, 2), directory)
+    assert first_base not in os.listdir(directory)
+    assert other_base in os.listdir(directory)
+
+    save_as(monkeypatch, "b", other, directory, new_base=False)
+    assert len(IVFIndex.load(directory)) == 64
+
+
+def test_save_state_republishes_a_base_removed_by_its_writer(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    save_as(monkeypatch, "a", build_index(64, 0), directory)
+    loaded = IVFIndex.load(directory)
+
+    # a compacts to a new base and removes the one b loaded
+    save_as(monkeypatch, "a", build_index(32, 1), directory)
+    save_as(monkeypatch, "b", loaded, directory, new_base=False)
+
+    assert loaded.base_dir.startswith("base-b-")
+    reloaded = IVFIndex.load(directory)
+    assert len(reloaded) == 64
+    np.testing.assert_array_equal(reloaded.ids, loaded.ids)
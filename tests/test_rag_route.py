@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core.api.rag.rag_api import RagApi
+from app.core.langchain.embedding import get_embedding_service
+from app.core.routes.rag.rag_route import router
+from app.core.schema.rag_schema import IngestionResult
+from app.core.service.rag import rag_service
+from app.core.service.rag.rag_service import RagService
+
+
+class FakeEmbedder:
+    model = "test-model"
+    task_type = "retrieval_document"
+
+
+class InlineExecutors:
+    async def run_io(self, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    async def get_db_name(self):
+        self.db_name = "tenant_db"
+        self.db_metadata = {}
+        return True
+
+    monkeypatch.setattr(RagApi, "get_db_name", get_db_name)
+    monkeypatch.setattr(rag_service, "executor_manager", InlineExecutors())
+    monkeypatch.setattr(rag_service, "upload_file_to_s3", lambda *args: None)
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1/r")
+    app.dependency_overrides[get_embedding_service] = FakeEmbedder
+    return app
+
+
+def upload(app: FastAPI) -> httpx.Response:
+    async def post():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post(
+                "/api/v1/r/org/rag/generate-embedding",
+                data={"body": json.dumps({"title": "Doc"})},
+                files={"file": ("doc.txt", b"some text", "text/plain")},
+            )
+    return asyncio.run(post())
+
+
+def ingested(result: IngestionResult):
+    async def handle_document_chunks(self, body, chunks, progress_callback=None):
+        return result
+    return handle_document_chunks
+
+
+def test_failed_chunks_answer_207_with_their_numbers(app, monkeypatch):
+    monkeypatch.setattr(RagService, "_handle_document_chunks", ingested(IngestionResult(inserted_count=3, batch_counts=[3], failed_chunk_numbers=[1, 4])))
+
+    response = upload(app)
+
+    assert response.status_code == 207
+    assert response.json()["failed_chunk_numbers"] == [1, 4]
+    assert response.json()["batch_counts"] == [3]
+
+
+def test_complete_upload_answers_200(app, monkeypatch):
+    monkeypatch.setattr(RagService, "_handle_document_chunks", ingested(IngestionResult(inserted_count=3, batch_counts=[2, 1], document_version=1)))
+
+    response = upload(app)
+
+    assert response.status_code == 200
+    assert response.json()["batch_counts"] == [2, 1]
+    assert response.json()["failed_chunk_numbers"] == []